@@ -41,6 +41,78 @@ async def hb() -> Dict[str, str]:
     return {"status": "running" if _any_running() else "ready"}
 
 
+# The TTS container stays up with tts_server.py keeping the model loaded; jobs only
+# `docker exec` the thin run_tts.py client in it instead of a fresh `docker run`.
+TTS_CONTAINER = os.environ.get("TTS_CONTAINER", "tts-server")
+TTS_SERVER_PORT = os.environ.get("TTS_SERVER_PORT", "5002")
+TTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+_tts_server_lock = threading.Lock()
+
+
+def _tts_server_running() -> bool:
+    proc = subprocess.run(
+        ["docker", "inspect", "-f", "{{.State.Running}}", TTS_CONTAINER],
+        text=True,
+        capture_output=True,
+    )
+    return proc.returncode == 0 and proc.stdout.strip() == "true"
+
+
+def _ensure_tts_server(tts_src: Path, base_dir: Path) -> None:
+    """Start the long-lived TTS container (once) and wait until its server answers."""
+    with _tts_server_lock:
+        if _tts_server_running():
+            return
+        subprocess.run(["docker", "rm", "-f", TTS_CONTAINER], capture_output=True)
+        cmd = [
+            "docker",
+            "run",
+            "-d",
+            "--name",
+            TTS_CONTAINER,
+            "--restart",
+            "unless-stopped",
+            "-e",
+            "PYTHONWARNINGS=ignore::UserWarning:pkg_resources",
+            "-v",
+            "root1:/root/.local/share",
+            "-e",
+            "COQUI_TOS_AGREED=1",
+            "-e",
+            "COQUI_LOCAL_USER=1",
+            "-v",
+            f"{tts_src}:/app",
+            "-v",
+            f"{base_dir}:/app/folder1",
+            "tts",
+            "python",
+            "tts_server.py",
+            "--port",
+            TTS_SERVER_PORT,
+            "--preload",
+            TTS_MODEL,
+        ]
+        proc = subprocess.run(cmd, text=True, capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"could not start tts server container:\n{proc.stderr}")
+        # /health answers as soon as the server listens; --preload loads the model (a
+        # download on first start) in the background, and the first run_tts job waits
+        # for it inside synthesize_remote (3600 s timeout)
+        probe = [
+            "docker", "exec", TTS_CONTAINER, "python", "-c",
+            f"import urllib.request; urllib.request.urlopen('http://127.0.0.1:{TTS_SERVER_PORT}/health', timeout=2)",
+        ]
+        deadline = time.time() + float(os.environ.get("TTS_SERVER_START_TIMEOUT", "900"))
+        while time.time() < deadline:
+            if subprocess.run(probe, capture_output=True).returncode == 0:
+                return
+            if not _tts_server_running():
+                logs = subprocess.run(["docker", "logs", "--tail", "50", TTS_CONTAINER], text=True, capture_output=True)
+                raise RuntimeError(f"tts server container exited:\n{logs.stdout}{logs.stderr}")
+            time.sleep(2)
+        raise RuntimeError("tts server did not come up in time")
+
+
 def _run_task(job_id: str, task_type: str, payload: Dict[str, Any]) -> None:
     try:
         _set_job(job_id, status="running")
@@ -71,7 +143,7 @@ def _run_task(job_id: str, task_type: str, payload: Dict[str, Any]) -> None:
             script_path.write_text(str(text), encoding="utf-8")
 
             # Call external TTS docker container on the host via docker socket.
-            # Option B: mount TTS source dir (with run_tts.py) and data dir separately.
+            # Option B: mount TTS source dir (with run_tts.py + tts_server.py) and data dir separately.
             tts_src = Path(
                 os.environ.get(
                     "TTS_SRC_DIR",
@@ -79,23 +151,11 @@ def _run_task(job_id: str, task_type: str, payload: Dict[str, Any]) -> None:
                 )
             )
 
+            _ensure_tts_server(tts_src, base_dir)
             cmd = [
                 "docker",
-                "run",
-                "--rm",
-                "-e",
-                "PYTHONWARNINGS=ignore::UserWarning:pkg_resources",
-                "-v",
-                "root1:/root/.local/share",
-                "-e",
-                "COQUI_TOS_AGREED=1",
-                "-e",
-                "COQUI_LOCAL_USER=1",
-                "-v",
-                f"{tts_src}:/app",
-                "-v",
-                f"{base_dir}:/app/folder1",
-                "tts",
+                "exec",
+                TTS_CONTAINER,
                 "python",
                 "run_tts.py",
                 "--folder_name",
@@ -103,13 +163,15 @@ def _run_task(job_id: str, task_type: str, payload: Dict[str, Any]) -> None:
                 "--output_file_name",
                 output_file_name,
                 "--model_name",
-                "tts_models/multilingual/multi-dataset/xtts_v2",
+                TTS_MODEL,
                 "--speaker_wav",
                 "/app/example/example.wav",
                 "--language",
                 "en",
                 "--slowdown",
                 "1.00",
+                "--server",
+                f"http://127.0.0.1:{TTS_SERVER_PORT}",
             ]
 
             proc = subprocess.run(
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Frame writer that pipes raw BGR frames into ffmpeg (libx264).
+
+Drop-in for cv2.VideoWriter in main.py / main-shapes.py: frames go straight
+into an H.264 encode instead of mp4v, and the input's audio can be muxed in
+the same process, so no second remux pass is needed.
+"""
+
+import subprocess
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+
+class FFmpegWriter:
+    def __init__(
+        self,
+        path: str,
+        fps: Union[float, str],
+        size: Tuple[int, int],
+        audio_from: Optional[str] = None,
+        pix_fmt: str = "yuv420p",
+        crf: int = 18,
+        preset: str = "veryfast",
+        extra_args: Optional[List[str]] = None,
+    ):
+        """size is (width, height) like cv2.VideoWriter; fps may also be an exact rate
+        string like "30000/1001". With audio_from, that file's first audio stream (if
+        any) is copied into the output. extra_args are output options added after the
+        encoder settings (they win over them).
+        """
+        self.path = path
+        width, height = size
+        cmd: List[str] = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+        ]
+        if audio_from:
+            cmd += ["-i", audio_from, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "copy"]
+        cmd += [
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            "-pix_fmt", pix_fmt,
+            "-movflags", "+faststart",
+        ]
+        cmd += (extra_args or []) + [path]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def isOpened(self) -> bool:
+        return self._proc.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        # Contiguous frames (what cv2 decodes) are written without a copy
+        buf = frame.data if frame.flags.c_contiguous else frame.tobytes()
+        try:
+            self._proc.stdin.write(buf)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited while writing {self.path} (exit code {self._proc.wait()})")
+
+    def release(self) -> None:
+        if self._proc.stdin and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        code = self._proc.wait()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self.path} (exit code {code})")
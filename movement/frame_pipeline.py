@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Three-stage decode -> compose -> encode pipeline for the movement scripts.
+
+Decoding (cap.read) and encoding (writer.write) each run on their own thread and
+hand frames over through bounded queues, so they overlap with the composition
+step on the calling thread. OpenCV decode and the ffmpeg pipe write release
+the GIL, which is where the overlap comes from.
+
+A fixed pool of frame buffers is recycled through the stages (cap.read decodes
+into a buffer handed back by the writer), so nothing is allocated per frame and
+memory stays bounded. Frames are composed and written strictly in order, so
+output is identical to the serial loop.
+"""
+
+import queue
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+_DONE = object()
+
+
+def run_frame_pipeline(
+    cap,
+    writer,
+    compose: Callable[[int, np.ndarray], None],
+    first_index: int = 0,
+    max_frames: Optional[int] = None,
+    buffers: int = 8,
+) -> int:
+    """Read frames from cap, call compose(frame_index, frame) to draw on each frame
+    in place, and write them to writer. Stops at end of stream or after max_frames.
+    Returns the number of frames written.
+    """
+    free: "queue.Queue" = queue.Queue()
+    to_compose: "queue.Queue" = queue.Queue(maxsize=buffers)
+    to_write: "queue.Queue" = queue.Queue(maxsize=buffers)
+    for _ in range(buffers):
+        free.put(None)  # allocated lazily by the first cap.read into it
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        try:
+            idx = first_index
+            while not stop.is_set() and (max_frames is None or idx - first_index < max_frames):
+                buf = free.get()
+                ok, frame = cap.read(buf) if buf is not None else cap.read()
+                if not ok:
+                    break
+                to_compose.put((idx, frame))
+                idx += 1
+        except BaseException as exc:  # surfaced on the calling thread
+            errors.append(exc)
+            stop.set()
+        finally:
+            to_compose.put(_DONE)
+
+    def encoder():
+        try:
+            while True:
+                item = to_write.get()
+                if item is _DONE:
+                    break
+                if not stop.is_set():
+                    writer.write(item)
+                free.put(item)
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+            # Keep draining so the compose stage never blocks on a full queue
+            while to_write.get() is not _DONE:
+                free.put(None)
+
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=encoder, daemon=True)]
+    for t in threads:
+        t.start()
+
+    written = 0
+    try:
+        while True:
+            item = to_compose.get()
+            if item is _DONE:
+                break
+            idx, frame = item
+            if not stop.is_set():
+                compose(idx, frame)
+                written += 1
+            to_write.put(frame)
+    except BaseException as exc:
+        errors.append(exc)
+        stop.set()
+        # Let the reader finish so it can't block on a full queue
+        while to_compose.get() is not _DONE:
+            free.put(None)
+    finally:
+        to_write.put(_DONE)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    return written
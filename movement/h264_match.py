@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Shared helper for splicing a libx264 encode into an H.264 source by stream copy.
+
+An MP4 track keeps one avcC (SPS/PPS), so a re-encoded part concat-copied next to
+copied source GOPs must carry byte-identical parameter sets, or everything after
+the seam is decoded with the wrong ones. matched_x264_args() derives libx264
+settings from the source (profile, level, colour tags, SAR and, for sources made
+by x264, the header-relevant options in its version SEI) and verifies them with a
+two-frame encode; callers fall back to a full re-encode when it returns None.
+
+video-compose and movement each keep an identical copy of this file (they run in
+separate containers). Keep the copies in sync.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+import media_probe
+
+# x264 options (as printed in its SEI) that end up in the SPS/PPS
+_HEADER_OPTS = (
+    "cabac", "ref", "8x8dct", "bframes", "b_pyramid", "weightb", "weightp",
+    "keyint", "constrained_intra", "bluray_compat", "psy", "psy_rd",
+    "vbv_maxrate", "vbv_bufsize", "nal_hrd",
+)
+
+_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+}
+
+
+def x264_sei_options(path: str) -> Dict[str, str]:
+    """Options x264 wrote into the source's first video packet ({} if not made by x264)."""
+    try:
+        res = subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-i", path,
+                "-map", "0:v:0", "-c", "copy", "-frames:v", "1",
+                "-bsf:v", "h264_mp4toannexb", "-f", "h264", "-",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+    except Exception:
+        return {}
+    data = res.stdout
+    at = data.find(b"x264 - core")
+    if at < 0:
+        return {}
+    text = data[at:data.find(b"\x00", at)].decode("latin-1")
+    _, _, options = text.partition("options: ")
+    opts = {}
+    for item in options.split():
+        key, sep, value = item.partition("=")
+        if sep:
+            opts[key] = value
+    return opts
+
+
+def _x264_params(opts: Dict[str, str]) -> Optional[List[str]]:
+    """-x264-params entries reproducing the source's header-relevant options."""
+    if opts.get("interlaced", "0") != "0" or opts.get("cqm", "0") != "0":
+        return None
+    params = [f"{k}={opts[k]}" for k in _HEADER_OPTS if k in opts and k != "psy_rd"]
+    if "psy_rd" in opts:
+        params.append("psy_rd=" + opts["psy_rd"].replace(":", ","))
+    # The SEI shows chroma_qp_offset after x264 lowered it for psy-rd and psy-trellis;
+    # undo that so x264 arrives at the same value again
+    try:
+        offset = int(opts.get("chroma_qp_offset", "0"))
+        psy_rd, _, psy_trellis = opts.get("psy_rd", "0:0").partition(":")
+        psy_rd, psy_trellis = float(psy_rd), float(psy_trellis or 0)
+    except ValueError:
+        return None
+    if opts.get("psy", "0") == "1":
+        if psy_rd > 0:
+            offset += 1 if psy_rd < 0.25 else 2
+        if psy_trellis > 0:
+            offset += 1 if psy_trellis < 0.25 else 2
+    params.append(f"chroma_qp_offset={offset}")
+    # The PPS initial QP comes from the CRF/QP; any other rate control writes 26,
+    # which x264 also does for stitchable encodes
+    rc = opts.get("rc")
+    if rc == "crf" and "crf" in opts:
+        params.append(f"crf={opts['crf']}")
+    elif rc == "cqp" and "qp" in opts:
+        params.append(f"qp={opts['qp']}")
+    else:
+        params.append("stitchable=1")
+    return params
+
+
+def x264_args_for(path: str) -> Optional[List[str]]:
+    """libx264 output options aimed at reproducing path's SPS/PPS, or None when the
+    source is not 8-bit 4:2:0 progressive H.264 in a profile libx264 can emit.
+    """
+    vs = media_probe.video_stream(path)
+    if not vs or vs.get("codec_name") != "h264" or vs.get("pix_fmt") not in ("yuv420p", "yuvj420p"):
+        return None
+    profile = _PROFILES.get(vs.get("profile") or "")
+    if profile is None:
+        return None
+    params = ["stitchable=1"]
+    opts = x264_sei_options(path)
+    if opts:
+        params = _x264_params(opts)
+        if params is None:
+            return None
+    elif vs.get("refs"):
+        params.append(f"ref={vs['refs']}")
+    args = ["-profile:v", profile]
+    level = vs.get("level")
+    if isinstance(level, int) and level > 0:
+        args += ["-level", "1b" if level == 9 else f"{level // 10}.{level % 10}"]
+    args += ["-x264-params", ":".join(params)]
+    for opt, key in (
+        ("-color_range", "color_range"),
+        ("-colorspace", "color_space"),
+        ("-color_primaries", "color_primaries"),
+        ("-color_trc", "color_transfer"),
+    ):
+        if vs.get(key) not in (None, "unknown", "reserved"):
+            args += [opt, vs[key]]
+    sar = vs.get("sample_aspect_ratio")
+    args += ["-vf", f"setsar={sar.replace(':', '/') if sar not in (None, '0:1', 'N/A') else 0}"]
+    return args
+
+
+def _extradata_hash(path: str) -> Optional[str]:
+    try:
+        res = subprocess.run(
+            [
+                "ffprobe", "-v", "error", "-select_streams", "v:0",
+                "-show_streams", "-show_data_hash", "sha256", "-of", "json", path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        )
+        return (json.loads(res.stdout).get("streams") or [{}])[0].get("extradata_hash")
+    except Exception:
+        return None
+
+
+def matched_x264_args(path: str) -> Optional[List[str]]:
+    """x264_args_for(path), but only if a two-frame libx264 encode with them writes
+    exactly the source's SPS/PPS. These args go after the caller's own -c:v libx264
+    options, and the encode must run at the source's frame rate (r_frame_rate).
+    """
+    vs = media_probe.video_stream(path)
+    args = x264_args_for(path)
+    if not vs or not args or not vs.get("extradata_hash"):
+        return None
+    # The SEI does not say whether the source was encoded as constant frame rate
+    # (e.g. tune zerolatency), which sets fixed_frame_rate_flag; try both
+    at = args.index("-x264-params") + 1
+    with_cfr = args[:at] + [args[at] + ":force_cfr=1"] + args[at + 1:]
+    fd, probe_out = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        for candidate in (args, with_cfr):
+            cmd = [
+                "ffmpeg", "-hide_banner", "-v", "error", "-y",
+                "-f", "lavfi", "-i", f"color=c=black:s={vs['width']}x{vs['height']}:r={vs.get('r_frame_rate') or 30}",
+                "-frames:v", "2",
+                "-c:v", "libx264", "-pix_fmt", vs["pix_fmt"],
+            ] + candidate + [probe_out]
+            if subprocess.run(cmd).returncode != 0:
+                return None
+            if _extradata_hash(probe_out) == vs["extradata_hash"]:
+                return candidate
+        return None
+    finally:
+        os.unlink(probe_out)
@@ -1,12 +1,17 @@
 import argparse
+import hashlib
+import json
 import os
 import random
-import subprocess
-from typing import List, Tuple
+import tempfile
+from typing import Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
+from ffmpeg_writer import FFmpegWriter
+from frame_pipeline import run_frame_pipeline
+
 
 # ---------------------- Utils ----------------------
 
@@ -35,20 +40,68 @@ def clamp01(x: float) -> float:
 
 
 def overlay_bgra(base_bgr: np.ndarray, overlay_bgr: np.ndarray, overlay_alpha: np.ndarray):
-    # overlay_alpha expected in [0,1] float, shape (H,W)
-    for c in range(3):
-        base_bgr[:, :, c] = (
-            overlay_alpha * overlay_bgr[:, :, c] + (1.0 - overlay_alpha) * base_bgr[:, :, c]
-        ).astype(np.uint8)
+    # overlay_alpha expected in [0,1] float, shape (H,W); any matching ROI views work
+    a = overlay_alpha[:, :, None]
+    base_bgr[...] = (a * overlay_bgr + (1.0 - a) * base_bgr).astype(np.uint8)
+
+
+# ---------------------- Dirty boxes ----------------------
+# Motifs return the (x0, y0, x1, y1) box they drew into (x1/y1 exclusive, may
+# exceed the frame; clip_box trims it), or None when they drew nothing.
+# Canvases are reused across frames and only that box is cleared and blended,
+# so the box must cover everything drawn, anti-aliased edges included.
+
+Box = Tuple[int, int, int, int]
+_AA_PAD = 2
+
+
+def circle_box(x: int, y: int, r: int, thickness: int = 1) -> Box:
+    e = r + max(1, thickness) + _AA_PAD
+    return (x - e, y - e, x + e + 1, y + e + 1)
+
+
+def rect_box(x0: int, y0: int, x1: int, y1: int, thickness: int = 1) -> Box:
+    e = max(1, thickness) + _AA_PAD
+    return (min(x0, x1) - e, min(y0, y1) - e, max(x0, x1) + e + 1, max(y0, y1) + e + 1)
+
+
+def text_box(text: str, org: Tuple[int, int], font: int, scale: float, thickness: int) -> Box:
+    (tw, th), baseline = cv2.getTextSize(text, font, scale, thickness)
+    x, y = org
+    e = thickness + _AA_PAD
+    return (x - e, y - th - e, x + tw + e + 1, y + baseline + e + 1)
+
+
+def union_boxes(boxes) -> Optional[Box]:
+    boxes = [b for b in boxes if b is not None]
+    if not boxes:
+        return None
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
+
+def clip_box(box: Optional[Box], w: int, h: int) -> Optional[Box]:
+    if box is None:
+        return None
+    x0, y0 = max(0, box[0]), max(0, box[1])
+    x1, y1 = min(w, box[2]), min(h, box[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1, y1)
 
 
 # ---------------------- Motifs ----------------------
 
-def motif_loops(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_loops(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     cx, cy = int(w * 0.5), int(h * 0.5)
     n = 6
     radius = int(min(w, h) * 0.2)
+    boxes = []
     for i in range(n):
         angle = (t01 * 2 * np.pi) + (i * 2 * np.pi / n)
         x = int(cx + radius * np.cos(angle))
@@ -57,12 +110,15 @@ def motif_loops(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors
         cv2.circle(canvas_bgr, (x, y), 10, color, -1)
         cv2.circle(canvas_bgr, (x, y), 14, color, 2)
         cv2.circle(canvas_a, (x, y), 14, 1, -1)
+        boxes.append(circle_box(x, y, 14, 2))
+    return union_boxes(boxes)
 
 
-def motif_loops_v2(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_loops_v2(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     n = 20
     max_travel = 0.9 * min(w, h)
+    boxes = []
     for i in range(n):
         local = random.Random(1000 + i)
         x0 = local.uniform(0, w)
@@ -76,9 +132,11 @@ def motif_loops_v2(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, col
         color = colors[i % len(colors)]
         cv2.circle(canvas_bgr, (x, y), 6, color, -1)
         cv2.circle(canvas_a, (x, y), 8, 1, -1)
+        boxes.append(circle_box(x, y, 8))
+    return union_boxes(boxes)
 
 
-def motif_loops_v3(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_loops_v3(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     cx, cy = int(w * 0.5), int(h * 0.5)
     radius = int(min(w, h) * 0.28)
@@ -86,6 +144,7 @@ def motif_loops_v3(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, col
     base_angle = (t01 * 2 * np.pi) % (2 * np.pi)
     # phase offset so each circle chases the previous one
     phase_offset = np.deg2rad(35)
+    boxes = []
     for i in range(k):
         a = base_angle - i * phase_offset
         x = int(cx + radius * np.cos(a))
@@ -100,14 +159,18 @@ def motif_loops_v3(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, col
         yt = int(cy + radius * np.sin(a_trail))
         cv2.circle(canvas_bgr, (xt, yt), 10, color, -1)
         cv2.circle(canvas_a, (xt, yt), 12, 0.4, -1)
+        boxes.append(circle_box(x, y, 18, 2))
+        boxes.append(circle_box(xt, yt, 12))
+    return union_boxes(boxes)
 
 
-def motif_objects(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_objects(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     # Slightly smaller group dimensions
     group_w, group_h = int(w * 0.32), int(h * 0.16)
     gx = int((w - group_w) * 0.3 + (w * 0.4) * np.sin(t01 * 2 * np.pi * 0.5))
     gy = int((h - group_h) * 0.3 + (h * 0.2) * np.cos(t01 * 2 * np.pi * 0.5))
+    boxes = []
     for i in range(3):
         x = gx + i * int(group_w / 3) + 10
         y = gy + 10
@@ -115,16 +178,19 @@ def motif_objects(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colo
         color = colors[i % len(colors)]
         cv2.rectangle(canvas_bgr, (rect[0], rect[1]), (rect[0]+rect[2], rect[1]+rect[3]), color, 2)
         cv2.rectangle(canvas_a, (rect[0], rect[1]), (rect[0]+rect[2], rect[1]+rect[3]), 1, 2)
+        boxes.append(rect_box(rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3], 2))
     # Removed bottom connecting line
+    return union_boxes(boxes)
 
 
-def motif_list_numbers(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_list_numbers(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     n = 5
     box_w = int(w * 0.12)
     box_h = int(h * 0.12)
     start_x = int(w * 0.1)
     y = int(h * 0.8)
+    boxes = []
     for i in range(n):
         appear = clamp01((t01 * 1.2) - i * 0.15)
         if appear <= 0:
@@ -136,14 +202,19 @@ def motif_list_numbers(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float,
         cv2.rectangle(canvas_bgr, (x, y_anim - box_h), (x + box_w, y_anim), color, 2)
         cv2.rectangle(canvas_a, (x, y_anim - box_h), (x + box_w, y_anim), 1, 2)
         # number text
-        cv2.putText(canvas_bgr, str(i+1), (x + box_w//3, y_anim - box_h//3), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
-        cv2.putText(canvas_a, str(i+1), (x + box_w//3, y_anim - box_h//3), cv2.FONT_HERSHEY_SIMPLEX, 1, (1,1,1), 2, cv2.LINE_AA)
+        org = (x + box_w//3, y_anim - box_h//3)
+        cv2.putText(canvas_bgr, str(i+1), org, cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
+        cv2.putText(canvas_a, str(i+1), org, cv2.FONT_HERSHEY_SIMPLEX, 1, (1,1,1), 2, cv2.LINE_AA)
+        boxes.append(rect_box(x, y_anim - box_h, x + box_w, y_anim, 2))
+        boxes.append(text_box(str(i+1), org, cv2.FONT_HERSHEY_SIMPLEX, 1, 2))
+    return union_boxes(boxes)
 
 
-def motif_flow_lines(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_flow_lines(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     rng_state = int(t01 * 1000)
     local_rng = random.Random(rng_state)
+    boxes = []
     for i in range(20):
         y = int(local_rng.uniform(0, h))
         x1 = int(local_rng.uniform(0, w*0.3))
@@ -151,13 +222,16 @@ def motif_flow_lines(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, c
         color = colors[i % len(colors)]
         cv2.line(canvas_bgr, (x1, y), (min(w-1, x2), y), color, 1)
         cv2.line(canvas_a, (x1, y), (min(w-1, x2), y), 1, 1)
+        boxes.append(rect_box(x1, y, min(w - 1, x2), y))
+    return union_boxes(boxes)
 
 
-def motif_code_rain(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_code_rain(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     cols = 24
     col_w = max(8, w // cols)
     speed = int(150 * (0.5 + 0.5 * t01))
+    boxes = []
     for c in range(cols):
         x = c * col_w + 2
         y = int((t01 * speed + c * 37) % (h + 40)) - 40
@@ -170,14 +244,17 @@ def motif_code_rain(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, co
                 cv2.putText(canvas_bgr, glyph, (x, yy), cv2.FONT_HERSHEY_PLAIN, 1.2, color, 2, cv2.LINE_AA)
                 # Write the same glyph into alpha mask (value=1.0 means fully opaque before global opacity)
                 cv2.putText(canvas_a, glyph, (x, yy), cv2.FONT_HERSHEY_PLAIN, 1.2, 1, 2, cv2.LINE_AA)
+                boxes.append(text_box(glyph, (x, yy), cv2.FONT_HERSHEY_PLAIN, 1.2, 2))
+    return union_boxes(boxes)
 
 
-def draw_text_particles(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, text: str, colors: List[Tuple[int, int, int]]):
+def draw_text_particles(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, text: str, colors: List[Tuple[int, int, int]]) -> Optional[Box]:
     if not text:
-        return
+        return None
     tokens = text.split()
     h, w = canvas_bgr.shape[:2]
     base_y = int(h * 0.2)
+    boxes = []
     for i, token in enumerate(tokens):
         color = colors[i % len(colors)]
         x = int(w * 0.08 + i * (w * 0.28))
@@ -185,10 +262,12 @@ def draw_text_particles(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float
         alpha = clamp01(0.4 + 0.6 * ease(t01))
         cv2.putText(canvas_bgr, token, (x, y), cv2.FONT_HERSHEY_TRIPLEX, 2.2, color, 3, cv2.LINE_AA)
         cv2.putText(canvas_a, token, (x, y), cv2.FONT_HERSHEY_TRIPLEX, 2.2, (alpha, alpha, alpha), 3, cv2.LINE_AA)
+        boxes.append(text_box(token, (x, y), cv2.FONT_HERSHEY_TRIPLEX, 2.2, 3))
+    return union_boxes(boxes)
 
 
 # New motif: grid pulse
-def motif_grid_pulse(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_grid_pulse(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     step = max(24, min(w, h) // 20)
     color = colors[0] if colors else (0, 255, 0)
@@ -210,10 +289,11 @@ def motif_grid_pulse(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, c
                 x2, y2 = min(w - 1, gx + step - 2), min(h - 1, gy + step - 2)
                 cv2.rectangle(canvas_bgr, (x1, y1), (x2, y2), color, -1)
                 cv2.rectangle(canvas_a, (x1, y1), (x2, y2), a, -1)
+    return (0, 0, w, h)
 
 
 # New motif: scanlines sweep
-def motif_scanlines(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_scanlines(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     band_h = max(8, h // 14)
     # Sweep from top to bottom and loop
@@ -228,10 +308,13 @@ def motif_scanlines(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, co
             t = (yy - y1) / max(1, (y2 - y1))
             a = 0.15 + 0.25 * (1.0 - abs(2 * t - 1))  # peak in middle
             canvas_a[yy:yy + 1, 0:w] = np.maximum(canvas_a[yy:yy + 1, 0:w], a)
+        # The filled rectangle includes row y2
+        return (0, y1, w, y2 + 1)
+    return None
 
 
 # New motif: constellation (nodes + connecting lines)
-def motif_constellation(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_constellation(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     n = 12
     # Deterministic pseudo positions that drift slightly with t01
@@ -257,9 +340,11 @@ def motif_constellation(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float
                 color = colors[(i + j) % len(colors)]
                 cv2.line(canvas_bgr, (x1, y1), (x2, y2), color, 1)
                 cv2.line(canvas_a, (x1, y1), (x2, y2), 1, 1)
+    # Lines only join nodes, so the node boxes cover them
+    return union_boxes([circle_box(x, y, 4) for x, y in nodes])
 
 # New motif: waveform bars
-def motif_waveform(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_waveform(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     # Fewer bars and smaller height (~4cm ≈ ~150px), for a compact waveform
     bars = 20
@@ -267,6 +352,7 @@ def motif_waveform(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, col
     base_y = int(h * 0.78)
     max_h = min(int(h * 0.15), 150)
     base_color = colors[0] if colors else (0, 255, 255)
+    boxes = []
     for i in range(bars):
         phase = (t01 * 4.0 + i * 0.2)
         val = 0.5 + 0.5 * np.sin(phase * 2 * np.pi)
@@ -277,10 +363,12 @@ def motif_waveform(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, col
         y2 = base_y
         cv2.rectangle(canvas_bgr, (x1, y1), (x2, y2), base_color, -1)
         cv2.rectangle(canvas_a, (x1, y1), (x2, y2), 0.35 + 0.35 * val, -1)
+        boxes.append(rect_box(x1, y1, x2, y2))
+    return union_boxes(boxes)
 
 
 # New motif: radar sweep
-def motif_radar(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random):
+def motif_radar(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors: List[Tuple[int, int, int]], rng: random.Random) -> Optional[Box]:
     h, w = canvas_bgr.shape[:2]
     cx, cy = int(w * 0.15), int(h * 0.8)  # place radar bottom-leftish
     radius = int(min(w, h) * 0.25)
@@ -303,6 +391,176 @@ def motif_radar(canvas_bgr: np.ndarray, canvas_a: np.ndarray, t01: float, colors
     for r in (radius // 3, 2 * radius // 3):
         cv2.circle(canvas_bgr, (cx, cy), r, color, 1)
         cv2.circle(canvas_a, (cx, cy), r, 1, 1)
+    return circle_box(cx, cy, radius, 2)
+
+# ---------------------- Sprite cache ----------------------
+# A window's motif layer depends only on the motifs, text, frame size, palette,
+# frame count, easing and seed, not on the video underneath. It is rendered once
+# into <key>.rgba (each frame's dirty box as RGBA uint8, back to back) plus
+# <key>.boxes.npy (x0, y0, x1, y1, byte offset per frame; x0 = -1 when empty),
+# and later runs memory-map and replay it. Opacity and fade are applied at
+# composite time, so they are not part of the key.
+# The cache is opt-in (--sprite-cache / $MOTIF_CACHE_DIR) and bounded: least
+# recently used entries are evicted past the byte limit, and a window whose
+# layer alone would not fit is drawn directly instead of cached.
+
+SPRITE_CACHE_VERSION = 1
+SPRITE_CACHE_MAX_MB = 2048
+
+
+def display_text_for(text: str) -> Optional[str]:
+    """Text drawn by draw_text_particles when the keywords ask for it, else None."""
+    if "text" not in text.lower():
+        return None
+    tl = text.lower().lstrip()
+    if tl.startswith("text "):
+        return text[len(text) - len(tl) + 5:]
+    if tl == "text":
+        return ""
+    return text
+
+
+def draw_motif_layer(overlay: np.ndarray, alpha: np.ndarray, t_eased: float, motifs, display_text: Optional[str], colors, rng: random.Random) -> Optional[Box]:
+    boxes = [m(overlay, alpha, t_eased, colors, rng) for m in motifs]
+    if display_text is not None:
+        boxes.append(draw_text_particles(overlay, alpha, t_eased, display_text, colors))
+    h, w = alpha.shape[:2]
+    return clip_box(union_boxes(boxes), w, h)
+
+
+def motif_sprite_key(motifs, display_text: Optional[str], width: int, height: int, colors, n_frames: int, easing: str, seed: Optional[int]) -> str:
+    params = {
+        "version": SPRITE_CACHE_VERSION,
+        "motifs": [m.__name__ for m in motifs],
+        "text": display_text,
+        "size": [width, height],
+        "colors": [list(c) for c in colors],
+        "frames": n_frames,
+        "easing": easing,
+        "seed": seed,
+    }
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def render_motif_sprites(prefix: str, motifs, display_text: Optional[str], width: int, height: int, colors, n_frames: int, easing: str, rng: random.Random, max_bytes: Optional[int] = None) -> bool:
+    """Render the layer to prefix.rgba / prefix.boxes.npy. Gives up (writes nothing,
+    returns False) once the data exceeds max_bytes or, after a few frames, is on
+    course to.
+    """
+    overlay = np.zeros((height, width, 3), dtype=np.uint8)
+    alpha = np.zeros((height, width), dtype=np.float32)
+    boxes = np.full((n_frames, 5), -1, dtype=np.int64)
+    directory = os.path.dirname(prefix)
+    fd, tmp_data = tempfile.mkstemp(prefix=".sprites_", dir=directory)
+    offset = 0
+    dirty: Optional[Box] = None
+    with os.fdopen(fd, "wb") as f:
+        for i in range(n_frames):
+            if dirty is not None:
+                x0, y0, x1, y1 = dirty
+                overlay[y0:y1, x0:x1] = 0
+                alpha[y0:y1, x0:x1] = 0
+            t_eased = ease(i / max(1, n_frames), easing)
+            dirty = draw_motif_layer(overlay, alpha, t_eased, motifs, display_text, colors, rng)
+            if dirty is None:
+                continue
+            x0, y0, x1, y1 = dirty
+            rgba = np.empty((y1 - y0, x1 - x0, 4), dtype=np.uint8)
+            rgba[:, :, :3] = overlay[y0:y1, x0:x1]
+            rgba[:, :, 3] = np.rint(np.clip(alpha[y0:y1, x0:x1], 0.0, 1.0) * 255.0)
+            f.write(rgba.tobytes())
+            boxes[i] = (x0, y0, x1, y1, offset)
+            offset += rgba.nbytes
+            if max_bytes is not None and (offset > max_bytes or (i >= 8 and offset / (i + 1) * n_frames > max_bytes)):
+                break
+        else:
+            max_bytes = None
+    if max_bytes is not None:
+        os.remove(tmp_data)
+        return False
+    os.replace(tmp_data, prefix + ".rgba")
+    # The box index is written last; its presence marks a complete entry
+    fd, tmp_boxes = tempfile.mkstemp(prefix=".sprites_", suffix=".npy", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, boxes)
+    os.replace(tmp_boxes, prefix + ".boxes.npy")
+    return True
+
+
+class SpriteSequence:
+    """Read-only view of a rendered motif layer; frame(i) gives (box, rgba) or None."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.boxes = np.load(prefix + ".boxes.npy")
+        size = os.path.getsize(prefix + ".rgba")
+        self.data = np.memmap(prefix + ".rgba", dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def frame(self, i: int) -> Optional[Tuple[Box, np.ndarray]]:
+        x0, y0, x1, y1, offset = (int(v) for v in self.boxes[i])
+        if x0 < 0:
+            return None
+        n = (y1 - y0) * (x1 - x0) * 4
+        return (x0, y0, x1, y1), self.data[offset:offset + n].reshape(y1 - y0, x1 - x0, 4)
+
+
+def load_motif_sprites(cache_dir: str, motifs, display_text: Optional[str], width: int, height: int, colors, n_frames: int, easing: str, seed: Optional[int], rng: random.Random, max_bytes: int) -> Optional[SpriteSequence]:
+    """Cached layer for a window, rendering it on a miss. None when the layer is too
+    large to cache; rng is then left as it was, so direct drawing matches an uncached run.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = os.path.join(cache_dir, motif_sprite_key(motifs, display_text, width, height, colors, n_frames, easing, seed))
+    if os.path.exists(prefix + ".boxes.npy") and os.path.exists(prefix + ".rgba"):
+        print(f"motif sprites: cache hit {prefix}")
+        # Bump mtime so eviction treats this entry as recently used
+        for ext in (".rgba", ".boxes.npy"):
+            os.utime(prefix + ext, None)
+    else:
+        print(f"motif sprites: rendering {n_frames} frames to {prefix}")
+        state = rng.getstate()
+        if not render_motif_sprites(prefix, motifs, display_text, width, height, colors, n_frames, easing, rng, max_bytes):
+            print(f"motif sprites: layer larger than the {max_bytes / (1024 * 1024):g} MB cache limit, drawing directly")
+            rng.setstate(state)
+            return None
+    return SpriteSequence(prefix)
+
+
+def evict_motif_sprites(cache_dir: str, max_bytes: int, keep: List[str]) -> int:
+    """Drop least recently used entries (both files of a key) until the cache fits in
+    max_bytes, never touching the prefixes in keep. Returns entries removed.
+    """
+    entries: Dict[str, List] = {}
+    for name in os.listdir(cache_dir):
+        if name.startswith("."):
+            continue
+        key = name.split(".", 1)[0]
+        try:
+            st = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        e = entries.setdefault(key, [0.0, 0])
+        e[0] = max(e[0], st.st_mtime)
+        e[1] += st.st_size
+    total = sum(size for _, size in entries.values())
+    keep_keys = {os.path.basename(k) for k in keep}
+    removed = 0
+    for key, (_, size) in sorted(entries.items(), key=lambda kv: kv[1][0]):
+        if total <= max_bytes:
+            break
+        if key in keep_keys:
+            continue
+        for ext in (".rgba", ".boxes.npy"):
+            try:
+                os.remove(os.path.join(cache_dir, key + ext))
+            except OSError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
 
 # ---------------------- Main ----------------------
 
@@ -310,8 +568,14 @@ def parse_args():
     p = argparse.ArgumentParser(description="Overlay animated tech shapes/text onto a base video.")
     p.add_argument("--video", required=True, help="Path to input base video (with or without audio)")
     p.add_argument("--out", required=True, help="Path to output video")
-    p.add_argument("--start", type=float, required=True, help="Start time in seconds for animation window")
-    p.add_argument("--duration", type=float, required=True, help="Duration in seconds of animation window")
+    p.add_argument("--start", type=float, default=None, help="Start time in seconds for animation window")
+    p.add_argument("--duration", type=float, default=None, help="Duration in seconds of animation window")
+    p.add_argument(
+        "--timeline",
+        default=None,
+        help="JSON list of windows (or {\"windows\": [...]}) applied in one pass; each has start, duration and "
+        "optional text, palette, opacity, easing, fade_in, fade_out (defaults from the flags). Replaces --start/--duration",
+    )
     p.add_argument("--text", type=str, default="", help="Keywords to influence animations, e.g. 'python loops'")
     p.add_argument("--seed", type=int, default=None, help="Random seed for determinism")
     p.add_argument("--opacity", type=float, default=0.85, help="Global overlay opacity [0-1]")
@@ -319,7 +583,54 @@ def parse_args():
     p.add_argument("--fade-out", dest="fade_out", type=float, default=0.3, help="Seconds for fade-out")
     p.add_argument("--easing", type=str, default="ease-in-out", choices=["linear", "ease-in-out"], help="Easing function")
     p.add_argument("--palette", type=str, default="#00FFC8,#19A7F6,#9B59B6,#F39C12,#E74C3C", help="Comma hex colors")
-    return p.parse_args()
+    p.add_argument(
+        "--sprite-cache",
+        dest="sprite_cache",
+        default=os.environ.get("MOTIF_CACHE_DIR"),
+        help="Directory for pre-rendered motif layers reused across runs (default: $MOTIF_CACHE_DIR; "
+        "without either, motifs are drawn every frame)",
+    )
+    p.add_argument(
+        "--sprite-cache-max-mb",
+        dest="sprite_cache_max_mb",
+        type=float,
+        default=float(os.environ.get("MOTIF_CACHE_MAX_MB", SPRITE_CACHE_MAX_MB)),
+        help=f"Size limit of the sprite cache; least recently used layers are evicted (default: $MOTIF_CACHE_MAX_MB or {SPRITE_CACHE_MAX_MB})",
+    )
+    p.add_argument("--no-sprite-cache", dest="no_sprite_cache", action="store_true", help="Draw motifs every frame even if a sprite cache is configured")
+    args = p.parse_args()
+    if args.timeline is None and (args.start is None or args.duration is None):
+        p.error("--start and --duration are required unless --timeline is given")
+    return args
+
+
+def load_windows(args) -> List[dict]:
+    """Animation windows from --timeline, or the single --start/--duration window."""
+    defaults = {
+        "text": args.text,
+        "palette": args.palette,
+        "opacity": args.opacity,
+        "easing": args.easing,
+        "fade_in": args.fade_in,
+        "fade_out": args.fade_out,
+    }
+    if args.timeline is None:
+        return [dict(defaults, start=args.start, duration=args.duration)]
+    with open(args.timeline, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("windows", [])
+    windows = []
+    for i, entry in enumerate(data):
+        if "start" not in entry or "duration" not in entry:
+            raise ValueError(f"Timeline window #{i} needs start and duration")
+        win = dict(defaults, **entry)
+        for key in ("start", "duration", "opacity", "fade_in", "fade_out"):
+            win[key] = float(win[key])
+        if win["easing"] not in ("linear", "ease-in-out"):
+            raise ValueError(f"Timeline window #{i}: unknown easing {win['easing']!r}")
+        windows.append(win)
+    return windows
 
 
 def pick_motifs_from_text(text: str):
@@ -370,142 +681,118 @@ def main():
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 else None
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    windows = load_windows(args)
+
     out_dir = os.path.dirname(args.out)
     if out_dir:
         os.makedirs(out_dir, exist_ok=True)
-    writer = cv2.VideoWriter(args.out, fourcc, fps, (width, height))
+    cache_dir = None if args.no_sprite_cache else args.sprite_cache
+    cache_max = int(args.sprite_cache_max_mb * 1024 * 1024)
+    cached_prefixes: List[str] = []
+
+    for win in windows:
+        win["start_f"] = max(0, int(win["start"] * fps))
+        win["end_f"] = win["start_f"] + max(0, int(win["duration"] * fps))
+        if total_frames is not None:
+            win["end_f"] = min(win["end_f"], total_frames)
+        colors = parse_color_hex_list(win["palette"])
+        if not colors:
+            colors = [(200, 255, 200), (255, 200, 255), (200, 200, 255)]
+        win["colors"] = colors
+        motifs = pick_motifs_from_text(win["text"])
+        win["display_text"] = display_text_for(win["text"])
+        if win["display_text"] is not None:
+            motifs = []
+        win["motifs"] = motifs
+        win["sprites"] = None
+        n_frames = win["end_f"] - win["start_f"]
+        if cache_dir and n_frames > 0:
+            win["sprites"] = load_motif_sprites(
+                cache_dir, motifs, win["display_text"], width, height, colors, n_frames, win["easing"], args.seed, rng, cache_max
+            )
+            if win["sprites"] is not None:
+                cached_prefixes.append(win["sprites"].prefix)
+        # Direct drawing only: canvases are allocated when the window starts and
+        # dropped when it ends; each frame clears only the box the previous one drew in
+        win["overlay"] = None
+        win["alpha"] = None
+        win["dirty"] = None
+    if cached_prefixes:
+        evicted = evict_motif_sprites(cache_dir, cache_max, cached_prefixes)
+        if evicted:
+            print(f"motif sprites: evicted {evicted} cached layer(s) over the size limit")
+
+    # H.264 straight from the frame pipe, with the input audio muxed in the same ffmpeg run
+    writer = FFmpegWriter(args.out, fps, (width, height), audio_from=args.video)
     if not writer.isOpened():
         raise RuntimeError(f"Failed to open output writer for: {args.out}")
 
-    start_f = max(0, int(args.start * fps))
-    end_f = start_f + max(0, int(args.duration * fps))
-    if total_frames is not None:
-        end_f = min(end_f, total_frames)
-
-    colors = parse_color_hex_list(args.palette)
-    if not colors:
-        colors = [(200, 255, 200), (255, 200, 255), (200, 200, 255)]
-
-    motifs = pick_motifs_from_text(args.text)
-    if "text" in args.text.lower():
-        motifs = []
-
-    frame_idx = 0
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-
-        if start_f <= frame_idx < end_f:
-            # Local normalized time in window
-            t01 = (frame_idx - start_f) / max(1, (end_f - start_f))
-            t_eased = ease(t01, args.easing)
-
-            # Fade factor
-            fade = 1.0
-            fade_in_frames = int(args.fade_in * fps)
-            fade_out_frames = int(args.fade_out * fps)
-            if frame_idx - start_f < fade_in_frames:
-                fade = (frame_idx - start_f) / max(1, fade_in_frames)
-            if end_f - frame_idx <= fade_out_frames:
-                fade = min(fade, (end_f - frame_idx) / max(1, fade_out_frames))
-            fade = clamp01(fade)
-
-            # Prepare overlay canvas
-            overlay = np.zeros_like(frame, dtype=np.uint8)
-            alpha = np.zeros((height, width), dtype=np.float32)
-
-            # Draw motifs
-            for m in motifs:
-                m(overlay, alpha, t_eased, colors, rng)
-
-            # Text overlay if requested via keyword "text"
-            if "text" in args.text.lower():
-                txt = args.text
-                tl = txt.lower().lstrip()
-                if tl.startswith("text "):
-                    display_text = txt[len(txt) - len(tl) + 5:]
-                elif tl == "text":
-                    display_text = ""
-                else:
-                    display_text = txt
-                draw_text_particles(overlay, alpha, t_eased, display_text, colors)
-
-            # Normalize alpha channel and apply global opacity and fade
-            alpha = np.clip(alpha, 0.0, 1.0)
-            alpha *= (args.opacity * fade)
-
-            overlay_bgra(frame, overlay, alpha)
-
-        # Write original frame or composited frame (duration unchanged)
-        writer.write(frame)
-        frame_idx += 1
-
-        # If unknown total frames, stop at end of window? No: keep entire original duration.
+    def compose_window(win: dict, frame_idx: int, frame: np.ndarray) -> None:
+        start_f, end_f = win["start_f"], win["end_f"]
+
+        # Fade factor
+        fade = 1.0
+        fade_in_frames = int(win["fade_in"] * fps)
+        fade_out_frames = int(win["fade_out"] * fps)
+        if frame_idx - start_f < fade_in_frames:
+            fade = (frame_idx - start_f) / max(1, fade_in_frames)
+        if end_f - frame_idx <= fade_out_frames:
+            fade = min(fade, (end_f - frame_idx) / max(1, fade_out_frames))
+        fade = clamp01(fade)
+
+        if win["sprites"] is not None:
+            item = win["sprites"].frame(frame_idx - start_f)
+            if item is None:
+                return
+            (x0, y0, x1, y1), rgba = item
+            roi_a = rgba[:, :, 3].astype(np.float32) * (win["opacity"] * fade / 255.0)
+            overlay_bgra(frame[y0:y1, x0:x1], rgba[:, :, :3], roi_a)
+            return
+
+        # Local normalized time in window
+        t01 = (frame_idx - start_f) / max(1, (end_f - start_f))
+        t_eased = ease(t01, win["easing"])
+
+        if win["overlay"] is None:
+            win["overlay"] = np.zeros((height, width, 3), dtype=np.uint8)
+            win["alpha"] = np.zeros((height, width), dtype=np.float32)
+        overlay, alpha = win["overlay"], win["alpha"]
+
+        # Clear what the previous frame left on the canvases
+        if win["dirty"] is not None:
+            x0, y0, x1, y1 = win["dirty"]
+            overlay[y0:y1, x0:x1] = 0
+            alpha[y0:y1, x0:x1] = 0
+
+        # Draw motifs, plus text particles if requested via keyword "text"
+        box = draw_motif_layer(overlay, alpha, t_eased, win["motifs"], win["display_text"], win["colors"], rng)
+        win["dirty"] = box
+        if box is None:
+            return
+        x0, y0, x1, y1 = box
+
+        # Normalize alpha channel and apply global opacity and fade, inside the dirty box only
+        roi_a = alpha[y0:y1, x0:x1]
+        np.clip(roi_a, 0.0, 1.0, out=roi_a)
+        roi_a *= (win["opacity"] * fade)
+
+        overlay_bgra(frame[y0:y1, x0:x1], overlay[y0:y1, x0:x1], roi_a)
+
+    def compose(frame_idx: int, frame: np.ndarray) -> None:
+        # Windows are applied in timeline order, so later entries draw on top
+        for win in windows:
+            if win["start_f"] <= frame_idx < win["end_f"]:
+                compose_window(win, frame_idx, frame)
+            elif frame_idx >= win["end_f"] and win["overlay"] is not None:
+                win["overlay"] = win["alpha"] = win["dirty"] = None
+
+    # Decode, compose and encode overlap on separate threads; every frame is written,
+    # so the original duration is unchanged
+    run_frame_pipeline(cap, writer, compose)
 
     cap.release()
     writer.release()
 
-    # Preserve original audio: mux input audio back into the output
-    def _has_audio(path: str) -> bool:
-        try:
-            r = subprocess.run(
-                [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-select_streams",
-                    "a",
-                    "-show_entries",
-                    "stream=index",
-                    "-of",
-                    "csv=p=0",
-                    path,
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-            )
-            return bool(r.stdout.strip())
-        except Exception:
-            return False
-
-    try:
-        if _has_audio(args.video):
-            tmp_out = args.out + ".mux.mp4"
-            # Copy video from our render and copy audio from original without re-encoding
-            cmd = [
-                "ffmpeg",
-                "-y",
-                "-i",
-                args.out,
-                "-i",
-                args.video,
-                "-map",
-                "0:v:0",
-                "-map",
-                "1:a:0",
-                "-c:v",
-                "copy",
-                "-c:a",
-                "copy",
-                tmp_out,
-            ]
-            r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if r.returncode == 0 and os.path.exists(tmp_out):
-                try:
-                    os.replace(tmp_out, args.out)
-                except Exception:
-                    pass
-            else:
-                if os.path.exists(tmp_out):
-                    os.remove(tmp_out)
-        # if no audio, do nothing (keep video-only)
-    except Exception:
-        # On any failure, keep the existing args.out as is
-        pass
-
 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,19 @@
 import argparse
 import os
 import random
-from typing import Tuple
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
 
+import h264_match
+import media_probe
+from ffmpeg_writer import FFmpegWriter
+from frame_pipeline import run_frame_pipeline
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Overlay a randomly moving cursor onto a video.")
@@ -18,6 +26,27 @@ def parse_args():
     parser.add_argument("--start", type=float, default=0.0, help="Start time in seconds for the cursor animation (default: 0)")
     parser.add_argument("--speed", type=float, default=300.0, help="Average cursor speed in pixels/second (default: 300)")
     parser.add_argument("--segment", type=float, default=0.5, help="Average seconds per movement segment/direction (default: 0.5)")
+    parser.add_argument(
+        "--waypoints",
+        default=None,
+        help='Move through these points instead of randomly, e.g. "400,300;900,200;1200,650" '
+        "(top-left of the cursor, pixels); the first point is also the static position before --start",
+    )
+    parser.add_argument(
+        "--path-mode",
+        choices=["bezier", "ease"],
+        default="bezier",
+        help="With --waypoints: one smooth curve through all points (bezier) or eased straight legs (ease)",
+    )
+    parser.add_argument("--easing", choices=["linear", "ease-in-out"], default="ease-in-out", help="Easing for --waypoints paths")
+    parser.add_argument(
+        "--window-only",
+        action="store_true",
+        help="Draw the cursor only while it moves and re-encode just that span; the rest is stream-copied "
+        "from the input, so the static cursor before/after the movement is not shown. Inputs that can't be "
+        "spliced (not H.264, or headers libx264 can't reproduce) get the normal full render, static cursor "
+        "included (default: static cursor on the whole video, full re-encode)",
+    )
     return parser.parse_args()
 
 
@@ -50,9 +79,22 @@ def load_cursor(cursor_path: str, scale: float) -> Tuple[np.ndarray, np.ndarray]
     return bgr, alpha_f
 
 
-def overlay_cursor(frame: np.ndarray, cursor_bgr: np.ndarray, cursor_alpha: np.ndarray, x: int, y: int):
+def prepare_cursor(cursor_bgr: np.ndarray, cursor_alpha: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Precompute the per-frame blend terms once, in 8-bit fixed point.
+
+    Returns (premul, inv_alpha) as uint16: premul = bgr * a + 128 (the +128 rounds
+    the later /255) and inv_alpha = 255 - a with a trailing channel axis so it
+    broadcasts over BGR. bgr*a + roi*(255-a) + 128 stays below 2**16.
+    """
+    a = np.rint(cursor_alpha * 255.0).astype(np.uint16)[:, :, None]
+    premul = cursor_bgr.astype(np.uint16) * a + 128
+    inv_alpha = (255 - a).astype(np.uint16)
+    return premul, inv_alpha
+
+
+def overlay_cursor(frame: np.ndarray, cursor_premul: np.ndarray, cursor_inv_alpha: np.ndarray, x: int, y: int):
     h, w = frame.shape[:2]
-    ch, cw = cursor_bgr.shape[:2]
+    ch, cw = cursor_premul.shape[:2]
 
     # Clamp position to frame bounds (top-left placement)
     x = max(0, min(x, w - cw))
@@ -60,11 +102,12 @@ def overlay_cursor(frame: np.ndarray, cursor_bgr: np.ndarray, cursor_alpha: np.n
 
     roi = frame[y:y+ch, x:x+cw]
 
-    # Alpha blending per channel
-    for c in range(0, 3):
-        roi[:, :, c] = (cursor_alpha * cursor_bgr[:, :, c] + (1.0 - cursor_alpha) * roi[:, :, c]).astype(np.uint8)
-
-    frame[y:y+ch, x:x+cw] = roi
+    # out = (bgr*a + roi*(255-a) + 128) / 255, with the divide done as (v + (v >> 8)) >> 8
+    acc = np.multiply(roi, cursor_inv_alpha, dtype=np.uint16)
+    acc += cursor_premul
+    acc += acc >> 8
+    acc >>= 8
+    roi[...] = acc
 
 
 def random_directions(rng: random.Random, n: int) -> np.ndarray:
@@ -113,32 +156,313 @@ def generate_path(
         remaining -= seg
     frames.append(remaining)
 
-    positions = []
-    for seg_len, d in zip(frames, dirs):
-        # Add slight jitter to speed
-        speed_jitter = max(0.0, rng.gauss(mu=speed_pf, sigma=speed_pf * 0.2))
-        dx = d[0] * speed_jitter
-        dy = d[1] * speed_jitter
-        for _ in range(seg_len):
-            # Move
-            x += dx
-            y += dy
-            # Bounce off borders
-            if x < 0:
-                x = -x
-                dx = -dx
-            if y < 0:
-                y = -y
-                dy = -dy
-            if x > width - cursor_w:
-                x = 2 * (width - cursor_w) - x
-                dx = -dx
-            if y > height - cursor_h:
-                y = 2 * (height - cursor_h) - y
-                dy = -dy
-            positions.append((int(x), int(y)))
-
-    return np.array(positions, dtype=np.int32)
+    # Same rng draws as the per-frame loop this replaces, so a seed gives the same path
+    speeds = [max(0.0, rng.gauss(mu=speed_pf, sigma=speed_pf * 0.2)) for _ in frames]
+
+    frames_arr = np.array(frames, dtype=np.int64)
+    vel = dirs[:len(frames)].astype(np.float64) * np.array(speeds)[:, None]
+    positions = np.empty((total_frames, 2), dtype=np.int32)
+    positions[:, 0] = bounce_axis(float(x), vel[:, 0], frames_arr, width - cursor_w)
+    positions[:, 1] = bounce_axis(float(y), vel[:, 1], frames_arr, height - cursor_h)
+    return positions
+
+
+def bounce_axis(start: float, seg_vel: np.ndarray, seg_frames: np.ndarray, upper: float) -> np.ndarray:
+    """Positions along one axis for a cursor that bounces off 0 and upper, with a new
+    velocity per segment. Works in the unfolded coordinate: one cumsum over all frames,
+    then one triangle-wave fold. Each segment's velocity is flipped when it starts on a
+    mirrored stretch of the unfolded line, so it points the way the fresh random
+    direction says on screen (what resetting dx/dy per segment did).
+    """
+    if upper <= 0:
+        return np.zeros(int(seg_frames.sum()), dtype=np.float64)
+    period = 2.0 * upper
+    unfolded_vel = np.empty_like(seg_vel)
+    u = start
+    for k, (v, n) in enumerate(zip(seg_vel, seg_frames)):
+        v = float(v) if (u % period) <= upper else -float(v)
+        unfolded_vel[k] = v
+        u += v * int(n)
+    # start goes into the cumsum so the additions happen in the same order as x += dx
+    steps = np.concatenate([[start], np.repeat(unfolded_vel, seg_frames)])
+    return fold_into_range(np.cumsum(steps)[1:], upper)
+
+
+def fold_into_range(values: np.ndarray, upper: float) -> np.ndarray:
+    """Reflect an unbounded 1-D trajectory into [0, upper] (triangle wave).
+    Equivalent to bouncing off 0 and upper at every step.
+    """
+    if upper <= 0:
+        return np.zeros_like(values)
+    m = np.mod(values, 2.0 * upper)
+    return upper - np.abs(m - upper)
+
+
+def ease_array(t: np.ndarray, mode: str = "ease-in-out") -> np.ndarray:
+    t = np.clip(t, 0.0, 1.0)
+    if mode == "linear":
+        return t
+    # smoothstep, same curve as main-shapes.py's ease()
+    return t * t * (3 - 2 * t)
+
+
+def parse_waypoints(spec: str) -> np.ndarray:
+    """Parse "x1,y1;x2,y2;..." into a (K, 2) float array."""
+    pts = []
+    for chunk in spec.split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        xs, ys = chunk.split(",")
+        pts.append((float(xs), float(ys)))
+    if not pts:
+        raise ValueError("--waypoints needs at least one x,y point")
+    return np.array(pts, dtype=np.float64)
+
+
+def waypoint_path(
+    waypoints: np.ndarray,
+    n_frames: int,
+    width: int,
+    height: int,
+    cursor_w: int,
+    cursor_h: int,
+    mode: str = "bezier",
+    easing: str = "ease-in-out",
+) -> np.ndarray:
+    """Cursor path through waypoints, one position per frame, as int32 (N, 2).
+
+    mode "ease": straight legs, each eased so the cursor settles on every waypoint.
+    mode "bezier": one smooth curve (Catmull-Rom as cubic Bezier legs) with the
+    easing applied to the whole path. Frames are split across legs by leg length.
+    """
+    if n_frames <= 0:
+        return np.zeros((0, 2), dtype=np.int32)
+    pts = waypoints.astype(np.float64)
+    pts[:, 0] = np.clip(pts[:, 0], 0, max(0, width - cursor_w))
+    pts[:, 1] = np.clip(pts[:, 1], 0, max(0, height - cursor_h))
+    if len(pts) == 1:
+        return np.repeat(pts.astype(np.int32), n_frames, axis=0)
+
+    leg_len = np.maximum(np.linalg.norm(np.diff(pts, axis=0), axis=1), 1e-6)
+    cum = np.concatenate([[0.0], np.cumsum(leg_len)])
+    g = np.linspace(0.0, 1.0, n_frames)
+    if mode == "bezier":
+        g = ease_array(g, easing)
+    dist = g * cum[-1]
+    leg = np.clip(np.searchsorted(cum, dist, side="right") - 1, 0, len(leg_len) - 1)
+    u = (dist - cum[leg]) / leg_len[leg]
+
+    p0 = pts[leg]
+    p1 = pts[leg + 1]
+    if mode == "ease":
+        u = ease_array(u, easing)[:, None]
+        out = p0 + (p1 - p0) * u
+    else:
+        # Catmull-Rom tangents, end points duplicated
+        padded = np.vstack([pts[:1], pts, pts[-1:]])
+        c1 = p0 + (padded[leg + 2] - padded[leg]) / 6.0
+        c2 = p1 - (padded[leg + 3] - padded[leg + 1]) / 6.0
+        u = u[:, None]
+        v = 1.0 - u
+        out = v * v * v * p0 + 3 * v * v * u * c1 + 3 * v * u * u * c2 + u * u * u * p1
+        out[:, 0] = np.clip(out[:, 0], 0, max(0, width - cursor_w))
+        out[:, 1] = np.clip(out[:, 1], 0, max(0, height - cursor_h))
+    return out.astype(np.int32)
+
+
+def keyframe_times(path: str) -> List[Tuple[float, int]]:
+    """Sorted (timestamp, packet index in decode order) of the video keyframes, from
+    packet flags (no decode). The index counts packets an edit list hides as well.
+    """
+    try:
+        res = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags",
+                "-of", "csv=p=0",
+                path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        )
+    except Exception:
+        return []
+    keyframes = []
+    for index, line in enumerate(res.stdout.splitlines()):
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            keyframes.append((float(parts[0]), index))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def packet_count(path: str) -> Optional[int]:
+    """Number of video packets in path (read without decoding), None if ffprobe fails."""
+    try:
+        res = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-count_packets",
+                "-show_entries", "stream=nb_read_packets",
+                "-of", "csv=p=0",
+                path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        )
+        return int(res.stdout.strip())
+    except Exception:
+        return None
+
+
+def render_window_only(
+    args,
+    cap,
+    fps: float,
+    width: int,
+    height: int,
+    start_frame: int,
+    end_frame: int,
+    positions: np.ndarray,
+    cursor_premul: np.ndarray,
+    cursor_inv_alpha: np.ndarray,
+) -> bool:
+    """Re-encode only the GOPs that cover [start_frame, end_frame) and splice them
+    between stream-copied head and tail parts of the input. Audio is copied as is.
+    The re-encode reproduces the input's SPS/PPS (see h264_match), which the copied
+    GOPs are decoded with after the join.
+    Returns False (nothing written) when the input can't be spliced by stream copy.
+    """
+    vs = media_probe.video_stream(args.video)
+    if not vs or vs.get("codec_name") != "h264":
+        print("window-only: input is not h264, falling back to a full re-encode")
+        return False
+    enc_args = h264_match.matched_x264_args(args.video)
+    if enc_args is None:
+        print("window-only: can't reproduce the input's H.264 headers (SPS/PPS), falling back to a full re-encode")
+        return False
+    keyframes = keyframe_times(args.video)
+    if not keyframes:
+        print("window-only: no keyframes found, falling back to a full re-encode")
+        return False
+
+    # Keyframe pts are absolute, frame indices count from the video stream's first
+    # pts and input -ss from the container's start; a start offset or an edit list
+    # moves these off 0 (and apart, when audio starts earlier than video)
+    def start_of(entry: dict) -> float:
+        try:
+            return float(entry.get("start_time") or 0.0)
+        except ValueError:
+            return 0.0
+
+    v_start = start_of(vs)
+    seek_base = start_of(media_probe.probe(args.video)["format"]) - v_start
+    keyframes = [(k - v_start, index) for k, index in keyframes]
+
+    # Widen the window to keyframes so head and tail can be copied untouched
+    eps = 0.0005
+    t_start = start_frame / fps
+    t_end = end_frame / fps
+    k0, head_packets = max([kf for kf in keyframes if kf[0] <= t_start + eps], default=(0.0, 0))
+    after = [kf for kf in keyframes if kf[0] >= t_end - eps]
+    k1: Optional[float] = min(after)[0] if after else None
+    tail_from = min(after)[1] if after else None
+    # A keyframe before the first shown frame (edit list pre-roll) starts at frame 0
+    f0 = max(0, int(round(k0 * fps)))
+    f1 = int(round(k1 * fps)) if k1 is not None else None
+
+    out_dir = os.path.dirname(args.out) or "."
+    tmpdir = tempfile.mkdtemp(prefix=".cursor_", dir=out_dir)
+    try:
+        tail = None
+        if k1 is not None:
+            tail = os.path.join(tmpdir, "tail.mp4")
+            # Seek a hair past the keyframe: if its printed pts rounded down, the seek
+            # would land on the previous keyframe and copy that GOP twice
+            subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                 "-ss", str(k1 - seek_base + 0.001), "-i", args.video, "-map", "0:v:0", "-c", "copy",
+                 "-avoid_negative_ts", "make_zero", tail],
+                check=True,
+            )
+            # Seeking an input with an edit list can land on another keyframe; cut the
+            # tail first so a wrong cut costs no encode
+            total = packet_count(args.video)
+            if total is None or packet_count(tail) != total - tail_from:
+                print("window-only: can't cut the input at keyframe boundaries (edit list?), "
+                      "falling back to a full re-encode")
+                return False
+
+        mid = os.path.join(tmpdir, "mid.mp4")
+        tb = str(vs.get("time_base") or "")
+        if tb.startswith("1/"):
+            # Same track timescale as the copied parts
+            enc_args = enc_args + ["-video_track_timescale", tb[2:]]
+        enc = FFmpegWriter(
+            mid,
+            vs.get("r_frame_rate") or fps,
+            (width, height),
+            pix_fmt=vs.get("pix_fmt") or "yuv420p",
+            extra_args=enc_args,
+        )
+        # Seeking by frame number is not frame-accurate on h264; decode up to f0 instead
+        for _ in range(f0):
+            if not cap.grab():
+                break
+
+        def compose(idx: int, frame: np.ndarray) -> None:
+            pos_index = idx - start_frame
+            if start_frame <= idx < end_frame and pos_index < len(positions):
+                x, y = positions[pos_index]
+                overlay_cursor(frame, cursor_premul, cursor_inv_alpha, int(x), int(y))
+
+        run_frame_pipeline(cap, enc, compose, first_index=f0, max_frames=None if f1 is None else f1 - f0)
+        enc.release()
+
+        parts = []
+        if head_packets > 0:
+            head = os.path.join(tmpdir, "head.mp4")
+            # Cut by packet count, not -t: with B-frames the keyframe's dts is below k0,
+            # so a time limit would copy it (and more) into the head as well. The count
+            # includes packets an edit list hides, which the copy keeps hidden
+            subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                 "-i", args.video, "-frames:v", str(head_packets), "-map", "0:v:0", "-c", "copy", head],
+                check=True,
+            )
+            parts.append(head)
+        parts.append(mid)
+        if tail is not None:
+            parts.append(tail)
+
+        list_file = os.path.join(tmpdir, "concat.txt")
+        with open(list_file, "w") as f:
+            for part in parts:
+                f.write(f"file '{os.path.abspath(part)}'\n")
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "concat", "-safe", "0", "-i", list_file,
+             "-i", args.video,
+             "-map", "0:v:0", "-map", "1:a?",
+             "-c", "copy",
+             args.out],
+            check=True,
+        )
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    print(f"window-only: re-encoded {k0:.3f}s-{'end' if k1 is None else f'{k1:.3f}s'}, copied the rest "
+          "(no cursor outside the movement window)")
+    return True
 
 
 def main():
@@ -166,14 +490,11 @@ def main():
 
     cursor_bgr, cursor_alpha = load_cursor(args.cursor, args.scale)
     ch, cw = cursor_bgr.shape[:2]
+    cursor_premul, cursor_inv_alpha = prepare_cursor(cursor_bgr, cursor_alpha)
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     out_dir = os.path.dirname(args.out)
     if out_dir:
         os.makedirs(out_dir, exist_ok=True)
-    writer = cv2.VideoWriter(args.out, fourcc, src_fps, (width, height))
-    if not writer.isOpened():
-        raise RuntimeError(f"Failed to open output writer for: {args.out}")
 
     # Compute frame ranges
     start_frame = max(0, int(args.start * src_fps))
@@ -192,47 +513,65 @@ def main():
     init_x = rng.randint(right_min_x, right_max_x) if right_max_x >= right_min_x else right_max_x
     init_y = rng.randint(0, max(0, height - ch))
 
-    positions = generate_path(
-        rng=rng,
-        width=width,
-        height=height,
-        cursor_w=cw,
-        cursor_h=ch,
-        fps=src_fps,
-        start_frame=start_frame,
-        end_frame=end_frame,
-        avg_speed=args.speed,
-        avg_segment_sec=args.segment,
-        init_x=init_x,
-        init_y=init_y,
-    )
-
-    current_frame = 0
-    pos_index = 0
+    if args.waypoints:
+        waypoints = parse_waypoints(args.waypoints)
+        init_x, init_y = int(waypoints[0][0]), int(waypoints[0][1])
+        positions = waypoint_path(
+            waypoints,
+            max(0, end_frame - start_frame),
+            width,
+            height,
+            cw,
+            ch,
+            mode=args.path_mode,
+            easing=args.easing,
+        )
+    else:
+        positions = generate_path(
+            rng=rng,
+            width=width,
+            height=height,
+            cursor_w=cw,
+            cursor_h=ch,
+            fps=src_fps,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            avg_speed=args.speed,
+            avg_segment_sec=args.segment,
+            init_x=init_x,
+            init_y=init_y,
+        )
+
+    if args.window_only and render_window_only(
+        args, cap, src_fps, width, height, start_frame, end_frame, positions, cursor_premul, cursor_inv_alpha
+    ):
+        cap.release()
+        return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    # H.264 straight from the frame pipe, with the input audio muxed in the same ffmpeg run
+    writer = FFmpegWriter(args.out, src_fps, (width, height), audio_from=args.video)
+    if not writer.isOpened():
+        raise RuntimeError(f"Failed to open output writer for: {args.out}")
 
     last_pos = (init_x, init_y) if len(positions) == 0 else (int(positions[-1][0]), int(positions[-1][1]))
 
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-
+    def compose(current_frame: int, frame: np.ndarray) -> None:
+        pos_index = current_frame - start_frame
         if current_frame < start_frame:
             # Before movement: show static cursor at initial right-side position
-            overlay_cursor(frame, cursor_bgr, cursor_alpha, init_x, init_y)
+            overlay_cursor(frame, cursor_premul, cursor_inv_alpha, init_x, init_y)
         elif start_frame <= current_frame < end_frame and pos_index < len(positions):
             # During movement window
             x, y = positions[pos_index]
-            overlay_cursor(frame, cursor_bgr, cursor_alpha, int(x), int(y))
-            pos_index += 1
+            overlay_cursor(frame, cursor_premul, cursor_inv_alpha, int(x), int(y))
         else:
             # After movement window (or if no movement), keep last position
-            overlay_cursor(frame, cursor_bgr, cursor_alpha, last_pos[0], last_pos[1])
-
-        writer.write(frame)
-        current_frame += 1
+            overlay_cursor(frame, cursor_premul, cursor_inv_alpha, last_pos[0], last_pos[1])
 
-        # Do not early-stop; preserve full original video duration
+    # Decode, compose and encode overlap on separate threads; every frame is kept,
+    # so the full original duration is preserved
+    run_frame_pipeline(cap, writer, compose)
 
     cap.release()
     writer.release()
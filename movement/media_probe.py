@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Shared ffprobe helper: one ffprobe per file, cached in memory and on disk.
+
+Each tool directory (video-compose, sound-in-video, movement) is mounted into
+its own container, so an identical copy of this file lives next to the scripts
+that import it. Keep the copies in sync.
+
+The cache key is resolved path + size + mtime, so an edited file is re-probed.
+The on-disk cache lives in $PROBE_CACHE_DIR, else /app/data/tmp/probe_cache when
+/app/data is mounted, else ~/.cache/media_probe. If the directory is not
+writable, only the in-memory cache is used.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+PathLike = Union[str, Path]
+
+# Bumped when the probed fields change, so older disk entries are not reused
+PROBE_VERSION = 2
+
+_memory: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def cache_dir() -> Path:
+    env = os.environ.get("PROBE_CACHE_DIR")
+    if env:
+        return Path(env)
+    if Path("/app/data").is_dir():
+        return Path("/app/data/tmp/probe_cache")
+    return Path.home() / ".cache" / "media_probe"
+
+
+def _cache_key(path: Path) -> Optional[str]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    raw = f"{PROBE_VERSION}|{path.as_posix()}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _run_ffprobe(path: Path) -> Dict[str, Any]:
+    res = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_streams", "-show_format",
+            # extradata_hash per stream (e.g. the H.264 SPS/PPS), for stream-copy splices
+            "-show_data_hash", "sha256",
+            "-of", "json",
+            path.as_posix(),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+        universal_newlines=True,
+    )
+    return json.loads(res.stdout or "{}")
+
+
+def probe(path: PathLike) -> Dict[str, Any]:
+    """Return ffprobe's parsed JSON ({"streams": [...], "format": {...}}) for path.
+    Missing or unreadable files give an empty result instead of raising.
+    """
+    p = Path(path).resolve()
+    key = _cache_key(p)
+    if key is None:
+        return {"streams": [], "format": {}}
+    with _lock:
+        hit = _memory.get(key)
+    if hit is not None:
+        return hit
+
+    disk = cache_dir() / f"{key}.json"
+    info: Optional[Dict[str, Any]] = None
+    try:
+        info = json.loads(disk.read_text())
+    except (OSError, ValueError):
+        info = None
+    if info is None:
+        try:
+            info = _run_ffprobe(p)
+        except Exception:
+            # Don't cache failures: the file may still be being written
+            return {"streams": [], "format": {}}
+        try:
+            disk.parent.mkdir(parents=True, exist_ok=True)
+            tmp = disk.with_name(f".{disk.name}.{os.getpid()}.{threading.get_ident()}")
+            tmp.write_text(json.dumps(info))
+            os.replace(tmp, disk)
+        except OSError:
+            pass
+    info.setdefault("streams", [])
+    info.setdefault("format", {})
+    with _lock:
+        _memory[key] = info
+    return info
+
+
+def streams(path: PathLike, codec_type: str) -> List[Dict[str, Any]]:
+    return [s for s in probe(path)["streams"] if s.get("codec_type") == codec_type]
+
+
+def video_stream(path: PathLike) -> Optional[Dict[str, Any]]:
+    vs = streams(path, "video")
+    return vs[0] if vs else None
+
+
+def has_audio(path: PathLike) -> bool:
+    return bool(streams(path, "audio"))
+
+
+def has_video(path: PathLike) -> bool:
+    return bool(streams(path, "video"))
+
+
+def parse_rate(rate: Optional[str]) -> Optional[float]:
+    """Parse an ffprobe frame rate like '30000/1001' into a float."""
+    if not rate or rate in ("0/0", "N/A"):
+        return None
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) else None
+        return float(rate)
+    except ValueError:
+        return None
+
+
+def fps(path: PathLike, default: float = 30.0) -> float:
+    """Frames per second of the first video stream (r_frame_rate, then avg_frame_rate)."""
+    vs = video_stream(path)
+    if not vs:
+        return default
+    rate = parse_rate(vs.get("r_frame_rate")) or parse_rate(vs.get("avg_frame_rate"))
+    return rate if rate else default
+
+
+def duration(path: PathLike) -> Optional[float]:
+    """Container duration in seconds, falling back to the longest stream duration."""
+    info = probe(path)
+    try:
+        return float(info["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        pass
+    durs = []
+    for s in info["streams"]:
+        try:
+            durs.append(float(s["duration"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return max(durs) if durs else None
+
+
+def video_params(path: PathLike) -> Optional[Dict[str, Any]]:
+    """Codec parameters of the first video stream: codec_name, width, height, pix_fmt,
+    sar (sample aspect ratio like "1:1", None if unset) and fps.
+    """
+    vs = video_stream(path)
+    if not vs:
+        return None
+    return {
+        "codec_name": vs.get("codec_name"),
+        "width": vs.get("width"),
+        "height": vs.get("height"),
+        "pix_fmt": vs.get("pix_fmt"),
+        "sar": vs.get("sample_aspect_ratio") if vs.get("sample_aspect_ratio") not in (None, "0:1", "N/A") else None,
+        "fps": parse_rate(vs.get("avg_frame_rate")) or parse_rate(vs.get("r_frame_rate")),
+    }
+
+
+def audio_params(path: PathLike) -> Optional[Dict[str, Any]]:
+    """Codec parameters of the first audio stream: codec_name, profile, sample_rate,
+    channels and channel_layout.
+    """
+    aus = streams(path, "audio")
+    if not aus:
+        return None
+    a = aus[0]
+    return {
+        "codec_name": a.get("codec_name"),
+        "profile": a.get("profile"),
+        "sample_rate": int(a["sample_rate"]) if a.get("sample_rate") else None,
+        "channels": a.get("channels"),
+        "channel_layout": a.get("channel_layout"),
+    }
@@ -1,23 +1,10 @@
-import torch
 import os
 import argparse
-from TTS.utils.radam import RAdam
-import collections
 import re
 import numpy as np
 import wave
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import XttsAudioConfig, XttsArgs
-from TTS.config.shared_configs import BaseDatasetConfig
-
-torch.serialization.add_safe_globals([RAdam])
-torch.serialization.add_safe_globals([collections.defaultdict])
-torch.serialization.add_safe_globals([dict])
-torch.serialization.add_safe_globals([XttsConfig])
-torch.serialization.add_safe_globals([XttsAudioConfig])
-torch.serialization.add_safe_globals([BaseDatasetConfig])
-torch.serialization.add_safe_globals([XttsArgs])
-from TTS.api import TTS
+
+import tts_server
 
 parser = argparse.ArgumentParser(description="Process video_script.txt and output output.wav in the specified folder.")
 parser.add_argument('--folder_name', type=str, required=True, help='Folder containing video_script.txt and for output file')
@@ -29,14 +16,13 @@ parser.add_argument('--model_name', type=str, default='tts_models/en/vctk/vits',
 parser.add_argument('--speaker', type=str, default='p230', help='Speaker ID/name for multispeaker models (e.g., p225, p228, p260)')
 parser.add_argument('--speaker_wav', type=str, default=None, help='Path to reference voice audio for XTTS v2 (voice cloning)')
 parser.add_argument('--language', type=str, default='en', help='Language code for synthesis (e.g., en, es). Required for XTTS v2')
+parser.add_argument('--server', type=str, default=tts_server.DEFAULT_URL, help='tts_server.py URL (env TTS_SERVER_URL); models stay loaded there between runs')
+parser.add_argument('--local', action='store_true', help='Load the model in this process instead of using the TTS server')
 args = parser.parse_args()
 
 input_path = os.path.join(args.folder_name, "video_script.txt")
 output_path = os.path.join(args.folder_name, args.output_file_name)
 
-# Instantiate TTS after we know which model to use
-tts = TTS(model_name=args.model_name)
-
 
 def _silence(duration_seconds: float, sample_rate: int) -> np.ndarray:
     """Create a silence (float32) waveform for the given duration and sample rate."""
@@ -68,23 +54,18 @@ def _time_stretch_linear(wav: np.ndarray, factor: float) -> np.ndarray:
     return np.interp(x_new, x_old, wav).astype(np.float32)
 
 
-def _get_sample_rate(tts_obj: TTS, default_sr: int = 22050) -> int:
-    """Try to obtain the sample rate from the TTS synthesizer; fall back to default."""
-    # Coqui TTS exposes sample rate via synthesizer in different versions
-    for path in [
-        "synthesizer.output_sample_rate",
-        "synthesizer.ap.sample_rate",
-        "synthesizer.tts_config.audio.sample_rate",
-         ]:
-        try:
-            obj = tts_obj
-            for attr in path.split('.'):
-                obj = getattr(obj, attr)
-            if isinstance(obj, int) and obj > 0:
-                return obj
-        except Exception:
-            pass
-    return default_sr
+def _synthesize(texts: list[str]) -> tuple[int, list[np.ndarray]]:
+    """Synthesize the speech chunks on the TTS server (model already loaded there),
+    or in this process when --local is set or no server is running.
+    """
+    # The server may run with another working directory
+    speaker_wav = os.path.abspath(args.speaker_wav) if args.speaker_wav else None
+    job = dict(speaker=args.speaker, speaker_wav=speaker_wav, language=args.language)
+    if not args.local:
+        if tts_server.server_available(args.server):
+            return tts_server.synthesize_remote(args.server, args.model_name, texts, **job)
+        print(f"TTS server not reachable at {args.server}; loading the model in this process.")
+    return tts_server.Synthesizer(max_models=1, cache=tts_server.open_cache()).synthesize(args.model_name, texts, **job)
 
 
 if os.path.exists(input_path):
@@ -98,36 +79,35 @@ if os.path.exists(input_path):
     # Split text into chunks and dot-pauses, preserving '.' and '..'
     tokens = re.split(r"(\.\.|\.)", filtered_text)
 
-    # Keep track of whether a segment is silence to avoid changing exact dot pauses
-    segments: list[tuple[bool, np.ndarray]] = []
-    sr: int = _get_sample_rate(tts)
+    # Segments are (is_silence, seconds of pause or index into texts); the speech is
+    # synthesized in one job after the split
+    plan: list[tuple[bool, float]] = []
+    texts: list[str] = []
 
     for tok in tokens:
         if tok is None or tok == "":
             continue
         if tok == "..":
             # configurable pause for double dot
-            segments.append((True, _silence(float(args.pause2), sr)))
+            plan.append((True, float(args.pause2)))
         elif tok == ".":
             # configurable pause for single dot
-            segments.append((True, _silence(float(args.pause1), sr)))
+            plan.append((True, float(args.pause1)))
         else:
             # Normal speech chunk
             text_chunk = tok.strip()
             if not text_chunk:
                 continue
-            # Build kwargs depending on model capability/inputs
-            tts_kwargs = {"text": text_chunk}
-            is_xtts = "xtts" in (args.model_name or "").lower()
-            if args.speaker_wav:
-                tts_kwargs["speaker_wav"] = args.speaker_wav
-            elif args.speaker:
-                tts_kwargs["speaker"] = args.speaker
-            # Force language for XTTS to avoid auto-detect switching when text has code
-            if is_xtts and args.language:
-                tts_kwargs["language"] = args.language
-            wav_chunk = tts.tts(**tts_kwargs)
-            segments.append((False, np.asarray(wav_chunk, dtype=np.float32)))
+            plan.append((False, len(texts)))
+            texts.append(text_chunk)
+
+    # Keep track of whether a segment is silence to avoid changing exact dot pauses
+    segments: list[tuple[bool, np.ndarray]] = []
+    if plan:
+        # Also for a pauses-only script: the (empty) job still yields the sample rate
+        sr, wavs = _synthesize(texts)
+        for is_sil, val in plan:
+            segments.append((True, _silence(val, sr)) if is_sil else (False, wavs[int(val)]))
 
     if not segments:
         print("No content to synthesize after filtering. Nothing written.")
@@ -6,13 +6,28 @@ import pathlib
 import random
 import math
 import json
+import csv
+import re
+import shlex
 import shutil
 import subprocess
-from typing import List, Optional
+import tempfile
+import threading
+import time
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
-FREESOUND_SEARCH = "https://freesound.org/apiv2/search/text/"
+import media_probe
+import sound_library
+
+# FREESOUND_API_URL points the client at another server (e.g. a local stub for offline runs)
+FREESOUND_API = os.environ.get("FREESOUND_API_URL", "https://freesound.org/apiv2").rstrip("/")
+FREESOUND_SEARCH = f"{FREESOUND_API}/search/text/"
 
 
 def run(cmd: str) -> str:
@@ -21,43 +36,73 @@ def run(cmd: str) -> str:
 
 
 def get_fps(video_path: pathlib.Path) -> float:
-    # returns frames per second from ffprobe r_frame_rate
-    rate = run(
-        f"ffprobe -v error -select_streams v:0 -show_entries stream=r_frame_rate -of default=nw=1:nk=1 {video_path.as_posix()}"
-    )
-    # e.g. "30000/1001" or "60/1" or "30"
-    if "/" in rate:
-        num, den = rate.split("/", 1)
-        try:
-            fps = float(num) / float(den)
-        except Exception:
-            fps = 30.0
-    else:
-        try:
-            fps = float(rate)
-        except Exception:
-            fps = 30.0
-    return max(1.0, fps)
+    # frames per second from ffprobe r_frame_rate (cached per file)
+    return max(1.0, media_probe.fps(video_path, default=30.0))
 
 
 def get_audio_duration_seconds(path: pathlib.Path) -> Optional[float]:
-    try:
-        val = run(
-            f"ffprobe -v error -show_entries format=duration -of default=nw=1:nk=1 {path.as_posix()}"
-        )
-        return float(val)
-    except Exception:
-        return None
+    return media_probe.duration(path)
 
 
 def has_audio(video_path: pathlib.Path) -> bool:
-    try:
-        cnt = run(
-            f"ffprobe -v error -select_streams a -show_entries stream=index -of default=nw=1:nk=1 {video_path.as_posix()} | wc -l"
-        )
-        return int(cnt.strip() or "0") > 0
-    except Exception:
-        return False
+    return media_probe.has_audio(video_path)
+
+
+# Freesound allows 60 API requests per minute per token
+DEFAULT_RATE_PER_SEC = 1.0
+DEFAULT_WORKERS = 4
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """One keep-alive session shared by every search and download thread."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _session = sess
+        return _session
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 2.0):
+        self.rate = max(1e-3, float(rate))
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """Block until a token is available. Returns False if stop is set meanwhile."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait = (1.0 - self._tokens) / self.rate
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+_limiter = TokenBucket(DEFAULT_RATE_PER_SEC)
+
+
+def set_rate_limit(rate_per_sec: float) -> None:
+    global _limiter
+    _limiter = TokenBucket(rate_per_sec)
 
 
 def search_freesound(
@@ -70,8 +115,12 @@ def search_freesound(
     license_filter: Optional[str] = None,
     extra_filter: Optional[str] = None,
     verbose: bool = False,
+    workers: int = DEFAULT_WORKERS,
 ) -> List[dict]:
-    """Search Freesound, returning up to num entries. Tries to be robust when zero results."""
+    """Search Freesound, returning up to num entries. Tries to be robust when zero results.
+    The filter variants of a query run concurrently (rate limited); the alternate
+    queries are tried in order, each only if the previous one found nothing.
+    """
     headers = {"Authorization": f"Token {api_token}"}
 
     def build_filter() -> Optional[str]:
@@ -88,11 +137,6 @@ def search_freesound(
             parts.append(extra_filter)
         return " ".join(parts) if parts else None
 
-    attempts = []
-    # Try with constructed filter first, then without filters
-    attempts.append((query, build_filter()))
-    attempts.append((query, None))
-
     # Also try a few alternate queries (synonyms)
     alt_queries = [
         query,
@@ -103,39 +147,62 @@ def search_freesound(
         "ding",
         "ring bell",
     ]
-
-    results: List[dict] = []
-    for q in alt_queries:
-        for (q_try, filt) in [(q, build_filter()), (q, None)]:
+    # Each query with the constructed filter first, then without filters
+    filt = build_filter()
+    attempts: List[List[Tuple[str, Optional[str]]]] = []
+    for q in dict.fromkeys(alt_queries):
+        attempts.append([(q, filt), (q, None)] if filt else [(q, None)])
+
+    stop = threading.Event()
+
+    def attempt(q_try: str, filt: Optional[str]) -> List[dict]:
+        params = {
+            "query": q_try,
+            "page_size": max(4, min(150, page_size)),
+            "fields": "id,name,tags,previews,url,duration,license",
+            "sort": "score",
+        }
+        if filt:
+            params["filter"] = filt
+        for _ in range(3):
+            if not _limiter.acquire(stop):
+                return []
             if verbose:
                 print(f"Freesound search q='{q_try}' filter='{filt}' page_size={page_size}")
-            params = {
-                "query": q_try,
-                "page_size": max(4, min(150, page_size)),
-                "fields": "id,name,previews,url,duration,license",
-                "sort": "score",
-            }
-            if filt:
-                params["filter"] = filt
-            r = requests.get(FREESOUND_SEARCH, headers=headers, params=params, timeout=30)
+            r = http_session().get(FREESOUND_SEARCH, headers=headers, params=params, timeout=30)
             if r.status_code == 429:
-                # rate limited; back off a bit and continue
-                import time as _t
-                _t.sleep(1.0)
+                # rate limited; wait as asked (without holding up other attempts) and retry
+                try:
+                    retry_after = float(r.headers.get("Retry-After", 1.0))
+                except ValueError:
+                    retry_after = 1.0
+                if stop.wait(min(30.0, retry_after)):
+                    return []
                 continue
             if r.status_code != 200:
                 if verbose:
                     print(f"Freesound API error {r.status_code}: {r.text}")
-                continue
-            data = r.json()
-            batch = data.get("results", [])
+                return []
+            batch = r.json().get("results", [])
             if verbose:
                 print(f"Found {len(batch)} for q='{q_try}'")
-            results.extend(batch)
-            if len(results) >= num:
-                return results[:num]
-        if results:
-            break
+            return batch
+        return []
+
+    results: List[dict] = []
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        # One query at a time, its filter variants together; the next alternative
+        # is only tried when both came back empty
+        for variants in attempts:
+            futures = [pool.submit(attempt, q, filt) for q, filt in variants]
+            for fut in futures:
+                results.extend(fut.result())
+            if results:
+                break
+    finally:
+        stop.set()
+        pool.shutdown(wait=True)
     return results[:num]
 
 
@@ -150,7 +217,7 @@ def download_preview(entry: dict, dest: pathlib.Path) -> Optional[pathlib.Path]:
     )
     if not url:
         return None
-    with requests.get(url, stream=True, timeout=60) as r:
+    with http_session().get(url, stream=True, timeout=60) as r:
         r.raise_for_status()
         with open(dest, "wb") as f:
             for chunk in r.iter_content(1024 * 256):
@@ -159,36 +226,562 @@ def download_preview(entry: dict, dest: pathlib.Path) -> Optional[pathlib.Path]:
     return dest
 
 
+# ---- effect analysis (cached beside each sound file) ----
+
+ANALYSIS_VERSION = 1
+SILENCE_NOISE_DB = -50.0
+# Keep a few ms before the detected onset so the attack transient isn't cut
+ONSET_PREROLL_S = 0.005
+
+_analysis_memo: Dict[str, Dict] = {}
+
+
+def _analysis_sidecar(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(path.name + ".analysis.json")
+
+
+def _run_analysis(path: pathlib.Path) -> Dict:
+    """One ffmpeg decode: silencedetect for leading/trailing silence and ebur128 for
+    integrated loudness and true peak.
+    """
+    res = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", path.as_posix(),
+            "-af", f"silencedetect=noise={SILENCE_NOISE_DB}dB:d=0.005,ebur128=peak=true",
+            "-f", "null", "-",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    log = res.stderr or ""
+    duration = media_probe.duration(path)
+    starts = [float(v) for v in re.findall(r"silence_start: (-?[\d.]+)", log)]
+    ends = [float(v) for v in re.findall(r"silence_end: (-?[\d.]+)", log)]
+    # (start, end) of each silent stretch; end is None when it runs to EOF
+    silences = [(st, ends[i] if i < len(ends) else None) for i, st in enumerate(starts)]
+
+    def at_eof(end: Optional[float]) -> bool:
+        # Container duration runs a little past the decoded audio (mp3 padding)
+        return end is None or (duration is not None and end >= duration - 0.1)
+
+    onset = 0.0
+    if silences and silences[0][0] <= 0.001 and not at_eof(silences[0][1]):
+        onset = silences[0][1]
+    tail = duration
+    if silences and silences[-1][0] > onset and at_eof(silences[-1][1]):
+        tail = silences[-1][0]
+    lufs = None
+    m = re.findall(r"I:\s+(-?[\d.]+) LUFS", log)
+    if m and float(m[-1]) > -70.0:  # -70 is ebur128's gate floor (too short or silent)
+        lufs = float(m[-1])
+    peak = None
+    m = re.findall(r"Peak:\s+(-?[\d.]+|-inf) dBFS", log)
+    if m and m[-1] != "-inf":
+        peak = float(m[-1])
+    return {
+        "onset_s": round(max(0.0, onset - ONSET_PREROLL_S) if onset > 0 else 0.0, 4),
+        "tail_s": round(tail, 4) if tail else None,
+        "duration": duration,
+        "lufs": lufs,
+        "peak_db": peak,
+    }
+
+
+def analyze_effect(path: pathlib.Path, library: Optional[sound_library.SoundLibrary] = None) -> Dict:
+    """Leading-silence offset, audible end, integrated loudness and peak of a sound,
+    measured once and cached in <file>.analysis.json (keyed by size and mtime).
+    Library sounds also get their loudness stored in the index.
+    """
+    path = pathlib.Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return {}
+    stamp = [ANALYSIS_VERSION, st.st_size, st.st_mtime_ns]
+    key = path.resolve().as_posix()
+    hit = _analysis_memo.get(key)
+    if hit is not None and hit.get("stamp") == stamp:
+        return hit
+    sidecar = _analysis_sidecar(path)
+    info = None
+    try:
+        info = json.loads(sidecar.read_text())
+        if info.get("stamp") != stamp:
+            info = None
+    except (OSError, ValueError):
+        info = None
+    if info is None:
+        info = _run_analysis(path)
+        info["stamp"] = stamp
+        try:
+            sidecar.write_text(json.dumps(info))
+        except OSError:
+            pass  # read-only sound folder: analysis is just redone next run
+        if library is not None and info.get("lufs") is not None:
+            library.set_loudness(path, info["lufs"])
+    _analysis_memo[key] = info
+    return info
+
+
+def effect_timing(path: pathlib.Path, offset_ms: Optional[int], info: Dict) -> Tuple[float, float]:
+    """(offset_s, play_dur) for an effect: an explicit offset_ms wins over the detected
+    onset; play_dur runs to the audible end (the file end, or 2s if unknown).
+    """
+    if offset_ms is not None:
+        offset_s = max(0, int(offset_ms)) / 1000.0
+    else:
+        offset_s = float(info.get("onset_s") or 0.0)
+    end = info.get("tail_s") or info.get("duration") or get_audio_duration_seconds(path)
+    play_dur = max(0.0, end - offset_s) if end else 2.0
+    return offset_s, play_dur
+
+
+def effect_gain(gain: float, info: Dict, target_lufs: Optional[float]) -> float:
+    """gain, first normalizing the effect to target_lufs (if measured), limited so the
+    true peak stays at or below -1 dBTP.
+    """
+    if target_lufs is None or info.get("lufs") is None:
+        return gain
+    boost_db = target_lufs - info["lufs"]
+    if info.get("peak_db") is not None:
+        boost_db = min(boost_db, -1.0 - info["peak_db"])
+    return gain * 10 ** (boost_db / 20.0)
+
+
+# ---- background ducking ----
+
+DUCK_METHODS = ("envelope", "sidechain", "none")
+# Background level while an effect plays (relative to --bg-gain)
+DUCK_GAIN = 0.6
+DUCK_ATTACK_S = 0.03
+DUCK_RELEASE_S = 0.25
+ENVELOPE_RATE = 1000
+
+
+def write_duck_envelope(
+    path: pathlib.Path,
+    windows: List[Tuple[float, float]],
+    total_dur: float,
+    depth: float = DUCK_GAIN,
+    attack: float = DUCK_ATTACK_S,
+    release: float = DUCK_RELEASE_S,
+    rate: int = ENVELOPE_RATE,
+) -> None:
+    """Write the background gain curve as a mono 16-bit WAV at rate Hz: 1.0, easing
+    (raised cosine) down to depth over attack before each window and back up over
+    release after it. Overlapping windows merge. Covers total_dur plus 1s.
+    """
+    n = int(math.ceil((total_dur + 1.0) * rate))
+    duck = [0.0] * n
+    for start, end in windows:
+        a0 = start - attack
+        r1 = end + release
+        for i in range(max(0, int(a0 * rate)), min(n, int(math.ceil(r1 * rate)))):
+            t = i / rate
+            if t < start:
+                x = (t - a0) / attack
+            elif t > end:
+                x = (r1 - t) / release
+            else:
+                x = 1.0
+            f = 0.5 - 0.5 * math.cos(math.pi * min(1.0, max(0.0, x)))
+            if f > duck[i]:
+                duck[i] = f
+    samples = array("h", (int(round(32767 * (1.0 - (1.0 - depth) * f))) for f in duck))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    with wave.open(path.as_posix(), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+
+
+def envelope_format(video_path: pathlib.Path) -> Optional[Tuple[int, str, int]]:
+    """(sample_rate, channel_layout, channels) of the background, needed to line the
+    envelope up with it sample for sample; None if it can't be determined.
+    """
+    aus = media_probe.streams(video_path, "audio")
+    if not aus or not aus[0].get("sample_rate"):
+        return None
+    layout = aus[0].get("channel_layout") or {1: "mono", 2: "stereo"}.get(aus[0].get("channels"))
+    if not layout:
+        return None
+    return int(aus[0]["sample_rate"]), layout, int(aus[0].get("channels") or 1)
+
+
+def duck_chains(
+    method: str,
+    bg_gain: float,
+    out_label: str,
+    env_input: Optional[int] = None,
+    env_fmt: Optional[Tuple[int, str, int]] = None,
+    sidechain: Optional[str] = None,
+) -> List[str]:
+    """Filter chains turning [0:a] into the ducked background out_label.
+    envelope: multiply by the precomputed gain curve (input env_input).
+    sidechain: sidechaincompress keyed on the effects stream sidechain (which must not
+    end before the background, or the background is cut there).
+    Both replace the per-sample volume='if(between(t,...))' expression.
+    """
+    head = f"[0:a]volume={bg_gain:.3f}" if bg_gain != 1.0 else "[0:a]anull"
+    if method == "envelope" and env_input is not None and env_fmt:
+        rate, layout, channels = env_fmt
+        spread = "|".join(f"c{i}=c0" for i in range(max(1, channels)))
+        return [
+            f"{head}[bgv]",
+            f"[{env_input}:a]aresample={rate},pan={layout}|{spread}[env]",
+            f"[bgv][env]amultiply{out_label}",
+        ]
+    if method == "sidechain" and sidechain:
+        return [
+            f"{head}[bgv]",
+            f"[bgv]{sidechain}sidechaincompress=threshold=0.02:ratio=6"
+            f":attack={DUCK_ATTACK_S * 1000:.0f}:release={DUCK_RELEASE_S * 1000:.0f}{out_label}",
+        ]
+    return [f"{head}{out_label}"]
+
+
+def load_cues(path: pathlib.Path) -> List[dict]:
+    """Read a cue list from JSON (a list, or {"cues": [...]}) or CSV with a header row.
+    Each cue has frame or time (seconds), and optionally sound (file path, relative to
+    the cue file) or query (Freesound search), gain and offset_ms.
+    """
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            rows = [{k: v for k, v in r.items() if v not in (None, "")} for r in csv.DictReader(f)]
+    else:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        rows = data.get("cues", []) if isinstance(data, dict) else data
+    cues = []
+    for i, row in enumerate(rows):
+        cue = dict(row)
+        if "frame" not in cue and "time" not in cue:
+            raise ValueError(f"Cue #{i} needs frame or time")
+        if "frame" in cue:
+            cue["frame"] = int(cue["frame"])
+        if "time" in cue:
+            cue["time"] = float(cue["time"])
+        if "gain" in cue:
+            cue["gain"] = float(cue["gain"])
+        if "offset_ms" in cue:
+            cue["offset_ms"] = int(cue["offset_ms"])
+        if cue.get("sound"):
+            snd = pathlib.Path(cue["sound"])
+            cue["sound"] = snd if snd.is_absolute() else path.parent / snd
+        cues.append(cue)
+    return cues
+
+
+def local_candidates(mp3_dir: pathlib.Path, exts_arg: str) -> List[pathlib.Path]:
+    if not mp3_dir.exists() or not mp3_dir.is_dir():
+        print(f"ERROR: --mp3-dir not found or not a directory: {mp3_dir}", file=sys.stderr)
+        sys.exit(1)
+    exts = [e.strip().lstrip('.').lower() for e in (exts_arg.split(',') if exts_arg else ['mp3','ogg'])]
+    candidates: List[pathlib.Path] = []
+    for ext in exts:
+        candidates.extend(sorted(mp3_dir.glob(f"*.{ext}")))
+    if not candidates:
+        print(f"ERROR: No files with extensions {exts} found in {mp3_dir}", file=sys.stderr)
+        sys.exit(1)
+    return candidates
+
+
+def open_library(args) -> Optional[sound_library.SoundLibrary]:
+    if args.no_library:
+        return None
+    return sound_library.SoundLibrary(args.library)
+
+
+def search_filter_key(args) -> Optional[str]:
+    """Everything besides the query that changes a Freesound search result."""
+    parts = []
+    if args.min_dur is not None or args.max_dur is not None:
+        parts.append(f"duration:[{args.min_dur} TO {args.max_dur}]")
+    if args.license_filter:
+        parts.append(args.license_filter)
+    if args.extra_filter:
+        parts.append(args.extra_filter)
+    return " ".join(parts) or None
+
+
+def fetch_previews(
+    api_token: str,
+    query: str,
+    args,
+    tmpdir: pathlib.Path,
+    tag: str = "",
+    library: Optional[sound_library.SoundLibrary] = None,
+) -> List[pathlib.Path]:
+    """Up to 4 preview files for query. With a library, the local index answers first and
+    only misses go to Freesound; previews then live in the library (nothing to clean up).
+    Without one, previews are downloaded into tmpdir.
+    """
+    filt = search_filter_key(args)
+    if library is not None:
+        hits = library.lookup(
+            query, filt, 4,
+            min_dur=args.min_dur, max_dur=args.max_dur,
+            raw_filters=bool(args.license_filter or args.extra_filter),
+        )
+        if hits:
+            print(f"Sound library: {len(hits)} local match(es) for '{query}'")
+            return hits
+    if not api_token:
+        print("ERROR: Please export FREESOUND_API_TOKEN with your Freesound API token (or use --mp3-dir).", file=sys.stderr)
+        sys.exit(1)
+    results = search_freesound(
+        api_token,
+        query,
+        num=4,
+        page_size=args.page_size,
+        min_dur=args.min_dur,
+        max_dur=args.max_dur,
+        license_filter=args.license_filter,
+        extra_filter=args.extra_filter,
+        verbose=args.verbose,
+        workers=args.workers,
+    )
+    if not results:
+        print(f"No results from Freesound for '{query}'. Try a broader query (e.g., 'click', 'ding') or use --verbose to debug.", file=sys.stderr)
+        sys.exit(1)
+    if library is None:
+        tmpdir.mkdir(parents=True, exist_ok=True)
+
+    def get_one(i: int, item: dict) -> Optional[pathlib.Path]:
+        try:
+            if library is not None:
+                return library.fetch(item, download_preview)
+            return download_preview(item, tmpdir / f"preview_{tag}{i:02d}.mp3")
+        except requests.RequestException as e:
+            print(f"Preview download failed for {item.get('name')}: {e}", file=sys.stderr)
+            return None
+
+    # All previews download at once over the shared keep-alive session
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        got = list(pool.map(get_one, range(1, len(results) + 1), results))
+    paths: List[pathlib.Path] = [p for p in got if p]
+    if library is not None:
+        library.record_search(query, filt, paths)
+    if not paths:
+        print("Failed to download any previews.", file=sys.stderr)
+        sys.exit(1)
+    return paths
+
+
+def build_cue_filter(
+    cues: List[dict],
+    video_has_audio: bool,
+    bg_gain: float,
+    video_dur: Optional[float],
+    duck: str = "none",
+    env_fmt: Optional[Tuple[int, str, int]] = None,
+) -> str:
+    """One filter graph for every cue: each effect input (1..N) is trimmed, gained and
+    delayed to its start, then everything is mixed once with the (ducked) background.
+    Cues carry start_sec, start_ms, offset_s, gain and play_dur. With duck="envelope"
+    the gain curve is input N+1.
+    Effects are padded to the video length so amix keeps a constant 1/inputs scale,
+    which the trailing volume undoes: every source ends up at its own gain.
+    """
+    chains = []
+    labels = []
+    pad = f"apad=whole_dur={video_dur:.3f}" if video_dur else "apad"
+    for i, cue in enumerate(cues):
+        chains.append(
+            f"[{i + 1}:a]atrim=start={cue['offset_s']:.3f},asetpts=PTS-STARTPTS,volume={cue['gain']},"
+            f"adelay={cue['start_ms']}|{cue['start_ms']},{pad}[fx{i}]"
+        )
+        labels.append(f"[fx{i}]")
+
+    def mix(inputs: List[str], out: str) -> str:
+        if len(inputs) == 1:
+            return f"{inputs[0]}anull{out}"
+        n = len(inputs)
+        return f"{''.join(inputs)}amix=inputs={n}:duration=first:dropout_transition=0,volume={n}{out}"
+
+    if not video_has_audio:
+        chains.append(mix(labels, "[aout]"))
+    elif duck == "sidechain":
+        # Key the compressor on all effects together
+        chains.append(mix(labels, "[fxall]"))
+        chains.append("[fxall]asplit[fxmix][fxs]")
+        chains.append("[fxs]apad[fxsc]")
+        chains += duck_chains("sidechain", bg_gain, "[bg]", sidechain="[fxsc]")
+        chains.append(mix(["[bg]", "[fxmix]"], "[aout]"))
+    else:
+        chains = duck_chains(duck, bg_gain, "[bg]", env_input=len(cues) + 1, env_fmt=env_fmt) + chains
+        chains.append(mix(["[bg]"] + labels, "[aout]"))
+    return ";\n".join(chains)
+
+
+def plan_ducking(args, windows: List[Tuple[float, float]], video_has_audio: bool) -> Tuple[str, Optional[Tuple[int, str, int]], Optional[pathlib.Path]]:
+    """Pick the ducking method for this run; for "envelope" also write the gain curve
+    next to the output. Returns (method, env_fmt, envelope_path). Falls back to
+    sidechain when the background's length or format can't be probed.
+    """
+    if not video_has_audio or not windows:
+        return "none", None, None
+    if args.duck != "envelope":
+        return args.duck, None, None
+    env_fmt = envelope_format(args.input)
+    total = get_audio_duration_seconds(args.input)
+    if env_fmt is None or not total:
+        print("Could not probe the background audio format; ducking with sidechaincompress instead.")
+        return "sidechain", None, None
+    fd, name = tempfile.mkstemp(prefix=".duck_", suffix=".wav", dir=args.output.parent.as_posix())
+    os.close(fd)
+    env_path = pathlib.Path(name)
+    write_duck_envelope(env_path, windows, total)
+    return "envelope", env_fmt, env_path
+
+
+def mix_cues(args, cues: List[dict], fps: float) -> None:
+    """Resolve every cue's sound, then write the output with a single ffmpeg run."""
+    api_token = os.getenv("FREESOUND_API_TOKEN", "").strip()
+    tmpdir = args.output.parent / "_fs_previews"
+    library = open_library(args)
+    downloaded: List[pathlib.Path] = []
+    by_query: Dict[str, List[pathlib.Path]] = {}
+    local: Optional[List[pathlib.Path]] = None
+
+    def sounds_for_query(q: str) -> List[pathlib.Path]:
+        if q not in by_query:
+            by_query[q] = fetch_previews(api_token, q, args, tmpdir, tag=f"{len(by_query):02d}_", library=library)
+            if library is None:
+                downloaded.extend(by_query[q])
+        return by_query[q]
+
+    try:
+        for i, cue in enumerate(cues):
+            if cue.get("sound"):
+                snd = pathlib.Path(cue["sound"])
+                if not snd.exists():
+                    print(f"ERROR: Cue #{i} sound not found: {snd}", file=sys.stderr)
+                    sys.exit(1)
+            elif cue.get("query"):
+                snd = random.choice(sounds_for_query(cue["query"]))
+            elif args.mp3_dir:
+                if local is None:
+                    local = local_candidates(args.mp3_dir, args.exts)
+                snd = random.choice(local)
+            elif args.query:
+                snd = random.choice(sounds_for_query(args.query))
+            else:
+                print(f"ERROR: Cue #{i} has no sound or query, and neither --mp3-dir nor --query is set.", file=sys.stderr)
+                sys.exit(2)
+            start_sec = float(cue["time"]) if "time" in cue else max(0.0, float(cue["frame"]) / fps)
+            info = analyze_effect(snd, library)
+            offset_s, play_dur = effect_timing(snd, cue.get("offset_ms", args.offset_ms), info)
+            cue.update(
+                sound=snd,
+                start_sec=max(0.0, start_sec),
+                start_ms=int(round(max(0.0, start_sec) * 1000)),
+                offset_s=offset_s,
+                gain=round(effect_gain(float(cue.get("gain", args.gain)), info, args.target_lufs), 4),
+                play_dur=play_dur,
+            )
+            print(f"Cue {i}: {snd.name} at {cue['start_sec']:.3f}s gain={cue['gain']} offset={offset_s:.3f}s")
+
+        video_has_audio = has_audio(args.input)
+        windows = [(c["start_sec"], c["start_sec"] + c["play_dur"]) for c in cues]
+        duck, env_fmt, env_path = plan_ducking(args, windows, video_has_audio)
+        filt = build_cue_filter(cues, video_has_audio, args.bg_gain, get_audio_duration_seconds(args.input), duck, env_fmt)
+        fd, script = tempfile.mkstemp(prefix=".cues_", suffix=".txt", dir=args.output.parent.as_posix())
+        with os.fdopen(fd, "w") as f:
+            f.write(filt)
+        cmd = ["ffmpeg", "-y", "-i", args.input.as_posix()]
+        for cue in cues:
+            cmd += ["-i", cue["sound"].as_posix()]
+        if env_path is not None:
+            cmd += ["-i", env_path.as_posix()]
+        cmd += [
+            "-filter_complex_script", script,
+            "-map", "0:v:0", "-map", "[aout]",
+            # Effects are padded with silence; stop at the video's end
+            "-shortest",
+            "-c:v", "copy", "-c:a", "aac", "-b:a", "192k",
+            "-movflags", "+faststart", args.output.as_posix(),
+        ]
+        try:
+            run(" ".join(shlex.quote(c) for c in cmd))
+            print(f"Done. Wrote: {args.output} ({len(cues)} cues)")
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg failed with code {e.returncode}", file=sys.stderr)
+            sys.exit(e.returncode)
+        finally:
+            os.remove(script)
+            if env_path is not None:
+                env_path.unlink()
+    finally:
+        if downloaded and not args.keep_temp:
+            try:
+                for p in downloaded:
+                    # analyze_effect leaves a sidecar next to each preview
+                    for f in (p, _analysis_sidecar(p)):
+                        if f.exists():
+                            f.unlink()
+                tmpdir.rmdir()
+            except Exception:
+                pass
+
+
 def main():
     parser = argparse.ArgumentParser(description="Download 4 preview sounds from Freesound by text OR choose one locally, and mix into MP4 at a specific frame.")
     parser.add_argument("--query", required=False, default=None, help='Search text for Freesound, e.g., "ring bell sound" (omit if using --mp3-dir)')
     parser.add_argument("--input", type=pathlib.Path, required=True, help="Input MP4 video path")
     parser.add_argument("--output", type=pathlib.Path, required=True, help="Output MP4 video path")
-    parser.add_argument("--frame", type=int, required=True, help="Frame number at which to start the sound (0-based)")
+    parser.add_argument("--frame", type=int, default=None, help="Frame number at which to start the sound (0-based)")
+    parser.add_argument("--cues", type=pathlib.Path, default=None, help="JSON/CSV cue list (frame|time, sound|query, gain, offset_ms) mixed in one pass; replaces --frame")
     parser.add_argument("--gain", type=float, default=1.0, help="Gain to apply to the inserted sound (1.0 = unchanged)")
     parser.add_argument("--bg-gain", type=float, default=1.0, help="Gain to apply to the original video audio (1.0 = unchanged)")
-    parser.add_argument("--keep-temp", action="store_true", help="Keep downloaded previews")
-    parser.add_argument("--offset-ms", type=int, default=0, help="Trim this many milliseconds from start of the effect (skip leading silence)")
+    parser.add_argument("--keep-temp", action="store_true", help="Keep downloaded previews (only without the sound library)")
+    parser.add_argument("--library", type=pathlib.Path, default=None, help="Sound library directory (default: $SOUND_LIBRARY_DIR or ~/.cache/sound_library)")
+    parser.add_argument("--no-library", action="store_true", help="Always search Freesound and download previews to a temp folder")
+    parser.add_argument("--offset-ms", type=int, default=None, help="Trim this many milliseconds from start of the effect (default: the detected leading silence)")
+    parser.add_argument("--target-lufs", type=float, default=None, help="Normalize each effect to this integrated loudness before --gain (e.g. -18; peaks kept <= -1 dBTP)")
+    parser.add_argument("--duck", choices=DUCK_METHODS, default="envelope", help="Background ducking: precomputed smooth gain envelope (default), sidechaincompress, or none")
     parser.add_argument("--min-dur", type=float, default=None, help="Minimum duration (seconds) of sound (optional)")
     parser.add_argument("--max-dur", type=float, default=None, help="Maximum duration (seconds) of sound (optional)")
     parser.add_argument("--license-filter", type=str, default=None, help="Advanced Freesound license filter, e.g., license:(\"Creative Commons 0\")")
     parser.add_argument("--extra-filter", type=str, default=None, help="Raw Freesound filter string to add (advanced)")
     parser.add_argument("--page-size", type=int, default=50, help="Search page size (default 50)")
     parser.add_argument("--verbose", action="store_true", help="Verbose search logs")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Concurrent Freesound searches/downloads (default {DEFAULT_WORKERS})")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SEC, help=f"Max Freesound API requests per second (default {DEFAULT_RATE_PER_SEC})")
     parser.add_argument("--mp3-dir", type=pathlib.Path, default=None, help="If set, choose a random audio file from this folder (mp3/ogg) instead of downloading from Freesound.")
     parser.add_argument("--exts", type=str, default="mp3,ogg", help="Comma-separated audio extensions to include with --mp3-dir. Default: mp3,ogg")
     args = parser.parse_args()
+    set_rate_limit(args.rate)
+
+    if args.cues is None and args.frame is None:
+        print("ERROR: Provide --frame (single sound) or --cues (cue list).", file=sys.stderr)
+        sys.exit(2)
+
+    if args.cues is not None:
+        if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+            print("ERROR: ffmpeg/ffprobe not found on PATH.", file=sys.stderr)
+            sys.exit(1)
+        if not args.input.exists():
+            print(f"ERROR: Input not found: {args.input}", file=sys.stderr)
+            sys.exit(1)
+        cues = load_cues(args.cues)
+        if not cues:
+            print(f"ERROR: No cues in {args.cues}", file=sys.stderr)
+            sys.exit(1)
+        fps = get_fps(args.input)
+        print(f"Detected FPS: {fps:.3f}; {len(cues)} cues")
+        mix_cues(args, cues, fps)
+        return
 
     # Require at least one source: Freesound (--query) or local folder (--mp3-dir)
     if not args.mp3_dir and not args.query:
         print("ERROR: Provide either --query (Freesound) or --mp3-dir (local folder of sounds).", file=sys.stderr)
         sys.exit(2)
 
+    # The token is checked when a search actually has to go to the network
     api_token = os.getenv("FREESOUND_API_TOKEN", "").strip()
-    if not args.mp3_dir:
-        if not api_token:
-            print("ERROR: Please export FREESOUND_API_TOKEN with your Freesound API token (or use --mp3-dir).", file=sys.stderr)
-            sys.exit(1)
 
     if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
         print("ERROR: ffmpeg/ffprobe not found on PATH.", file=sys.stderr)
@@ -205,92 +798,57 @@ def main():
     print(f"Detected FPS: {fps:.3f}; start at {start_sec:.3f}s ({start_ms} ms)")
 
     used_downloads = False
+    library: Optional[sound_library.SoundLibrary] = None
 
     # If local directory provided, pick a random file from there
     choice: pathlib.Path
     if args.mp3_dir:
-        if not args.mp3_dir.exists() or not args.mp3_dir.is_dir():
-            print(f"ERROR: --mp3-dir not found or not a directory: {args.mp3_dir}", file=sys.stderr)
-            sys.exit(1)
-        exts = [e.strip().lstrip('.').lower() for e in (args.exts.split(',') if args.exts else ['mp3','ogg'])]
-        candidates: List[pathlib.Path] = []
-        for ext in exts:
-            candidates.extend(sorted(args.mp3_dir.glob(f"*.{ext}")))
-        if not candidates:
-            print(f"ERROR: No files with extensions {exts} found in {args.mp3_dir}", file=sys.stderr)
-            sys.exit(1)
+        candidates = local_candidates(args.mp3_dir, args.exts)
         choice = random.choice(candidates)
         print(f"Chosen local sound: {choice}")
     else:
         # Search and download 4 previews
-        results = search_freesound(
-            api_token,
-            args.query,
-            num=4,
-            page_size=args.page_size,
-            min_dur=args.min_dur,
-            max_dur=args.max_dur,
-            license_filter=args.license_filter,
-            extra_filter=args.extra_filter,
-            verbose=args.verbose,
-        )
-        if not results:
-            print("No results from Freesound. Try a broader query (e.g., 'click', 'ding') or use --verbose to debug.", file=sys.stderr)
-            sys.exit(1)
-
         tmpdir = args.output.parent / "_fs_previews"
-        tmpdir.mkdir(parents=True, exist_ok=True)
-
-        paths: List[pathlib.Path] = []
-        for i, item in enumerate(results, start=1):
-            p = tmpdir / f"preview_{i:02d}.mp3"
-            got = download_preview(item, p)
-            if got:
-                paths.append(got)
-        if not paths:
-            print("Failed to download any previews.", file=sys.stderr)
-            sys.exit(1)
-
+        library = open_library(args)
+        paths = fetch_previews(api_token, args.query, args, tmpdir, library=library)
         choice = random.choice(paths)
-        used_downloads = True
+        used_downloads = library is None
     print(f"Chosen sound: {choice.name}")
     eff_dur = get_audio_duration_seconds(choice) or 0.0
     print(f"Effect duration: {eff_dur:.3f}s")
 
+    # Measured once per sound (cached beside it): leading silence, audible end, loudness
+    info = analyze_effect(choice, library)
+    offset_s, effect_play_dur = effect_timing(choice, args.offset_ms, info)
+    gain = round(effect_gain(args.gain, info, args.target_lufs), 4)
+    print(f"Effect offset {offset_s:.3f}s, audible {effect_play_dur:.3f}s, loudness {info.get('lufs')} LUFS, gain {gain}")
+
     # Build ffmpeg command
     # If video has audio: amix original and delayed sound
     # If no audio: just use delayed sound as the sole audio track
     video_has_audio = has_audio(args.input)
-
-    # Prepare effect trim to skip initial silence if requested
-    offset_ms = max(0, int(args.offset_ms))
-    offset_s = offset_ms / 1000.0
-    # Compute effect end time on the global timeline for ducking window (cap to effect duration if known)
-    effect_play_dur = max(0.0, (eff_dur - offset_s)) if eff_dur else 2.0
-    duck_start = start_sec
-    duck_end = start_sec + effect_play_dur
+    # adelay argument in milliseconds per channel (use same for stereo: ms|ms)
+    fx = f"[1:a]atrim=start={offset_s:.3f},asetpts=PTS-STARTPTS,volume={gain},adelay={start_ms}|{start_ms}"
+    duck, env_fmt, env_path = plan_ducking(args, [(start_sec, start_sec + effect_play_dur)], video_has_audio)
 
     if video_has_audio:
-        # Apply time-dependent ducking on background during the effect window
-        # adelay argument in milliseconds per channel (use same for stereo: ms|ms)
-        filt = (
-            f"[0:a]volume='if(between(t,{duck_start:.3f},{duck_end:.3f}),{args.bg_gain*0.6:.3f},{args.bg_gain:.3f})'[bg];"
-            f"[1:a]atrim=start={offset_s:.3f},asetpts=PTS-STARTPTS,volume={args.gain},adelay={start_ms}|{start_ms}[fx];"
-            f"[bg][fx]amix=inputs=2:duration=longest:dropout_transition=0[aout]"
-        )
-        cmd = (
-            f"ffmpeg -y -i {args.input.as_posix()} -i {choice.as_posix()} "
-            f"-filter_complex \"{filt}\" -map 0:v:0 -map [aout] -c:v copy -c:a aac -b:a 192k "
-            f"-movflags +faststart {args.output.as_posix()}"
-        )
+        # Duck the background while the effect plays (gain curve is input 2 for "envelope")
+        if duck == "sidechain":
+            chains = [f"{fx},asplit[fx][fxs]", "[fxs]apad[fxsc]"]
+            chains += duck_chains("sidechain", args.bg_gain, "[bg]", sidechain="[fxsc]")
+        else:
+            chains = duck_chains(duck, args.bg_gain, "[bg]", env_input=2, env_fmt=env_fmt) + [f"{fx}[fx]"]
+        chains.append("[bg][fx]amix=inputs=2:duration=longest:dropout_transition=0[aout]")
+        filt = ";".join(chains)
     else:
         # No original audio: just delay the effect and map it
-        filt = f"[1:a]atrim=start={offset_s:.3f},asetpts=PTS-STARTPTS,volume={args.gain},adelay={start_ms}|{start_ms}[aout]"
-        cmd = (
-            f"ffmpeg -y -i {args.input.as_posix()} -i {choice.as_posix()} "
-            f"-filter_complex \"{filt}\" -map 0:v:0 -map [aout] -c:v copy -c:a aac -b:a 192k "
-            f"-movflags +faststart {args.output.as_posix()}"
-        )
+        filt = f"{fx}[aout]"
+    env_arg = f"-i {env_path.as_posix()} " if env_path is not None else ""
+    cmd = (
+        f"ffmpeg -y -i {args.input.as_posix()} -i {choice.as_posix()} {env_arg}"
+        f"-filter_complex \"{filt}\" -map 0:v:0 -map [aout] -c:v copy -c:a aac -b:a 192k "
+        f"-movflags +faststart {args.output.as_posix()}"
+    )
 
     try:
         run(cmd)
@@ -299,10 +857,13 @@ def main():
         print(f"ffmpeg failed with code {e.returncode}", file=sys.stderr)
         sys.exit(e.returncode)
     finally:
+        if env_path is not None:
+            env_path.unlink()
         if used_downloads and not args.keep_temp:
             try:
                 for p in paths:
                     p.unlink(missing_ok=True)
+                    _analysis_sidecar(p).unlink(missing_ok=True)
                 tmpdir.rmdir()
             except Exception:
                 pass
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Offline check of the sound library + Freesound client.
+
+Runs search_freesound/fetch_previews against a local http.server stub (no token,
+no network) with a temporary SOUND_LIBRARY_DIR, and checks that repeated lookups
+are answered locally and that known Freesound ids are never downloaded twice.
+
+    python check_sound_library.py
+"""
+
+import argparse
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+STUB_SOUNDS = [
+    {"id": 100 + i, "name": f"click {i}", "tags": ["click", "mouse"], "duration": 0.5, "license": "cc0"}
+    for i in range(4)
+]
+
+searches = []
+downloads = Counter()
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith("/apiv2/search/text/"):
+            searches.append(self.path)
+            base = f"http://127.0.0.1:{self.server.server_port}"
+            results = [dict(s, previews={"preview-hq-mp3": f"{base}/previews/{s['id']}.mp3"}) for s in STUB_SOUNDS]
+            body = json.dumps({"results": results}).encode()
+        elif path.startswith("/previews/"):
+            sound_id = int(os.path.splitext(os.path.basename(path))[0])
+            downloads[sound_id] += 1
+            body = f"fake mp3 {sound_id}".encode()
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(cond: bool, what: str) -> None:
+    if not cond:
+        print(f"FAIL: {what}", file=sys.stderr)
+        sys.exit(1)
+    print(f"ok: {what}")
+
+
+def main():
+    server = http.server.HTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tmp = tempfile.TemporaryDirectory()
+    # Both are read at import / construction time, so set them first
+    os.environ["FREESOUND_API_URL"] = f"http://127.0.0.1:{server.server_port}/apiv2"
+    os.environ["SOUND_LIBRARY_DIR"] = os.path.join(tmp.name, "library")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import add_sound_from_freesound as fs
+    import sound_library
+
+    args = argparse.Namespace(
+        min_dur=None, max_dur=None, license_filter=None, extra_filter=None,
+        page_size=50, verbose=False, workers=fs.DEFAULT_WORKERS,
+    )
+    lib = sound_library.SoundLibrary()
+    work = fs.pathlib.Path(tmp.name) / "work"
+    try:
+        first = fs.fetch_previews("stub-token", "click mouse", args, work, library=lib)
+        check(len(first) == len(STUB_SOUNDS), "first lookup downloads every result into the library")
+        check(len(searches) == 1, "first lookup makes one search request")
+
+        n_search = len(searches)
+        again = fs.fetch_previews("stub-token", "click mouse", args, work, library=lib)
+        check(len(searches) == n_search, "repeated lookup makes no search request")
+        check(sorted(again) == sorted(first), "repeated lookup returns the same files")
+
+        fs.fetch_previews("stub-token", "mouse", args, work, library=lib)
+        check(len(searches) == n_search, "lookup matching local names/tags makes no search request")
+
+        fs.fetch_previews("stub-token", "door slam", args, work, library=lib)
+        check(len(searches) > n_search, "lookup without local matches searches Freesound")
+        check(all(n == 1 for n in downloads.values()), "known ids are not downloaded again")
+
+        check(lib.match("_", 4) == [] and lib.match("%", 4) == [], "LIKE wildcards in a query match literally")
+    finally:
+        lib.close()
+        server.shutdown()
+        tmp.cleanup()
+    print("sound library offline check passed")
+
+
+if __name__ == "__main__":
+    main()
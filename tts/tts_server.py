@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""Long-lived Coqui TTS worker: loads each model once and keeps it warm.
+
+run_tts.py used to import torch and load the model weights on every run, which
+dwarfs the synthesis of a short script. Start this once per container instead:
+
+    python tts_server.py --port 5002 --max-models 2
+
+and run_tts.py sends each script's text chunks here over HTTP.
+
+Synthesized sentences are cached on disk (float32 .npy per sentence, keyed by
+model, speaker / speaker_wav content hash, language and whitespace-normalized
+text) with least-recently-used eviction past --cache-max-mb, so re-rendering a
+script after editing one line only synthesizes that line.
+
+XTTS speaker conditioning (GPT latents + speaker embedding) is computed once per
+reference WAV content and stored under <cache dir>/speaker_latents, instead of
+being recomputed from speaker_wav for every sentence.
+
+    GET  /health      -> {"status": "ok", "models": [...loaded model names...]}
+    POST /synthesize  JSON {"model_name", "texts": [...], "speaker", "speaker_wav", "language"}
+                      -> float32 little-endian samples of every chunk back to back,
+                         with X-Sample-Rate and X-Chunk-Lengths (comma separated) headers
+
+The repo root and tts/ each carry an identical copy of this file (each is mounted
+as /app on its own). Keep the copies in sync.
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_PORT = 5002
+DEFAULT_URL = os.environ.get("TTS_SERVER_URL", f"http://127.0.0.1:{DEFAULT_PORT}")
+DEFAULT_CACHE_MAX_MB = 2048
+CACHE_VERSION = 1
+
+
+def _import_tts():
+    """Import torch + Coqui TTS, allowing the classes XTTS checkpoints pickle
+    (newer torch only unpickles allow-listed globals).
+    """
+    import torch
+    from TTS.utils.radam import RAdam
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import XttsAudioConfig, XttsArgs
+    from TTS.config.shared_configs import BaseDatasetConfig
+
+    torch.serialization.add_safe_globals([RAdam])
+    torch.serialization.add_safe_globals([collections.defaultdict])
+    torch.serialization.add_safe_globals([dict])
+    torch.serialization.add_safe_globals([XttsConfig])
+    torch.serialization.add_safe_globals([XttsAudioConfig])
+    torch.serialization.add_safe_globals([BaseDatasetConfig])
+    torch.serialization.add_safe_globals([XttsArgs])
+    from TTS.api import TTS
+    return TTS
+
+
+def get_sample_rate(tts_obj, default_sr: int = 22050) -> int:
+    """Try to obtain the sample rate from the TTS synthesizer; fall back to default."""
+    # Coqui TTS exposes sample rate via synthesizer in different versions
+    for path in [
+        "synthesizer.output_sample_rate",
+        "synthesizer.ap.sample_rate",
+        "synthesizer.tts_config.audio.sample_rate",
+    ]:
+        try:
+            obj = tts_obj
+            for attr in path.split('.'):
+                obj = getattr(obj, attr)
+            if isinstance(obj, int) and obj > 0:
+                return obj
+        except Exception:
+            pass
+    return default_sr
+
+
+class ModelCache:
+    """LRU of loaded TTS models keyed by model_name (at most max_models in memory).
+    Models load outside the lock: callers wanting a model that is being loaded wait
+    for that load, and names() never blocks (it backs /health).
+    """
+
+    def __init__(self, max_models: int = 2):
+        self.max_models = max(1, max_models)
+        self._models: "collections.OrderedDict[str, object]" = collections.OrderedDict()
+        self._loading: Dict[str, threading.Event] = {}
+        self._names: Tuple[str, ...] = ()
+        self._lock = threading.Lock()
+        self._TTS = None
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def get(self, model_name: str):
+        while True:
+            with self._lock:
+                if model_name in self._models:
+                    self._models.move_to_end(model_name)
+                    return self._models[model_name]
+                loading = self._loading.get(model_name)
+                if loading is None:
+                    loading = self._loading[model_name] = threading.Event()
+                    # Make room before loading, so two models never overlap in memory
+                    while self._models and len(self._models) + len(self._loading) > self.max_models:
+                        old_name, _ = self._models.popitem(last=False)
+                        print(f"Unloading TTS model {old_name}")
+                    self._names = tuple(self._models)
+                    break
+            # Loaded (or failed) by another caller: look again
+            loading.wait()
+        _free_gpu_memory()
+        try:
+            if self._TTS is None:
+                self._TTS = _import_tts()
+            print(f"Loading TTS model {model_name}")
+            tts = self._TTS(model_name=model_name)
+            attach_latent_cache(tts, model_name, speaker_latents_dir())
+            with self._lock:
+                self._models[model_name] = tts
+                self._names = tuple(self._models)
+            return tts
+        finally:
+            with self._lock:
+                del self._loading[model_name]
+            loading.set()
+
+
+def _free_gpu_memory() -> None:
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("TTS_CACHE_DIR")
+    if env:
+        return Path(env)
+    # ~/.local/share is the volume the tts containers keep models in, so it persists
+    return Path.home() / ".local" / "share" / "tts_cache"
+
+
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file, memoized per path/size/mtime."""
+    st = os.stat(path)
+    memo = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo not in _file_hashes:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        _file_hashes[memo] = h.hexdigest()
+    return _file_hashes[memo]
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def tts_kwargs(
+    model_name: str,
+    text: str,
+    speaker: Optional[str] = None,
+    speaker_wav: Optional[str] = None,
+    language: Optional[str] = None,
+) -> Dict[str, str]:
+    """Arguments for TTS.tts() for one chunk."""
+    # Build kwargs depending on model capability/inputs
+    kwargs = {"text": text}
+    if speaker_wav:
+        kwargs["speaker_wav"] = speaker_wav
+    elif speaker:
+        kwargs["speaker"] = speaker
+    # Force language for XTTS to avoid auto-detect switching when text has code
+    if "xtts" in (model_name or "").lower() and language:
+        kwargs["language"] = language
+    return kwargs
+
+
+def speaker_latents_dir() -> Path:
+    env = os.environ.get("TTS_LATENTS_DIR")
+    return Path(env) if env else default_cache_dir() / "speaker_latents"
+
+
+def attach_latent_cache(tts_obj, model_name: str, latents_dir: Path) -> None:
+    """XTTS recomputes the speaker conditioning from speaker_wav on every tts() call.
+    Wrap the model's get_conditioning_latents so it runs once per reference audio
+    content (and conditioning settings); results are kept in memory and saved to
+    latents_dir/<key>.pt for later runs. No-op for models without it.
+    """
+    model = getattr(getattr(tts_obj, "synthesizer", None), "tts_model", None)
+    compute = getattr(model, "get_conditioning_latents", None)
+    if compute is None:
+        return
+    memo: Dict[str, tuple] = {}
+
+    def cached(audio_path, *args, **kwargs):
+        paths = audio_path if isinstance(audio_path, (list, tuple)) else [audio_path]
+        try:
+            ident = {
+                "model_name": model_name,
+                "wav": [file_sha256(str(p)) for p in paths],
+                "args": [repr(a) for a in args],
+                "kwargs": {k: repr(v) for k, v in kwargs.items()},
+            }
+        except OSError:
+            return compute(audio_path, *args, **kwargs)
+        key = hashlib.sha1(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()
+        if key in memo:
+            return memo[key]
+        import torch
+
+        path = latents_dir / f"{key}.pt"
+        device = getattr(model, "device", "cpu")
+        try:
+            result = tuple(t.to(device) for t in torch.load(path.as_posix(), map_location="cpu"))
+            print(f"Speaker conditioning for {paths[0]} loaded from cache")
+        except Exception:  # missing or unreadable: compute and store it
+            result = tuple(compute(audio_path, *args, **kwargs))
+            try:
+                latents_dir.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f".{path.name}.{os.getpid()}")
+                torch.save([t.detach().cpu() for t in result], tmp.as_posix())
+                os.replace(tmp.as_posix(), path.as_posix())
+            except OSError as exc:
+                print(f"Could not save speaker conditioning: {exc}")
+        memo[key] = result
+        return result
+
+    model.get_conditioning_latents = cached
+
+
+class SentenceCache:
+    """Per-sentence waveforms as <root>/<key[:2]>/<key>.npy (float32), evicted least
+    recently used first (file mtime is bumped on every hit) once the total size
+    passes max_bytes. Sample rates per model live in <root>/sample_rates.json so a
+    fully cached script never needs the model loaded.
+    """
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.root = Path(root) if root else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def key(self, model_name: str, kwargs: Dict[str, str]) -> str:
+        ident = dict(kwargs, model_name=model_name, version=CACHE_VERSION)
+        if "speaker_wav" in ident:
+            ident["speaker_wav"] = file_sha256(ident["speaker_wav"])
+        return hashlib.sha1(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key)
+        try:
+            wav = np.load(path.as_posix())
+            os.utime(path.as_posix())
+        except (OSError, ValueError):
+            return None
+        return wav.astype(np.float32, copy=False)
+
+    def put(self, key: str, wav: np.ndarray) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.npy")
+        np.save(tmp.as_posix(), np.asarray(wav, dtype=np.float32))
+        os.replace(tmp.as_posix(), path.as_posix())
+
+    def _rates_path(self) -> Path:
+        return self.root / "sample_rates.json"
+
+    def sample_rate(self, model_name: str) -> Optional[int]:
+        try:
+            return json.loads(self._rates_path().read_text()).get(model_name)
+        except (OSError, ValueError):
+            return None
+
+    def set_sample_rate(self, model_name: str, sr: int) -> None:
+        with self._lock:
+            try:
+                rates = json.loads(self._rates_path().read_text())
+            except (OSError, ValueError):
+                rates = {}
+            if rates.get(model_name) == sr:
+                return
+            rates[model_name] = sr
+            tmp = self._rates_path().with_name(f".sample_rates.{os.getpid()}.json")
+            tmp.write_text(json.dumps(rates))
+            os.replace(tmp.as_posix(), self._rates_path().as_posix())
+
+    def evict(self) -> None:
+        """Drop least recently used sentences until the cache is under 90% of max_bytes."""
+        with self._lock:
+            files = []
+            total = 0
+            for path in self.root.glob("*/*.npy"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+
+
+def open_cache(cache_dir: Optional[str] = None, max_mb: Optional[float] = None) -> Optional[SentenceCache]:
+    """Sentence cache from arguments or TTS_CACHE_DIR / TTS_CACHE_MAX_MB; None if
+    TTS_CACHE_MAX_MB is 0 or the directory can't be created.
+    """
+    if max_mb is None:
+        max_mb = float(os.environ.get("TTS_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    if max_mb <= 0:
+        return None
+    try:
+        return SentenceCache(Path(cache_dir) if cache_dir else None, int(max_mb * 1024 * 1024))
+    except OSError as exc:
+        print(f"Sentence cache disabled: {exc}")
+        return None
+
+
+class Synthesizer:
+    """Runs synthesis jobs against cached models, one job at a time (the models are
+    not safe to call from several threads). Sentences found in the cache are not
+    synthesized again; the misses of a job are synthesized back to back under one
+    model acquisition.
+    """
+
+    def __init__(self, max_models: int = 2, cache: Optional[SentenceCache] = None):
+        self.models = ModelCache(max_models)
+        self.cache = cache
+        self._lock = threading.Lock()
+
+    def synthesize(
+        self,
+        model_name: str,
+        texts: List[str],
+        speaker: Optional[str] = None,
+        speaker_wav: Optional[str] = None,
+        language: Optional[str] = None,
+    ) -> Tuple[int, List[np.ndarray]]:
+        """Synthesize each text chunk; returns (sample_rate, [float32 waveform per chunk])."""
+        t0 = time.time()
+        jobs = [tts_kwargs(model_name, normalize_text(t), speaker, speaker_wav, language) for t in texts]
+        keys: List[Optional[str]] = [None] * len(jobs)
+        wavs: List[Optional[np.ndarray]] = [None] * len(jobs)
+        sr = None
+        if self.cache is not None:
+            keys = [self.cache.key(model_name, kw) for kw in jobs]
+            sr = self.cache.sample_rate(model_name)
+            if sr:
+                wavs = [self.cache.get(k) for k in keys]
+
+        # Identical sentences within a job are synthesized once
+        misses: Dict[str, List[int]] = collections.OrderedDict()
+        for i, wav in enumerate(wavs):
+            if wav is None:
+                misses.setdefault(jobs[i]["text"], []).append(i)
+        # An empty job still answers with the model's sample rate
+        if misses or sr is None:
+            with self._lock:
+                tts = self.models.get(model_name)
+                sr = get_sample_rate(tts)
+                for text, idxs in misses.items():
+                    wav = np.asarray(tts.tts(**jobs[idxs[0]]), dtype=np.float32)
+                    for i in idxs:
+                        wavs[i] = wav
+                    if self.cache is not None:
+                        self.cache.put(keys[idxs[0]], wav)
+            if self.cache is not None:
+                self.cache.set_sample_rate(model_name, sr)
+                self.cache.evict()
+        n_synth = sum(len(idxs) for idxs in misses.values())
+        print(f"{len(texts)} chunks: {len(texts) - n_synth} cached, {len(misses)} synthesized in {time.time() - t0:.1f}s")
+        return sr, wavs
+
+    def preload(self, model_name: str) -> None:
+        """Load a model outside a job. Takes the job lock: with --max-models 1 the load
+        evicts the loaded model, which must not happen under a running job.
+        """
+        with self._lock:
+            self.models.get(model_name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    synthesizer: Synthesizer
+
+    def _send_json(self, code: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, {"status": "ok", "models": self.synthesizer.models.names()})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/synthesize":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            texts = [str(t) for t in job.get("texts", [])]
+            if not job.get("model_name"):
+                self._send_json(400, {"error": "model_name is required"})
+                return
+            sr, wavs = self.synthesizer.synthesize(
+                job["model_name"],
+                texts,
+                speaker=job.get("speaker"),
+                speaker_wav=job.get("speaker_wav"),
+                language=job.get("language"),
+            )
+        except Exception as exc:  # reported to the client, the server keeps running
+            self._send_json(500, {"error": f"{type(exc).__name__}: {exc}"})
+            return
+        body = b"".join(w.astype("<f4").tobytes() for w in wavs)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Sample-Rate", str(sr))
+        self.send_header("X-Chunk-Lengths", ",".join(str(w.size) for w in wavs))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        print(f"{self.address_string()} {fmt % args}")
+
+
+# ---- client side (used by run_tts.py) ----
+
+def server_available(url: str = DEFAULT_URL, timeout: float = 2.0) -> bool:
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/health", timeout=timeout) as r:
+            return r.status == 200
+    except (OSError, urllib.error.URLError):
+        return False
+
+
+def synthesize_remote(
+    url: str,
+    model_name: str,
+    texts: List[str],
+    speaker: Optional[str] = None,
+    speaker_wav: Optional[str] = None,
+    language: Optional[str] = None,
+    timeout: float = 3600.0,
+) -> Tuple[int, List[np.ndarray]]:
+    """Send one job to a running tts_server; same result as Synthesizer.synthesize."""
+    payload = json.dumps({
+        "model_name": model_name,
+        "texts": texts,
+        "speaker": speaker,
+        "speaker_wav": speaker_wav,
+        "language": language,
+    }).encode("utf-8")
+    req = urllib.request.Request(
+        f"{url.rstrip('/')}/synthesize", data=payload, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            sr = int(r.headers["X-Sample-Rate"])
+            lengths = [int(n) for n in r.headers.get("X-Chunk-Lengths", "").split(",") if n]
+            samples = np.frombuffer(r.read(), dtype="<f4").astype(np.float32)
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="ignore")
+        raise RuntimeError(f"TTS server error {e.code}: {detail}")
+    wavs = []
+    pos = 0
+    for n in lengths:
+        wavs.append(samples[pos:pos + n])
+        pos += n
+    return sr, wavs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep Coqui TTS models loaded and serve synthesis jobs over HTTP.")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on (0.0.0.0 to accept other containers)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port (default {DEFAULT_PORT})')
+    parser.add_argument('--max-models', type=int, default=2, help='How many models to keep loaded (least recently used is unloaded)')
+    parser.add_argument('--preload', type=str, action='append', default=[], help='Model name to load at startup (repeatable)')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Sentence cache folder (default $TTS_CACHE_DIR or ~/.local/share/tts_cache)')
+    parser.add_argument('--cache-max-mb', type=float, default=None, help=f'Sentence cache size limit in MB, 0 disables (default $TTS_CACHE_MAX_MB or {DEFAULT_CACHE_MAX_MB})')
+    args = parser.parse_args()
+
+    synthesizer = Synthesizer(args.max_models, open_cache(args.cache_dir, args.cache_max_mb))
+    _Handler.synthesizer = synthesizer
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    print(f"TTS server listening on http://{args.host}:{args.port}")
+    # Preload in the background so /health answers right away; jobs wait for the
+    # preload (it holds the job lock) instead of loading the model again
+    def preload():
+        for name in args.preload:
+            synthesizer.preload(name)
+
+    threading.Thread(target=preload, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
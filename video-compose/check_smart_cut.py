@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Offline check of compose_video's stream-copy smart cut (needs ffmpeg/ffprobe with libx264).
+
+Builds two sources in a temp folder: one encoded with the segment encoder's settings
+and one that is not (baseline profile). Composes sections from both with
+"stream_copy": true and checks that only the matching source is smart-cut, that
+the output decodes without a single error, and that the copied frames are
+bit-identical to the source's.
+
+    python check_smart_cut.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import compose_video  # noqa: E402
+
+W, H, FPS = 640, 360, 30
+CRF, PRESET = 23, "medium"
+
+
+def check(cond: bool, what: str) -> None:
+    if not cond:
+        print(f"FAIL: {what}", file=sys.stderr)
+        sys.exit(1)
+    print(f"ok: {what}")
+
+
+def make_source(path: Path, video_args) -> None:
+    # 12 s so x264's default GOP puts a keyframe mid-file
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-v", "error", "-y",
+         "-f", "lavfi", "-i", f"testsrc2=s={W}x{H}:r={FPS}:d=12",
+         "-f", "lavfi", "-i", "sine=frequency=440:duration=12"]
+        + video_args + ["-c:a", "aac", "-shortest", path.as_posix()],
+        check=True,
+    )
+
+
+def frame_hashes(path: Path):
+    res = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path.as_posix(), "-map", "0:v:0", "-f", "framemd5", "-"],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True,
+    )
+    return [line.rsplit(",", 1)[-1].strip() for line in res.stdout.splitlines() if line and not line.startswith("#")]
+
+
+def main():
+    compose_video.ensure_ffmpeg()
+    tmp = tempfile.TemporaryDirectory()
+    root = Path(tmp.name)
+    matched = root / "matched.mp4"
+    other = root / "other.mp4"
+    make_source(matched, compose_video.video_encode_args("libx264", PRESET, CRF, stable_headers=True))
+    make_source(other, ["-c:v", "libx264", "-profile:v", "baseline", "-preset", "ultrafast", "-pix_fmt", "yuv420p"])
+
+    cut = {"video": matched.as_posix(), "video_start": 7.0, "duration": 3.0}
+    headers = {}
+    kf = compose_video.smart_cut_keyframe(cut, root, W, H, FPS, "libx264", CRF, PRESET, headers)
+    check(kf is not None and 7.0 < kf < 10.0, "source with the encoder's stream header is smart-cut")
+    rejected = {"video": other.as_posix(), "video_start": 1.0, "duration": 2.0}
+    check(
+        compose_video.smart_cut_keyframe(rejected, root, W, H, FPS, "libx264", CRF, PRESET, headers) is None,
+        "source with another SPS/PPS (baseline profile) is re-encoded",
+    )
+
+    out = root / "out.mp4"
+    cfg = {
+        "output": out.as_posix(), "width": W, "height": H, "fps": FPS,
+        "crf": CRF, "preset": PRESET, "stream_copy": True,
+        "sections": [cut, rejected, {"video": matched.as_posix(), "video_start": 0.5, "duration": 2.0, "extra_filters": "hflip"}],
+    }
+    try:
+        compose_video.compose_from_dict(cfg)
+
+        dec = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-v", "error", "-i", out.as_posix(), "-f", "null", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+        )
+        check(dec.returncode == 0 and not dec.stderr.strip(), "smart-cut output decodes without errors")
+        got = frame_hashes(out)
+        check(len(got) == 7 * FPS, "output has every frame of the three sections")
+        src = frame_hashes(matched)
+        n_head = int(round((kf - 7.0) * FPS))
+        copied = got[n_head:3 * FPS]
+        check(copied == src[int(round(kf * FPS)):10 * FPS], "copied frames are bit-identical to the source")
+        check(
+            compose_video.video_stream_header(out.as_posix())["extradata_hash"]
+            == compose_video.video_stream_header(matched.as_posix())["extradata_hash"],
+            "output carries the source's SPS/PPS",
+        )
+    finally:
+        tmp.cleanup()
+    print("smart cut check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,138 @@
 #!/usr/bin/env python3
 
 import argparse
+import hashlib
 import json
 import os
+import re
 import shlex
+import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import media_probe
+
+
+# Per-command resource records; a list while compose_from_dict is profiling, None otherwise
+PROFILE_RECORDS: Optional[List[Dict[str, Any]]] = None
+_PROFILE_LOCK = threading.Lock()
 
 
 def run(cmd: List[str]) -> None:
     print("$", " ".join(shlex.quote(c) for c in cmd))
-    proc = subprocess.run(cmd)
-    if proc.returncode != 0:
-        raise RuntimeError(f"Command failed with exit code {proc.returncode}: {' '.join(cmd)}")
+    if PROFILE_RECORDS is None:
+        returncode = subprocess.run(cmd).returncode
+    else:
+        returncode = run_profiled(cmd)
+    if returncode != 0:
+        raise RuntimeError(f"Command failed with exit code {returncode}: {' '.join(cmd)}")
+
+
+def exit_code_from_status(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def parse_progress_file(path: Path) -> Dict[str, Any]:
+    """Pull the final speed/out_time from an ffmpeg -progress key=value log."""
+    info: Dict[str, Any] = {"speed": None, "out_time_s": None}
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return info
+    for line in lines:
+        key, _, value = line.partition("=")
+        value = value.strip()
+        if key == "speed" and value.endswith("x"):
+            try:
+                info["speed"] = float(value[:-1])
+            except ValueError:
+                pass
+        elif key == "out_time_us" and value.isdigit():
+            info["out_time_s"] = int(value) / 1e6
+    return info
+
+
+def run_profiled(cmd: List[str]) -> int:
+    """Run cmd and record wall/CPU time, peak RSS, output size and ffmpeg speed into PROFILE_RECORDS."""
+    progress_path: Optional[Path] = None
+    argv = list(cmd)
+    if argv and argv[0] == "ffmpeg":
+        fd, progress = tempfile.mkstemp(prefix="ffprogress_", suffix=".txt")
+        os.close(fd)
+        progress_path = Path(progress)
+        argv = [argv[0], "-progress", progress_path.as_posix()] + argv[1:]
+
+    t0 = time.monotonic()
+    proc = subprocess.Popen(argv)
+    rusage = None
+    if hasattr(os, "wait4"):
+        # wait4 gives this child's own rusage even when several encodes run in parallel
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = exit_code_from_status(status)
+    else:
+        proc.wait()
+    wall = time.monotonic() - t0
+
+    out_path = Path(cmd[-1])
+    record: Dict[str, Any] = {
+        "label": out_path.name,
+        "cmd": " ".join(shlex.quote(c) for c in cmd),
+        "returncode": proc.returncode,
+        "wall_s": round(wall, 3),
+        "cpu_user_s": round(rusage.ru_utime, 3) if rusage else None,
+        "cpu_sys_s": round(rusage.ru_stime, 3) if rusage else None,
+        # ru_maxrss is KiB on Linux
+        "max_rss_mb": round(rusage.ru_maxrss / 1024.0, 1) if rusage else None,
+        "output_bytes": out_path.stat().st_size if out_path.is_file() else None,
+        "speed": None,
+        "out_time_s": None,
+    }
+    if progress_path is not None:
+        record.update(parse_progress_file(progress_path))
+        try:
+            progress_path.unlink()
+        except OSError:
+            pass  # a leftover temp file must not hide the command's result
+    with _PROFILE_LOCK:
+        PROFILE_RECORDS.append(record)
+    return proc.returncode
+
+
+def write_profile_report(output: Path, records: List[Dict[str, Any]], wall: float, table: bool) -> Path:
+    """Write <output>.profile.json and optionally print the slowest commands first."""
+    report_path = output.with_name(f"{output.stem}.profile.json")
+    report = {
+        "output": output.as_posix(),
+        "wall_s": round(wall, 3),
+        "cpu_s": round(sum((r["cpu_user_s"] or 0) + (r["cpu_sys_s"] or 0) for r in records), 3),
+        "commands": records,
+    }
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"Profile report written to {report_path}")
+    if table:
+        print(f"{'command output':<28} {'wall s':>8} {'cpu s':>8} {'speed':>7} {'rss MB':>8} {'size MB':>8}")
+        for r in sorted(records, key=lambda r: r["wall_s"], reverse=True):
+            cpu = (r["cpu_user_s"] or 0) + (r["cpu_sys_s"] or 0)
+            speed = f"{r['speed']:.2f}x" if r["speed"] is not None else "-"
+            rss = f"{r['max_rss_mb']:.1f}" if r["max_rss_mb"] is not None else "-"
+            size = f"{r['output_bytes'] / 1e6:.1f}" if r["output_bytes"] is not None else "-"
+            print(f"{r['label'][:28]:<28} {r['wall_s']:>8.2f} {cpu:>8.2f} {speed:>7} {rss:>8} {size:>8}")
+    return report_path
+
+
+def run_steps(cmds: List[List[str]]) -> None:
+    """Run dependent commands for one segment in order."""
+    for cmd in cmds:
+        run(cmd)
 
 
 def ensure_ffmpeg() -> None:
@@ -25,6 +142,35 @@ def ensure_ffmpeg() -> None:
         raise RuntimeError("ffmpeg not found. Please install ffmpeg and ensure it's on PATH.")
 
 
+def resolve_jobs(requested: Optional[Any], n_tasks: int) -> int:
+    """Turn a 'parallel' / --jobs value into a worker count.
+    - None, 1 or missing: sequential (1 worker)
+    - 0 or "auto": one worker per available core
+    - N: at most N workers
+    Never more workers than there are tasks.
+    """
+    cpus = os.cpu_count() or 1
+    if requested is None:
+        jobs = 1
+    elif str(requested).strip().lower() in ("0", "auto"):
+        jobs = cpus
+    else:
+        jobs = int(requested)
+        if jobs < 0:
+            raise ValueError("'parallel' must be >= 0 (0 or \"auto\" = one job per core)")
+    return max(1, min(jobs, n_tasks))
+
+
+def threads_per_job(jobs: int) -> Optional[int]:
+    """Split available cores between concurrent ffmpeg processes.
+    Returns None for sequential runs so ffmpeg keeps its own default.
+    """
+    if jobs <= 1:
+        return None
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // jobs)
+
+
 DefSection = Dict[str, Any]
 
 
@@ -47,6 +193,120 @@ def clean_str_path(p: Optional[Any]) -> Optional[str]:
     return s
 
 
+SEGMENT_CACHE_DIR = Path("/app/data/tmp/segment_cache")
+SEGMENT_CACHE_MAX_BYTES = 20 * 1024 ** 3
+DEFAULT_BATCH_SIZE = 50
+
+
+def file_fingerprint(p: Optional[Any]) -> Optional[List[Any]]:
+    """Identify an input file by resolved path, size and mtime (cheap stand-in for a content hash)."""
+    s = clean_str_path(p)
+    if not s:
+        return None
+    path = Path(s).resolve()
+    try:
+        st = path.stat()
+    except OSError:
+        return [path.as_posix(), None, None]
+    return [path.as_posix(), st.st_size, st.st_mtime_ns]
+
+
+# Filter options whose value is a file ffmpeg reads (movie=logo.png, subtitles=x.srt, fontfile=, ...)
+_GRAPH_FILE_OPT = re.compile(
+    r"\b(?:a?movie|subtitles|ass|filename|fontfile|textfile|file)\s*=\s*('(?:[^'\\]|\\.)*'|[^:,;\[\]\s]+)"
+)
+
+
+def graph_file_refs(graph: str) -> List[str]:
+    """Paths of the files a filter graph string reads, as written in the graph."""
+    refs = []
+    for m in _GRAPH_FILE_OPT.finditer(graph):
+        value = m.group(1)
+        if value.startswith("'") and value.endswith("'"):
+            value = value[1:-1]
+        value = re.sub(r"\\(.)", r"\1", value)
+        if value and value not in refs:
+            refs.append(value)
+    return refs
+
+
+def section_graph_refs(sec: DefSection) -> List[str]:
+    """Files referenced from inside extra_filters and the filter_script file."""
+    refs = graph_file_refs(str(sec.get("extra_filters") or ""))
+    script = clean_str_path(sec.get("filter_script"))
+    if script:
+        try:
+            refs += [r for r in graph_file_refs(Path(script).read_text(encoding="utf-8")) if r not in refs]
+        except OSError:
+            pass
+    return refs
+
+
+def section_cache_key(sec: DefSection, encode_params: Dict[str, Any]) -> str:
+    """Content address for a rendered segment: section dict + input files (including files
+    that extra_filters / filter_script graphs read by name) + global encode params.
+    """
+    payload = {
+        "section": sec,
+        "inputs": {k: file_fingerprint(sec.get(k)) for k in ("video", "audio", "ass", "filter_script")},
+        "graph_inputs": [file_fingerprint(r) for r in section_graph_refs(sec)],
+        "encode": encode_params,
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def cache_fetch(cache_dir: Path, key: str, dest: Path) -> bool:
+    entry = cache_dir / f"{key}.mp4"
+    if not entry.is_file():
+        return False
+    link_or_copy(entry, dest)
+    # Bump mtime so eviction treats this entry as recently used
+    os.utime(entry, None)
+    return True
+
+
+def cache_store(cache_dir: Path, key: str, src: Path) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_dir / f".{key}.{os.getpid()}.part"
+    link_or_copy(src, tmp)
+    os.replace(tmp, cache_dir / f"{key}.mp4")
+
+
+def cache_evict(cache_dir: Path, max_bytes: int) -> int:
+    """Drop least recently used entries until the cache fits in max_bytes. Returns entries removed."""
+    if not cache_dir.is_dir():
+        return 0
+    entries = []
+    for e in cache_dir.glob("*.mp4"):
+        try:
+            st = e.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, e))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, e in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            e.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
 def seconds_from_section(sec: DefSection) -> float:
     if "duration" in sec:
         return float(sec["duration"])
@@ -55,6 +315,47 @@ def seconds_from_section(sec: DefSection) -> float:
     raise ValueError("Section must include either 'duration' or both 'start' and 'end'.")
 
 
+def section_video_filters(
+    sec: DefSection,
+    target_w: Optional[int],
+    target_h: Optional[int],
+    fps: Optional[int],
+) -> List[str]:
+    """Per-section video filter chain: fps, scale/pad to target, ass overlay, extra_filters."""
+    filters: List[str] = []
+    if fps:
+        filters.append(f"fps={fps}")
+    if target_w and target_h:
+        # Scale to fit inside target while preserving aspect, pad to exact size
+        filters.append(
+            f"scale=w={target_w}:h={target_h}:force_original_aspect_ratio=decrease"
+        )
+        filters.append(
+            f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2:color=black"
+        )
+    ass = clean_str_path(sec.get("ass"))
+    if ass:
+        # Escape backslashes and colons for drawtext/ass filter
+        ass_path = str(Path(ass).resolve()).replace("\\", "\\\\").replace(":", r"\:")
+        filters.append(f"ass='{ass_path}'")
+
+    extra_filters = sec.get("extra_filters")
+    if extra_filters:
+        filters.append(str(extra_filters))
+    return filters
+
+
+def video_encode_args(vcodec: str, preset: str, crf: int, stable_headers: bool = False) -> List[str]:
+    """Video encoder options shared by every segment. With stable_headers, x264 writes
+    the same SPS/PPS whatever the content (stitchable), so separately encoded parts
+    and sources made with the same settings can be joined by stream copy.
+    """
+    args = ["-c:v", vcodec, "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p"]
+    if stable_headers and vcodec == "libx264":
+        args += ["-x264-params", "stitchable=1"]
+    return args
+
+
 def build_section_ffmpeg_cmd(
     idx: int,
     sec: DefSection,
@@ -66,6 +367,8 @@ def build_section_ffmpeg_cmd(
     acodec: str,
     crf: int,
     preset: str,
+    threads: Optional[int] = None,
+    stable_headers: bool = False,
 ) -> List[str]:
     duration = seconds_from_section(sec)
     if duration <= 0:
@@ -81,25 +384,7 @@ def build_section_ffmpeg_cmd(
     video_start = float(sec.get("video_start", 0))
     audio_start = float(sec.get("audio_start", 0))
 
-    filters: List[str] = []
-    if fps:
-        filters.append(f"fps={fps}")
-    if target_w and target_h:
-        # Scale to fit inside target while preserving aspect, pad to exact size
-        filters.append(
-            f"scale=w={target_w}:h={target_h}:force_original_aspect_ratio=decrease"
-        )
-        filters.append(
-            f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2:color=black"
-        )
-    if ass:
-        # Escape backslashes and colons for drawtext/ass filter
-        ass_path = str(Path(ass).resolve()).replace("\\", "\\\\").replace(":", r"\:")
-        filters.append(f"ass='{ass_path}'")
-
-    extra_filters = sec.get("extra_filters")
-    if extra_filters:
-        filters.append(str(extra_filters))
+    filters = section_video_filters(sec, target_w, target_h, fps)
 
     vf = ",".join(filters) if filters else None
 
@@ -140,7 +425,383 @@ def build_section_ffmpeg_cmd(
         cmd += ["-vf", vf]
 
     # Encoding params for uniformity across segments
+    cmd += video_encode_args(vcodec, preset, crf, stable_headers)
     cmd += [
+        "-c:a", acodec,
+        "-b:a", "192k",
+    ]
+    if threads:
+        # Cap encoder threads so concurrent segment encodes don't oversubscribe the host
+        cmd += ["-threads", str(threads)]
+    cmd.append(out_path.as_posix())
+
+    return cmd
+
+
+# ffprobe codec_name for each encoder we emit; used to spot sources already in the target format
+ENCODER_CODEC_NAMES = {
+    "libx264": "h264",
+    "h264": "h264",
+    "libx265": "hevc",
+    "hevc": "hevc",
+    "libvpx-vp9": "vp9",
+    "libaom-av1": "av1",
+}
+
+
+def section_is_copy_compatible(
+    sec: DefSection,
+    params: Optional[Dict[str, Any]],
+    target_w: Optional[int],
+    target_h: Optional[int],
+    fps: Optional[int],
+    vcodec: str,
+) -> bool:
+    """True when the section needs no video filtering and its source already matches the master format."""
+    if not params:
+        return False
+    if sec.get("ass") or sec.get("extra_filters") or sec.get("filter_script"):
+        return False
+    if params.get("codec_name") != ENCODER_CODEC_NAMES.get(vcodec):
+        return False
+    if params.get("pix_fmt") != "yuv420p":
+        return False
+    if target_w and target_h and (params.get("width"), params.get("height")) != (int(target_w), int(target_h)):
+        return False
+    if fps:
+        rate = params.get("fps")
+        if rate is None or abs(rate - float(fps)) > 0.01:
+            return False
+    # Encoded segments get square pixels from scale/pad
+    if params.get("sar") not in (None, "1:1"):
+        return False
+    return True
+
+
+def video_stream_header(path: str) -> Optional[Dict[str, Any]]:
+    """First video stream's decoder setup: extradata hash (SPS/PPS for H.264), profile,
+    level, refs, time base and frame rate. None if ffprobe fails.
+    """
+    try:
+        res = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-show_streams", "-show_data_hash", "sha256",
+                "-of", "json",
+                path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        )
+        streams = json.loads(res.stdout).get("streams") or []
+    except Exception:
+        return None
+    if not streams:
+        return None
+    st = streams[0]
+    return {k: st.get(k) for k in (
+        "extradata_hash", "profile", "level", "refs", "width", "height", "time_base", "r_frame_rate",
+    )}
+
+
+def encoder_stream_header(
+    workdir: Path,
+    width: int,
+    height: int,
+    rate: str,
+    vcodec: str,
+    crf: int,
+    preset: str,
+) -> Optional[Dict[str, Any]]:
+    """Stream header our segment encoder produces for this format, from a two-frame encode."""
+    out = workdir / f"header_probe_{width}x{height}_{rate.replace('/', '_')}.mp4"
+    cmd = [
+        "ffmpeg", "-hide_banner", "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"color=c=black:s={width}x{height}:r={rate},setsar=1",
+        "-frames:v", "2",
+    ] + video_encode_args(vcodec, preset, crf, stable_headers=True) + [out.as_posix()]
+    if subprocess.run(cmd).returncode != 0:
+        return None
+    try:
+        return video_stream_header(out.as_posix())
+    finally:
+        out.unlink()
+
+
+def smart_cut_keyframe(
+    sec: DefSection,
+    workdir: Path,
+    target_w: Optional[int],
+    target_h: Optional[int],
+    fps: Optional[int],
+    vcodec: str,
+    crf: int,
+    preset: str,
+    headers: Dict[Tuple[Any, ...], Optional[Dict[str, Any]]],
+) -> Optional[float]:
+    """Keyframe from which the section's source can be stream-copied, or None to re-encode it.
+
+    Copying is only safe when the source's SPS/PPS are byte-identical to what our encoder
+    writes for the head and for the other segments: an MP4 track keeps one avcC, so a
+    mismatch decodes the copied part with the wrong parameter sets after the join.
+    headers memoizes the encoder's header per format across sections.
+    """
+    video = clean_str_path(sec.get("video")) or ""
+    if not section_is_copy_compatible(sec, media_probe.video_params(video), target_w, target_h, fps, vcodec):
+        return None
+    src = video_stream_header(video)
+    if not src or not src.get("extradata_hash"):
+        return None
+    w = int(target_w) if target_w else int(src["width"])
+    h = int(target_h) if target_h else int(src["height"])
+    rate = str(fps) if fps else str(src["r_frame_rate"])
+    fmt = (w, h, rate, vcodec, crf, preset)
+    if fmt not in headers:
+        headers[fmt] = encoder_stream_header(workdir, w, h, rate, vcodec, crf, preset)
+    ref = headers[fmt]
+    if not ref or ref.get("extradata_hash") != src["extradata_hash"]:
+        profile = f"{src.get('profile')}@{src.get('level')} refs={src.get('refs')}"
+        print(f"Section source {video}: stream header ({profile}) differs from the encoder's; re-encoding")
+        return None
+    start = float(sec.get("video_start", 0))
+    return first_keyframe_after(video, start, start + seconds_from_section(sec))
+
+
+def first_keyframe_after(path: str, start: float, end: float) -> Optional[float]:
+    """Timestamp of the first video keyframe in [start, end), from packet flags (no decode)."""
+    try:
+        res = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-read_intervals", f"{max(0.0, start - 1.0)}%{end}",
+                "-show_entries", "packet=pts_time,flags",
+                "-of", "csv=p=0",
+                path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True,
+        )
+    except Exception:
+        return None
+    best: Optional[float] = None
+    for line in res.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            t = float(parts[0])
+        except ValueError:
+            continue
+        # Allow half a millisecond of rounding in ffprobe's printed timestamps
+        if start - 0.0005 <= t < end and (best is None or t < best):
+            best = t
+    return best
+
+
+def source_timescale(path: Optional[str]) -> Optional[int]:
+    """Denominator of the first video stream's time base (its MP4 track timescale)."""
+    header = video_stream_header(path) if path else None
+    tb = str((header or {}).get("time_base") or "")
+    num, _, den = tb.partition("/")
+    if num == "1" and den.isdigit():
+        return int(den)
+    return None
+
+
+def build_copy_section_cmds(
+    idx: int,
+    sec: DefSection,
+    out_path: Path,
+    keyframe: float,
+    target_w: Optional[int],
+    target_h: Optional[int],
+    fps: Optional[int],
+    vcodec: str,
+    acodec: str,
+    crf: int,
+    preset: str,
+    threads: Optional[int] = None,
+) -> List[List[str]]:
+    """Smart-cut a copy-compatible section (see smart_cut_keyframe).
+
+    Video from the first keyframe onwards is stream-copied; only the partial GOP
+    between video_start and that keyframe is re-encoded (with the stable headers
+    the source was checked against, in the source's track timescale), then both
+    parts are joined with the concat demuxer. Audio is always re-encoded (cheap)
+    so every segment shares the same audio parameters.
+    """
+    duration = seconds_from_section(sec)
+    video = clean_str_path(sec.get("video"))
+    audio = clean_str_path(sec.get("audio"))
+    video_start = float(sec.get("video_start", 0))
+    audio_start = float(sec.get("audio_start", 0))
+    head = max(0.0, keyframe - video_start)
+    if head < 0.001:
+        head = 0.0
+    tail = duration - head
+
+    cmds: List[List[str]] = []
+    parts: List[Path] = []
+    if head > 0:
+        head_out = out_path.with_name(f"{out_path.stem}_head.mp4")
+        head_sec = dict(sec, duration=head, video_start=video_start, audio_start=audio_start)
+        head_cmd = build_section_ffmpeg_cmd(
+            idx, head_sec, head_out, target_w, target_h, fps, vcodec, acodec, crf, preset,
+            threads=threads, stable_headers=True,
+        )
+        timescale = source_timescale(video)
+        if timescale:
+            head_cmd[-1:-1] = ["-video_track_timescale", str(timescale)]
+        cmds.append(head_cmd)
+        parts.append(head_out)
+
+    tail_out = out_path if head == 0 else out_path.with_name(f"{out_path.stem}_tail.mp4")
+    cmd: List[str] = ["ffmpeg", "-hide_banner", "-y"]
+    # Seek a hair past the keyframe so the demuxer lands exactly on it
+    cmd += ["-ss", f"{keyframe + 0.001 if head > 0 else video_start}", "-i", video]
+    if audio:
+        cmd += ["-ss", f"{audio_start + head}", "-i", audio]
+    cmd += ["-t", f"{tail}", "-map", "0:v:0"]
+    cmd += ["-map", "1:a:0?" if audio else "0:a:0?", "-shortest"]
+    cmd += [
+        "-c:v", "copy",
+        "-c:a", acodec,
+        "-b:a", "192k",
+        "-avoid_negative_ts", "make_zero",
+        tail_out.as_posix(),
+    ]
+    cmds.append(cmd)
+    parts.append(tail_out)
+
+    if head > 0:
+        list_path = out_path.with_name(f"{out_path.stem}_parts.txt")
+        list_path.write_text("".join(f"file '{p.as_posix()}'\n" for p in parts))
+        cmds.append([
+            "ffmpeg", "-hide_banner", "-y",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path.as_posix(),
+            "-c", "copy",
+            out_path.as_posix(),
+        ])
+    return cmds
+
+
+def concat_copy(inputs: List[Path], out_path: Path) -> None:
+    """Join already-encoded MP4s with the concat demuxer (stream copy)."""
+    list_path = out_path.with_suffix(".txt")
+    with list_path.open("w") as f:
+        for p in inputs:
+            f.write(f"file '{p.as_posix()}'\n")
+    run([
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_path.as_posix(),
+        "-c", "copy",
+        out_path.as_posix(),
+    ])
+    list_path.unlink()
+
+
+def merge_hierarchically(paths: List[Path], tmpdir: Path, fan_in: int) -> List[Path]:
+    """Concat groups of fan_in files level by level until at most fan_in remain.
+    Inputs are deleted as soon as they are merged to bound temp disk usage.
+    """
+    level = 0
+    while len(paths) > fan_in:
+        merged: List[Path] = []
+        for j in range(0, len(paths), fan_in):
+            group = paths[j:j + fan_in]
+            out = tmpdir / f"merge_l{level}_{j // fan_in:04d}.mp4"
+            concat_copy(group, out)
+            for p in group:
+                p.unlink()
+            merged.append(out)
+        paths = merged
+        level += 1
+    return paths
+
+
+def build_single_pass_ffmpeg_cmd(
+    sections: List[DefSection],
+    out_path: Path,
+    script_path: Path,
+    target_w: int,
+    target_h: int,
+    fps: Optional[int],
+    vcodec: str,
+    acodec: str,
+    crf: int,
+    preset: str,
+) -> Tuple[List[str], str]:
+    """Build one ffmpeg invocation that trims, filters and concatenates every section.
+
+    Returns (cmd, filtergraph). The caller writes the filtergraph to script_path,
+    which the command reads via -filter_complex_script.
+    """
+    cmd: List[str] = ["ffmpeg", "-hide_banner", "-y"]
+    chains: List[str] = []
+    concat_inputs: List[str] = []
+    n_inputs = 0
+    for idx, sec in enumerate(sections):
+        duration = seconds_from_section(sec)
+        if duration <= 0:
+            raise ValueError(f"Section {idx}: duration must be > 0")
+        video = clean_str_path(sec.get("video"))
+        if not video:
+            raise ValueError(f"Section {idx}: 'video' is required")
+        if sec.get("filter_script"):
+            raise ValueError(f"Section {idx}: 'filter_script' is not supported in single_pass mode")
+        audio = clean_str_path(sec.get("audio"))
+        video_start = float(sec.get("video_start", 0))
+        audio_start = float(sec.get("audio_start", 0))
+
+        # Input-level -ss/-t keeps decoding bounded to the section window
+        if video_start > 0:
+            cmd += ["-ss", f"{video_start}"]
+        cmd += ["-t", f"{duration}", "-i", video]
+        v_in = n_inputs
+        n_inputs += 1
+        a_src: Optional[str] = None
+        if audio and not media_probe.has_audio(audio):
+            # Mapping [n:a:0] of a file without audio fails the whole graph
+            print(f"Section {idx}: {audio} has no audio stream; using silence")
+            audio = None
+        if audio:
+            if audio_start > 0:
+                cmd += ["-ss", f"{audio_start}"]
+            cmd += ["-t", f"{duration}", "-i", audio]
+            a_src = f"[{n_inputs}:a:0]"
+            n_inputs += 1
+        elif media_probe.has_audio(video):
+            a_src = f"[{v_in}:a:0]"
+
+        vf = section_video_filters(sec, target_w, target_h, fps)
+        vf += ["setsar=1", f"trim=duration={duration}", "setpts=PTS-STARTPTS"]
+        chains.append(f"[{v_in}:v:0]{','.join(vf)}[v{idx}]")
+        # Every concat segment needs an audio stream of the same layout; pad/trim to the section length
+        af = f"aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo,apad,atrim=duration={duration},asetpts=PTS-STARTPTS"
+        if a_src:
+            chains.append(f"{a_src}{af}[a{idx}]")
+        else:
+            chains.append(f"anullsrc=r=48000:cl=stereo,atrim=duration={duration},asetpts=PTS-STARTPTS[a{idx}]")
+        concat_inputs.append(f"[v{idx}][a{idx}]")
+
+    chains.append(f"{''.join(concat_inputs)}concat=n={len(sections)}:v=1:a=1[outv][outa]")
+    graph = ";\n".join(chains) + "\n"
+
+    cmd += [
+        "-filter_complex_script", script_path.as_posix(),
+        "-map", "[outv]",
+        "-map", "[outa]",
         "-c:v", vcodec,
         "-preset", preset,
         "-crf", str(crf),
@@ -149,11 +810,51 @@ def build_section_ffmpeg_cmd(
         "-b:a", "192k",
         out_path.as_posix(),
     ]
+    return cmd, graph
 
-    return cmd
+
+def compose_from_dict(
+    cfg: Dict[str, Any],
+    *,
+    phase: Optional[str] = None,
+    workdir: Optional[Path] = None,
+    jobs: Optional[Any] = None,
+    use_cache: Optional[bool] = None,
+    profile: Optional[str] = None,
+) -> Path:
+    """Compose one config. With profile ("json"/"table", or "profile" in the config)
+    every ffmpeg run is measured and a <output>.profile.json report is written.
+    """
+    global PROFILE_RECORDS
+    # --profile on the CLI wins over "profile" in the config
+    profile_mode = profile if profile is not None else cfg.get("profile")
+    if not profile_mode:
+        return compose_sections(cfg, phase=phase, workdir=workdir, jobs=jobs, use_cache=use_cache)
+
+    records: List[Dict[str, Any]] = []
+    PROFILE_RECORDS = records
+    t0 = time.monotonic()
+    try:
+        return compose_sections(cfg, phase=phase, workdir=workdir, jobs=jobs, use_cache=use_cache)
+    finally:
+        PROFILE_RECORDS = None
+        # Written on failure too, so a crashed run still shows where the time went
+        output = Path(cfg.get("output", "master.mp4")).resolve()
+        try:
+            write_profile_report(output, records, time.monotonic() - t0, table=(profile_mode == "table"))
+        except Exception as e:
+            # Raising here would replace the compose error (or result) with the report's
+            print(f"Warning: could not write the profile report: {e}", file=sys.stderr)
 
 
-def compose_from_dict(cfg: Dict[str, Any], *, phase: Optional[str] = None, workdir: Optional[Path] = None) -> Path:
+def compose_sections(
+    cfg: Dict[str, Any],
+    *,
+    phase: Optional[str] = None,
+    workdir: Optional[Path] = None,
+    jobs: Optional[Any] = None,
+    use_cache: Optional[bool] = None,
+) -> Path:
     ensure_ffmpeg()
 
     # Support shorthand JSON: {"video": "file.mp4", "seconds": 10, ...}
@@ -176,8 +877,6 @@ def compose_from_dict(cfg: Dict[str, Any], *, phase: Optional[str] = None, workd
     sections: List[DefSection] = cfg.get("sections", [])
     if not sections:
         raise ValueError("Config must include 'sections'.")
-    if len(sections) > 8:
-        raise ValueError("Maximum of 8 sections supported.")
 
     width = cfg.get("width")
     height = cfg.get("height")
@@ -190,6 +889,39 @@ def compose_from_dict(cfg: Dict[str, Any], *, phase: Optional[str] = None, workd
     # Use a stable temp root under /app/data/tmp for all intermediate compose files
     tmp_root = Path("/app/data/tmp")
     tmp_root.mkdir(parents=True, exist_ok=True)
+
+    mode = cfg.get("mode", "segments")
+    if mode not in ("segments", "single_pass"):
+        raise ValueError(f"Unknown mode '{mode}' (expected 'segments' or 'single_pass').")
+    if mode == "single_pass":
+        if phase:
+            raise ValueError("--phase is not supported with mode 'single_pass' (there are no intermediate segments).")
+        if any(sec.get("filter_script") for sec in sections):
+            # filter_script graphs reference their own input labels and cannot be merged; use segments
+            print("Note: sections with 'filter_script' present; falling back to mode 'segments'.")
+        else:
+            if not (width and height):
+                raise ValueError("mode 'single_pass' requires 'width' and 'height' so all sections share one frame size.")
+            tmpdir = Path(tempfile.mkdtemp(prefix="compose_single_", dir=str(tmp_root)))
+            print(f"Working directory: {tmpdir}")
+            script_path = tmpdir / "filter_complex.txt"
+            cmd, graph = build_single_pass_ffmpeg_cmd(
+                sections,
+                output,
+                script_path,
+                int(width),
+                int(height),
+                fps,
+                vcodec,
+                acodec,
+                crf,
+                preset,
+            )
+            script_path.write_text(graph)
+            output.parent.mkdir(parents=True, exist_ok=True)
+            run(cmd)
+            print(f"Wrote {output}")
+            return output
     # If running in phased mode, default to a deterministic workdir per output name unless a workdir is provided
     if phase:
         if workdir is not None:
@@ -204,23 +936,116 @@ def compose_from_dict(cfg: Dict[str, Any], *, phase: Optional[str] = None, workd
 
     # Phase 1: render segments and write concat list
     if phase is None or phase == "phase1":
+        # --jobs on the CLI wins over "parallel" in the config
+        n_jobs = resolve_jobs(jobs if jobs is not None else cfg.get("parallel"), len(sections))
+        threads = threads_per_job(n_jobs)
+        # Segment cache is opt-in ("cache": true or --cache); --cache/--no-cache on the CLI
+        # win over the config. Keys cover the section's input files and the files its
+        # extra_filters / filter_script name via movie=, subtitles=, fontfile= etc.; inputs
+        # reached any other way (e.g. paths built inside a sendcmd file) are not tracked.
+        cache_on = bool(cfg.get("cache", False)) if use_cache is None else use_cache
+        cache_dir = Path(cfg.get("cache_dir", SEGMENT_CACHE_DIR))
+        cache_max = int(cfg.get("cache_max_bytes", SEGMENT_CACHE_MAX_BYTES))
+        stream_copy = bool(cfg.get("stream_copy", False))
+        encode_params = {
+            "stream_copy": stream_copy,
+            "width": width,
+            "height": height,
+            "fps": fps,
+            "video_codec": vcodec,
+            "audio_codec": acodec,
+            "crf": crf,
+            "preset": preset,
+        }
+        # Large configs render in batches; each batch is merged and its segments deleted right away
+        batch_size = int(cfg.get("batch_size", DEFAULT_BATCH_SIZE))
+        if batch_size < 2:
+            raise ValueError("'batch_size' must be >= 2")
+        batched = len(sections) > batch_size
+        hits = 0
+        misses = 0
+        copied = 0
+        encoder_headers: Dict[Tuple[Any, ...], Optional[Dict[str, Any]]] = {}
         segment_paths: List[Path] = []
-        for i, sec in enumerate(sections):
-            seg_out = tmpdir / f"segment_{i:02d}.mp4"
-            cmd = build_section_ffmpeg_cmd(
-                i,
-                sec,
-                seg_out,
-                width,
-                height,
-                fps,
-                vcodec,
-                acodec,
-                crf,
-                preset,
-            )
-            run(cmd)
-            segment_paths.append(seg_out)
+        pool = ThreadPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+        if pool:
+            print(f"Rendering {len(sections)} segments with {n_jobs} parallel jobs ({threads} ffmpeg threads each)")
+        try:
+            for b0 in range(0, len(sections), batch_size):
+                batch_paths: List[Path] = []
+                cmds: List[List[List[str]]] = []
+                pending: List[Any] = []  # (segment path, cache key) for segments that must be encoded
+                for i in range(b0, min(b0 + batch_size, len(sections))):
+                    sec = sections[i]
+                    seg_out = tmpdir / f"segment_{i:02d}.mp4"
+                    batch_paths.append(seg_out)
+                    key = section_cache_key(sec, encode_params) if cache_on else None
+                    if key and cache_fetch(cache_dir, key, seg_out):
+                        print(f"Section {i}: cache hit ({key[:12]})")
+                        hits += 1
+                        continue
+                    # A stale segment may be a hard link into the cache; never let ffmpeg overwrite it in place
+                    if seg_out.exists():
+                        seg_out.unlink()
+                    keyframe: Optional[float] = None
+                    if stream_copy:
+                        keyframe = smart_cut_keyframe(sec, tmpdir, width, height, fps, vcodec, crf, preset, encoder_headers)
+                    if keyframe is not None:
+                        print(f"Section {i}: source matches target format; stream-copying from {keyframe:.3f}s")
+                        copied += 1
+                        steps = build_copy_section_cmds(
+                            i, sec, seg_out, keyframe, width, height, fps, vcodec, acodec, crf, preset, threads=threads,
+                        )
+                    else:
+                        steps = [build_section_ffmpeg_cmd(
+                            i,
+                            sec,
+                            seg_out,
+                            width,
+                            height,
+                            fps,
+                            vcodec,
+                            acodec,
+                            crf,
+                            preset,
+                            threads=threads,
+                            stable_headers=stream_copy,
+                        )]
+                    cmds.append(steps)
+                    pending.append((seg_out, key))
+
+                if pool:
+                    # list() re-raises the first failure after the batch drains
+                    list(pool.map(run_steps, cmds))
+                else:
+                    for steps in cmds:
+                        run_steps(steps)
+                misses += len(pending)
+
+                if cache_on:
+                    for seg_out, key in pending:
+                        cache_store(cache_dir, key, seg_out)
+
+                if batched:
+                    batch_out = tmpdir / f"batch_{b0 // batch_size:04d}.mp4"
+                    concat_copy(batch_paths, batch_out)
+                    for seg in batch_paths:
+                        seg.unlink()
+                    segment_paths.append(batch_out)
+                else:
+                    segment_paths.extend(batch_paths)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        if batched:
+            # Keep every concat list (and open file count) bounded by batch_size
+            segment_paths = merge_hierarchically(segment_paths, tmpdir, batch_size)
+        if stream_copy:
+            print(f"Stream copy: {copied} of {misses} rendered sections copied")
+        if cache_on:
+            evicted = cache_evict(cache_dir, cache_max)
+            print(f"Segment cache: {hits} hits, {misses} misses, {evicted} evicted ({cache_dir})")
 
         # Create/overwrite concat list file in workdir
         list_path = tmpdir / "concat_list.txt"
@@ -254,7 +1079,15 @@ def compose_from_dict(cfg: Dict[str, Any], *, phase: Optional[str] = None, workd
     return output
 
 
-def compose(config_path: Path, *, phase: Optional[str] = None, workdir: Optional[Path] = None) -> Path:
+def compose(
+    config_path: Path,
+    *,
+    phase: Optional[str] = None,
+    workdir: Optional[Path] = None,
+    jobs: Optional[Any] = None,
+    use_cache: Optional[bool] = None,
+    profile: Optional[str] = None,
+) -> Path:
     cfg = json.loads(Path(config_path).read_text())
     # Allow n8n-style outputs where the root is a list of config objects.
     # If a list is provided, process each config sequentially and return the last output path.
@@ -270,9 +1103,9 @@ def compose(config_path: Path, *, phase: Optional[str] = None, workdir: Optional
                 item_cfg = item["json"]
             else:
                 item_cfg = item
-            outputs.append(compose_from_dict(item_cfg, phase=phase, workdir=workdir))
+            outputs.append(compose_from_dict(item_cfg, phase=phase, workdir=workdir, jobs=jobs, use_cache=use_cache, profile=profile))
         return outputs[-1]
-    return compose_from_dict(cfg, phase=phase, workdir=workdir)
+    return compose_from_dict(cfg, phase=phase, workdir=workdir, jobs=jobs, use_cache=use_cache, profile=profile)
 
 
 def example_config() -> Dict[str, Any]:
@@ -285,6 +1118,13 @@ def example_config() -> Dict[str, Any]:
         "audio_codec": "aac",
         "crf": 23,
         "preset": "medium",
+        "mode": "segments",
+        "parallel": 1,
+        "batch_size": DEFAULT_BATCH_SIZE,
+        "stream_copy": False,
+        "cache": False,
+        "cache_max_bytes": SEGMENT_CACHE_MAX_BYTES,
+        "profile": False,
         "sections": [
             {
                 "duration": 6,
@@ -306,11 +1146,15 @@ def example_config() -> Dict[str, Any]:
 
 
 def main(argv: Optional[List[str]] = None) -> int:
-    p = argparse.ArgumentParser(description="Compose up to 8 video sections into one master.mp4 using ffmpeg.")
+    p = argparse.ArgumentParser(description="Compose any number of video sections into one master.mp4 using ffmpeg.")
     p.add_argument("--config", required=False, help="Path to JSON config file describing sections.")
     p.add_argument("--print-example", action="store_true", help="Print an example config JSON and exit.")
     p.add_argument("--phase", choices=["phase1", "phase2"], help="Run only a specific phase: phase1=create segments, phase2=concat segments. Omit to run both.")
     p.add_argument("--workdir", help="Working directory to place/find intermediate segment files and concat_list.txt. Defaults to /app/data/tmp/compose_<outputname> when --phase is set.")
+    p.add_argument("--jobs", help="Render up to N segments concurrently in phase1 (0 or 'auto' = one per core). Overrides 'parallel' in the config.")
+    p.add_argument("--profile", nargs="?", const="json", choices=["json", "table"], help="Measure every ffmpeg run and write <output>.profile.json; 'table' also prints a summary. Overrides 'profile' in the config.")
+    p.add_argument("--cache", action="store_true", help="Reuse unchanged segments from /app/data/tmp/segment_cache (capped by cache_max_bytes, default 20 GiB). Overrides 'cache' in the config.")
+    p.add_argument("--no-cache", action="store_true", help="Always re-encode segments, even if the config sets 'cache'.")
     # Simple mode: one MP4 and a number of seconds (optional audio/ass)
     p.add_argument("--video", help="Shorthand: input video file for a single section")
     p.add_argument("--seconds", type=float, help="Shorthand: duration in seconds for the single section")
@@ -326,6 +1170,8 @@ def main(argv: Optional[List[str]] = None) -> int:
         print(json.dumps(example_config(), indent=2))
         return 0
 
+    use_cache = False if args.no_cache else (True if args.cache else None)
+
     # Shorthand CLI mode
     if args.video and args.seconds:
         cfg: Dict[str, Any] = {
@@ -343,7 +1189,7 @@ def main(argv: Optional[List[str]] = None) -> int:
             cfg["audio_start"] = float(args.audio_start)
         try:
             wd = Path(args.workdir) if args.workdir else None
-            compose_from_dict(cfg, phase=args.phase, workdir=wd)
+            compose_from_dict(cfg, phase=args.phase, workdir=wd, jobs=args.jobs, use_cache=use_cache, profile=args.profile)
             return 0
         except Exception as e:
             print(f"Error: {e}", file=sys.stderr)
@@ -355,7 +1201,7 @@ def main(argv: Optional[List[str]] = None) -> int:
 
     try:
         wd = Path(args.workdir) if args.workdir else None
-        compose(Path(args.config), phase=args.phase, workdir=wd)
+        compose(Path(args.config), phase=args.phase, workdir=wd, jobs=args.jobs, use_cache=use_cache, profile=args.profile)
         return 0
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -24,9 +24,11 @@ function flag(name) {
   const color = arg('color', '#ffffff');
   const effect = arg('effect', 'fade'); // fade | typewriter | slide
   const out = arg('out', 'output.mp4');
+  // Render only the transparent overlay track (PNG-in-MOV) so a caller can composite it in its own ffmpeg graph
+  const overlayOut = arg('overlayOut');
 
-  if (!video || (!lottie && !text)) {
-    console.error('Usage: node overlay.js --video <videoPathOrURL> [--lottie <jsonPathOrURL> [--textOverride "Your text"] | --text "Your text" [--font Arial --fontSize 72 --color #ffffff --effect fade]] [--x 0 --y 0 --scale 1 --start 0 --duration 5 --fps 30 --overlayWidth 512 --overlayHeight 512]');
+  if ((!video && !overlayOut) || (!lottie && !text)) {
+    console.error('Usage: node overlay.js (--video <videoPathOrURL> | --overlayOut <file.mov>) [--lottie <jsonPathOrURL> [--textOverride "Your text"] | --text "Your text" [--font Arial --fontSize 72 --color #ffffff --effect fade]] [--x 0 --y 0 --scale 1 --start 0 --duration 5 --fps 30 --overlayWidth 512 --overlayHeight 512]');
     process.exit(2);
   }
 
@@ -100,7 +102,14 @@ function flag(name) {
       : `between(t,${start},${(start + totalSeconds).toFixed(3)})`;
 
     const filterComplex = `[0:v][1:v]overlay=${x}:${y}:format=auto:eval=frame:enable='${enableExpr}'[vout]`;
-    const fullArgs = [
+    const fullArgs = overlayOut ? [
+      '-y',
+      '-f', 'image2pipe',
+      '-framerate', String(effectiveFps),
+      '-i', 'pipe:0',
+      '-c:v', 'png',
+      overlayOut
+    ] : [
       '-y',
       // ffmpeg does not accept file:// for local files; pass the raw path/URL
       '-i', video,
@@ -145,7 +154,7 @@ function flag(name) {
       });
     });
 
-    console.log('Overlay complete:', out);
+    console.log('Overlay complete:', overlayOut || out);
     exitCode = 0;
   } catch (err) {
     console.error('Error:', err);
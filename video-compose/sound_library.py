@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Persistent local library of Freesound previews with a SQLite index.
+
+Previews are stored content-addressed (objects/<sha[:2]>/<sha>.<ext>) and indexed
+by Freesound id with name, tags, duration, license and loudness. Searches are
+answered from the index first; the network is only used on a miss, and a sound
+already in the library is never downloaded again.
+
+video-compose and sound-in-video each carry an identical copy of this file (they
+run in separate containers/venvs). Keep the copies in sync.
+"""
+
+import hashlib
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sounds (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '',
+    duration REAL,
+    license TEXT,
+    loudness REAL,
+    sha256 TEXT NOT NULL,
+    path TEXT NOT NULL,
+    url TEXT,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS searches (
+    query TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    sound_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (query, filter, sound_id)
+);
+"""
+
+
+def default_root() -> pathlib.Path:
+    env = os.environ.get("SOUND_LIBRARY_DIR")
+    if env:
+        return pathlib.Path(env)
+    return pathlib.Path.home() / ".cache" / "sound_library"
+
+
+def _sha256_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _search_key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _like_contains(term: str) -> str:
+    """LIKE pattern matching term literally (with ESCAPE '\\')."""
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class SoundLibrary:
+    def __init__(self, root: Optional[pathlib.Path] = None):
+        self.root = pathlib.Path(root) if root else default_root()
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect((self.root / "index.sqlite").as_posix(), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ---- lookups ----
+
+    def _rows_to_paths(self, rows) -> List[pathlib.Path]:
+        paths = []
+        for row in rows:
+            p = self.root / row["path"]
+            if p.exists():
+                paths.append(p)
+        return paths
+
+    def cached_search(self, query: str, filt: Optional[str], num: int) -> List[pathlib.Path]:
+        """Sounds a previous network search for exactly this query and filter returned."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT s.path FROM searches q JOIN sounds s ON s.id = q.sound_id "
+                "WHERE q.query = ? AND q.filter = ? ORDER BY q.rank LIMIT ?",
+                (_search_key(query), filt or "", num),
+            ).fetchall()
+        return self._rows_to_paths(rows)
+
+    def match(self, query: str, num: int, min_dur: Optional[float] = None, max_dur: Optional[float] = None) -> List[pathlib.Path]:
+        """Sounds whose name or tags contain every word of query, within the duration bounds."""
+        terms = _search_key(query).split()
+        if not terms:
+            return []
+        where = []
+        params: List = []
+        for term in terms:
+            where.append("(lower(name) LIKE ? ESCAPE '\\' OR lower(tags) LIKE ? ESCAPE '\\')")
+            params += [_like_contains(term)] * 2
+        if min_dur is not None:
+            where.append("duration >= ?")
+            params.append(float(min_dur))
+        if max_dur is not None:
+            where.append("duration <= ?")
+            params.append(float(max_dur))
+        params.append(num)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT path FROM sounds WHERE {' AND '.join(where)} ORDER BY added_at DESC LIMIT ?",
+                params,
+            ).fetchall()
+        return self._rows_to_paths(rows)
+
+    def lookup(
+        self,
+        query: str,
+        filt: Optional[str],
+        num: int,
+        min_dur: Optional[float] = None,
+        max_dur: Optional[float] = None,
+        raw_filters: bool = False,
+    ) -> List[pathlib.Path]:
+        """Answer a search locally: an identical earlier search first, then (when no raw
+        Freesound filter is involved, which can't be evaluated locally) a name/tag match
+        that finds at least num sounds. Empty means go to the network.
+        """
+        hits = self.cached_search(query, filt, num)
+        if hits:
+            return hits
+        if not raw_filters:
+            hits = self.match(query, num, min_dur, max_dur)
+            if len(hits) >= num:
+                return hits
+        return []
+
+    def path_for_id(self, sound_id: int) -> Optional[pathlib.Path]:
+        with self._lock:
+            row = self._db.execute("SELECT path FROM sounds WHERE id = ?", (int(sound_id),)).fetchone()
+        if row is None:
+            return None
+        p = self.root / row["path"]
+        return p if p.exists() else None
+
+    def get(self, path: pathlib.Path) -> Optional[Dict]:
+        """Index row (as a dict) for a library file."""
+        try:
+            rel = pathlib.Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT * FROM sounds WHERE path = ?", (rel,)).fetchone()
+        return dict(row) if row else None
+
+    # ---- updates ----
+
+    def fetch(self, entry: Dict, download: Callable[[Dict, pathlib.Path], Optional[pathlib.Path]]) -> Optional[pathlib.Path]:
+        """Library path of a Freesound search entry, downloading the preview only if the
+        id is not in the library yet. download(entry, dest) writes the preview to dest.
+        """
+        have = self.path_for_id(entry["id"])
+        if have is not None:
+            return have
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=tmp_dir.as_posix())
+        os.close(fd)
+        tmp = pathlib.Path(tmp_name)
+        try:
+            got = download(entry, tmp)
+            if not got:
+                return None
+            return self.add_file(tmp, entry)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def add_file(self, src: pathlib.Path, entry: Dict) -> pathlib.Path:
+        """Move src into the content-addressed store and index it under entry's
+        Freesound id, name, tags, duration and license.
+        """
+        sha = _sha256_file(src)
+        url = _preview_url(entry)
+        ext = os.path.splitext(url or src.name)[1].lower() or ".mp3"
+        rel = pathlib.Path("objects") / sha[:2] / f"{sha}{ext}"
+        dest = self.root / rel
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src.as_posix(), dest.as_posix())
+        tags = entry.get("tags") or []
+        if isinstance(tags, (list, tuple)):
+            tags = " ".join(str(t) for t in tags)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sounds (id, name, tags, duration, license, loudness, sha256, path, url, added_at) "
+                "VALUES (?, ?, ?, ?, ?, "
+                "(SELECT loudness FROM sounds WHERE sha256 = ? AND loudness IS NOT NULL LIMIT 1), ?, ?, ?, ?)",
+                (
+                    int(entry["id"]),
+                    str(entry.get("name") or src.name),
+                    tags,
+                    entry.get("duration"),
+                    entry.get("license"),
+                    sha,
+                    sha,
+                    rel.as_posix(),
+                    url,
+                    time.time(),
+                ),
+            )
+        return dest
+
+    def record_search(self, query: str, filt: Optional[str], paths: List[pathlib.Path]) -> None:
+        ids = []
+        for p in paths:
+            row = self.get(p)
+            if row:
+                ids.append(row["id"])
+        key = _search_key(query)
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM searches WHERE query = ? AND filter = ?", (key, filt or ""))
+            self._db.executemany(
+                "INSERT OR IGNORE INTO searches (query, filter, sound_id, rank) VALUES (?, ?, ?, ?)",
+                [(key, filt or "", sid, rank) for rank, sid in enumerate(ids)],
+            )
+
+    def set_loudness(self, path: pathlib.Path, loudness: float) -> None:
+        row = self.get(path)
+        if not row:
+            return
+        with self._lock, self._db:
+            self._db.execute("UPDATE sounds SET loudness = ? WHERE sha256 = ?", (float(loudness), row["sha256"]))
+
+
+def _preview_url(entry: Dict) -> Optional[str]:
+    previews = entry.get("previews") or {}
+    return (
+        previews.get("preview-hq-mp3")
+        or previews.get("preview-lq-mp3")
+        or previews.get("preview-hq-ogg")
+        or previews.get("preview-lq-ogg")
+    )
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import argparse
+import csv
+import json
 import os
 import shlex
 import subprocess
@@ -8,6 +10,9 @@ import sys
 from pathlib import Path
 from typing import Optional, List
 
+import h264_match
+import media_probe
+
 TMP_ROOT = Path("/app/data/tmp")
 TMP_ROOT.mkdir(parents=True, exist_ok=True)
 
@@ -34,59 +39,138 @@ def ensure_node() -> None:
 
 
 def input_has_audio(path: Path) -> bool:
-    """Return True if the input file has at least one audio stream (via ffprobe)."""
-    try:
-        res = subprocess.run(
-            [
-                "ffprobe", "-v", "error",
-                "-select_streams", "a",
-                "-show_entries", "stream=index",
-                "-of", "csv=p=0",
-                path.as_posix(),
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            check=True,
-            text=True,
-        )
-        return res.stdout.strip() != ""
-    except Exception:
-        return False
+    """Return True if the input file has at least one audio stream (cached ffprobe)."""
+    return media_probe.has_audio(path)
+
+
+STILL_X264_OPTS = ["-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-pix_fmt", "yuv420p"]
+
+
+def still_tail_filter(n_frames: int, fps: float) -> str:
+    """Filter that holds the last decoded frame for n_frames at fps.
+    Meant for an input opened with -sseof, so only the final second is decoded.
+    """
+    # reverse+trim keeps the last frame, loop repeats it, setpts retimes it at the target rate
+    return (
+        f"reverse,trim=end_frame=1,setpts=PTS-STARTPTS,"
+        f"loop=loop={n_frames - 1}:size=1:start=0,setpts=N/({fps}*TB)"
+    )
 
 
-def action_last_frame(input_video: Path, output_video: Path, seconds: float, fps: int = 30) -> None:
-    """Extract the last frame of input_video to an image and create a still video of X seconds."""
+def action_last_frame(input_video: Path, output_video: Path, seconds: float, fps: int = 30, append: bool = False) -> None:
+    """Create a still video of X seconds from the last frame of input_video, in one ffmpeg run.
+    With append, the still is added to the end of input_video: the tail is encoded with
+    the source's SPS/PPS (see h264_match) and joined with the concat demuxer, so the
+    source is not re-encoded.
+    """
     ensure_ffmpeg()
+    src = media_probe.video_params(input_video) if append else None
+    if src and src.get("fps"):
+        # The tail has to match the source frame rate for a clean stream-copy join
+        fps = src["fps"]
+    n_frames = max(1, int(round(seconds * fps)))
+    # One keyframe for the whole still; nothing changes between frames
+    gop = ["-g", str(n_frames), "-keyint_min", str(n_frames), "-sc_threshold", "0"]
+
+    if not append:
+        run([
+            "ffmpeg", "-hide_banner", "-y",
+            "-sseof", "-1",
+            "-i", input_video.as_posix(),
+            "-vf", still_tail_filter(n_frames, fps),
+            "-r", str(fps),
+            *STILL_X264_OPTS, *gop,
+            "-an",
+            output_video.as_posix(),
+        ])
+        return
+
     workdir = TMP_ROOT / f"vf_lastframe_{output_video.stem}"
     workdir.mkdir(parents=True, exist_ok=True)
-    last_png = workdir / "last_frame.png"
-
-    # Grab the last frame as an image
-    run([
+    aud = media_probe.audio_params(input_video)
+    # The tail's silence is encoded as AAC-LC mono/stereo; other source audio can't be joined by copy
+    aud_ok = aud is None or (
+        aud.get("codec_name") == "aac" and aud.get("profile") in (None, "LC") and aud.get("channels") in (1, 2)
+    )
+    enc_args = None
+    if src and src.get("codec_name") == "h264" and aud_ok:
+        # The MP4 keeps one SPS/PPS for the whole track; the tail must carry the source's
+        enc_args = h264_match.matched_x264_args(input_video.as_posix())
+    if enc_args is None:
+        # Source can't take an h264/aac tail by stream copy; fall back to one full encode
+        print("last_frame: source is not h264 with SPS/PPS libx264 can reproduce and AAC-LC mono/stereo audio, "
+              "re-encoding with the still appended")
+        has_aud = input_has_audio(input_video)
+        graph = f"[1:v]{still_tail_filter(n_frames, fps)}[tv];[0:v][tv]concat=n=2:v=1:a=0[vout]"
+        cmd = [
+            "ffmpeg", "-hide_banner", "-y",
+            "-i", input_video.as_posix(),
+            "-sseof", "-1", "-i", input_video.as_posix(),
+        ]
+        if has_aud:
+            # Pad the source audio with silence under the still. The pad is bounded:
+            # -shortest does not stop an endless apad inside filter_complex
+            src_dur = media_probe.duration(input_video)
+            pad = f"whole_dur={src_dur + seconds:.3f}" if src_dur else f"pad_dur={seconds:.3f}"
+            graph += f";[0:a]apad={pad}[aout]"
+            cmd += ["-filter_complex", graph, "-map", "[vout]", "-map", "[aout]", "-shortest"]
+        else:
+            cmd += ["-filter_complex", graph, "-map", "[vout]"]
+        cmd += ["-r", str(fps), "-c:v", "libx264", "-pix_fmt", "yuv420p", output_video.as_posix()]
+        run(cmd)
+        return
+
+    tail = workdir / "tail.mp4"
+    cmd = [
         "ffmpeg", "-hide_banner", "-y",
-        "-sseof", "-1",
-        "-i", input_video.as_posix(),
-        "-frames:v", "1",
-        last_png.as_posix(),
-    ])
+        "-sseof", "-1", "-i", input_video.as_posix(),
+    ]
+    if aud:
+        # Silent audio in the source's layout so both files concat without re-encoding
+        layout = "mono" if aud.get("channels") == 1 else "stereo"
+        cmd += ["-f", "lavfi", "-t", str(seconds), "-i", f"anullsrc=r={aud.get('sample_rate') or 48000}:cl={layout}"]
+    vs = media_probe.video_stream(input_video)
+    vf = still_tail_filter(n_frames, fps)
+    if src.get("width") and src.get("height"):
+        vf += f",scale={src['width']}:{src['height']}"
+    if "-vf" in enc_args:
+        # h264_match sets the source's sample aspect ratio; keep it in the one -vf
+        at = enc_args.index("-vf")
+        vf += "," + enc_args[at + 1]
+        enc_args = enc_args[:at] + enc_args[at + 2:]
+    tb = str(vs.get("time_base") or "")
+    if tb.startswith("1/"):
+        # Same track timescale as the source, so the concat keeps its timestamps exact
+        enc_args = enc_args + ["-video_track_timescale", tb[2:]]
+    # Encoded the way matched_x264_args verified it: the source's exact frame rate
+    # (it is part of the SPS timing info), default preset, source pixel format
+    cmd += [
+        "-map", "0:v:0", "-vf", vf,
+        "-r", vs.get("r_frame_rate") or str(fps),
+        "-c:v", "libx264", "-pix_fmt", src["pix_fmt"],
+        *enc_args,
+    ]
+    if aud:
+        cmd += ["-map", "1:a:0", "-c:a", "aac", "-shortest"]
+    cmd.append(tail.as_posix())
+    run(cmd)
 
-    # Create a still video of the requested duration
+    list_file = workdir / "concat.txt"
+    list_file.write_text(
+        "".join(f"file '{p.resolve().as_posix()}'\n" for p in (input_video, tail)),
+        encoding="utf-8",
+    )
     run([
         "ffmpeg", "-hide_banner", "-y",
-        "-loop", "1",
-        "-t", str(seconds),
-        "-i", last_png.as_posix(),
-        "-r", str(fps),
-        "-c:v", "libx264",
-        "-pix_fmt", "yuv420p",
+        "-f", "concat", "-safe", "0",
+        "-i", list_file.as_posix(),
+        "-c", "copy",
         output_video.as_posix(),
     ])
 
 
-def action_add_sound(input_video: Path, output_video: Path, sound: Path, start: float, duration: Optional[float] = None, volume: Optional[float] = None) -> None:
-    """Mix a short sound effect into the video's audio starting at `start` seconds for `duration` seconds (if provided)."""
-    ensure_ffmpeg()
-    # Build filter for the sound effect: delay to start time, optional trim, optional volume
+def sound_fx_filter(start: float, duration: Optional[float] = None, volume: Optional[float] = None) -> str:
+    """Filter chain for a sound effect: optional trim, delay to start time, optional volume."""
     fx_chain = []
     if duration is not None:
         fx_chain.append(f"atrim=0:{duration}")
@@ -95,8 +179,13 @@ def action_add_sound(input_video: Path, output_video: Path, sound: Path, start:
     fx_chain.append(f"adelay={delay_ms}|{delay_ms}")
     if volume is not None:
         fx_chain.append(f"volume={volume}")
+    return ",".join(fx_chain) if fx_chain else "anull"
+
 
-    fx_filter = ",".join(fx_chain) if fx_chain else "anull"
+def action_add_sound(input_video: Path, output_video: Path, sound: Path, start: float, duration: Optional[float] = None, volume: Optional[float] = None) -> None:
+    """Mix a short sound effect into the video's audio starting at `start` seconds for `duration` seconds (if provided)."""
+    ensure_ffmpeg()
+    fx_filter = sound_fx_filter(start, duration, volume)
 
     # Determine whether to mix with existing audio or output only the FX as audio
     has_aud = input_has_audio(input_video)
@@ -225,9 +314,16 @@ def action_animate_text_with_lottie(
     run(cmd)
 
 
-def action_running_code_drawtext(
-    input_video: Path,
-    output_video: Path,
+def escape_filter_value(value: str) -> str:
+    """Escape a drawtext option value: backslashes, colons, and single quotes."""
+    return (
+        value.replace('\\', r'\\')
+             .replace(':', r'\:')
+             .replace("'", r"\'")
+    )
+
+
+def drawtext_filter(
     text: str,
     x: str,
     y: str,
@@ -241,19 +337,18 @@ def action_running_code_drawtext(
     shadowcolor: str = "black",
     shadowx: int = 2,
     shadowy: int = 2,
-) -> None:
-    """Render text on the video at (x,y) starting at `start` for `duration` seconds using ffmpeg drawtext."""
-    ensure_ffmpeg()
-
+    textfile: Optional[Path] = None,
+) -> str:
+    """Build a single drawtext filter shown between start and start+duration.
+    With textfile, the text is read from that file verbatim (no escaping limits) and `text` is ignored.
+    """
     # drawtext positions can be expressions; accept raw strings for x/y
-    # Escape text for ffmpeg drawtext: backslashes, colons, and single quotes
-    escaped_text = (
-        text.replace('\\', r'\\')
-            .replace(':', r'\:')
-            .replace("'", r"\'")
-    )
-    draw_opts = [
-        f"text={escaped_text}",
+    if textfile:
+        # expansion=none keeps '%' literal, matching what the file says
+        text_opts = [f"textfile={escape_filter_value(textfile.as_posix())}", "expansion=none"]
+    else:
+        text_opts = [f"text={escape_filter_value(text)}"]
+    draw_opts = text_opts + [
         f"x={x}", f"y={y}",
         f"fontsize={fontsize}", f"fontcolor={fontcolor}",
         f"enable='between(t,{start},{start + duration})'",
@@ -265,7 +360,35 @@ def action_running_code_drawtext(
     if fontfile:
         draw_opts.append(f"fontfile={fontfile.as_posix()}")
 
-    vf = f"drawtext={':'.join(draw_opts)}"
+    return f"drawtext={':'.join(draw_opts)}"
+
+
+def action_running_code_drawtext(
+    input_video: Path,
+    output_video: Path,
+    text: str,
+    x: str,
+    y: str,
+    start: float,
+    duration: float,
+    fontsize: int = 36,
+    fontcolor: str = "white",
+    fontfile: Optional[Path] = None,
+    box: bool = True,
+    boxcolor: str = "black@0.5",
+    shadowcolor: str = "black",
+    shadowx: int = 2,
+    shadowy: int = 2,
+) -> None:
+    """Render text on the video at (x,y) starting at `start` for `duration` seconds using ffmpeg drawtext."""
+    ensure_ffmpeg()
+
+    vf = drawtext_filter(
+        text, x, y, start, duration,
+        fontsize=fontsize, fontcolor=fontcolor, fontfile=fontfile,
+        box=box, boxcolor=boxcolor,
+        shadowcolor=shadowcolor, shadowx=shadowx, shadowy=shadowy,
+    )
 
     cmd = [
         "ffmpeg", "-hide_banner", "-y",
@@ -277,17 +400,301 @@ def action_running_code_drawtext(
     ]
     run(cmd)
 
+TIMELINE_NUMERIC = {"start": float, "duration": float, "fontsize": int, "shadowx": int, "shadowy": int}
+
+
+def load_text_timeline(path: Path) -> List[dict]:
+    """Read drawtext entries from JSON or CSV.
+
+    JSON: a list (or {"items": [...]}) of objects with text, x, y, start, duration
+    and optional style keys (fontsize, fontcolor, fontfile, box, boxcolor,
+    shadowcolor, shadowx, shadowy), either inline or under "style".
+    CSV: a header row with the same column names.
+    """
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            rows = [dict(r) for r in csv.DictReader(f)]
+    else:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        rows = data.get("items", []) if isinstance(data, dict) else data
+    entries: List[dict] = []
+    for i, row in enumerate(rows):
+        entry = dict(row.get("style") or {}) if isinstance(row.get("style"), dict) else {}
+        entry.update({k: v for k, v in row.items() if k != "style" and v not in (None, "")})
+        missing = [k for k in ("text", "x", "y", "start", "duration") if k not in entry]
+        if missing:
+            raise ValueError(f"Timeline entry {i}: missing {', '.join(missing)}")
+        for key, cast in TIMELINE_NUMERIC.items():
+            if key in entry:
+                entry[key] = cast(entry[key])
+        if "box" in entry and isinstance(entry["box"], str):
+            entry["box"] = entry["box"].strip().lower() in ("1", "true", "yes")
+        entries.append(entry)
+    return entries
+
+
+def timeline_drawtext_filters(entries: List[dict], workdir: Path, defaults: Optional[dict] = None) -> List[str]:
+    """One drawtext node per timeline entry; each text goes to its own textfile under workdir."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    defaults = defaults or {}
+    filters: List[str] = []
+    for i, entry in enumerate(entries):
+        opts = {**defaults, **entry}
+        textfile = workdir / f"text_{i:04d}.txt"
+        textfile.write_text(str(opts["text"]), encoding="utf-8")
+        filters.append(drawtext_filter(
+            "", str(opts["x"]), str(opts["y"]), float(opts["start"]), float(opts["duration"]),
+            fontsize=int(opts.get("fontsize", 36)),
+            fontcolor=opts.get("fontcolor", "white"),
+            fontfile=Path(opts["fontfile"]).resolve() if opts.get("fontfile") else None,
+            box=bool(opts.get("box", True)),
+            boxcolor=opts.get("boxcolor", "black@0.5"),
+            shadowcolor=opts.get("shadowcolor", "black"),
+            shadowx=int(opts.get("shadowx", 2)),
+            shadowy=int(opts.get("shadowy", 2)),
+            textfile=textfile,
+        ))
+    return filters
+
+
+def action_running_code_timeline(
+    input_video: Path,
+    output_video: Path,
+    timeline: Path,
+    fontsize: int = 36,
+    fontcolor: str = "white",
+    fontfile: Optional[Path] = None,
+) -> None:
+    """Render every text of a timeline file (JSON/CSV) in one encode: all drawtext nodes
+    go into a single filter_complex_script. fontsize/fontcolor/fontfile are defaults
+    that individual entries may override.
+    """
+    ensure_ffmpeg()
+    workdir = TMP_ROOT / f"vf_code_{output_video.stem}"
+    defaults: dict = {"fontsize": fontsize, "fontcolor": fontcolor}
+    if fontfile:
+        defaults["fontfile"] = fontfile.as_posix()
+    filters = timeline_drawtext_filters(load_text_timeline(timeline), workdir, defaults)
+    if not filters:
+        raise ValueError(f"Timeline {timeline} has no entries")
+
+    script = workdir / "filter_complex.txt"
+    script.write_text("[0:v]" + ",\n".join(filters) + "[vout]\n", encoding="utf-8")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-y",
+        "-i", input_video.as_posix(),
+        "-filter_complex_script", script.as_posix(),
+        "-map", "[vout]",
+        "-map", "0:a?",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        "-c:a", "copy",
+        output_video.as_posix(),
+    ]
+    run(cmd)
+
+
+def render_lottie_overlay(
+    lottie_json: Path,
+    overlay_out: Path,
+    duration: float,
+    scale: float = 1.0,
+    fps: int = 30,
+    overlay_w: int = 512,
+    overlay_h: int = 512,
+    overlay_js_path: Optional[Path] = None,
+) -> None:
+    """Render a Lottie animation to a transparent PNG-in-MOV track (no compositing)."""
+    ensure_node()
+    overlay_js = overlay_js_path if overlay_js_path else (Path(__file__).parent / "overlay.js")
+    if not overlay_js.exists():
+        raise FileNotFoundError(f"overlay.js not found at {overlay_js}. Please ensure the effects package is present.")
+    run([
+        "node", overlay_js.as_posix(),
+        "--lottie", lottie_json.as_posix(),
+        "--scale", str(scale),
+        "--duration", str(duration),
+        "--fps", str(fps),
+        "--overlayWidth", str(overlay_w), "--overlayHeight", str(overlay_h),
+        "--overlayOut", overlay_out.as_posix(),
+    ])
+
+
+PIPELINE_ACTIONS = ("last_frame", "add_sound", "mouse_move", "running_code", "animate_text", "animate_text_with_lottie")
+
+
+def load_pipeline(spec: str) -> List[dict]:
+    """Read a pipeline from a JSON file path or an inline JSON string.
+    Accepts a list of steps or an object with a "steps" list; each step has an "action".
+    """
+    text = spec.strip()
+    if not text.startswith(("[", "{")):
+        text = Path(spec).read_text()
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("steps")
+    if not isinstance(data, list) or not data:
+        raise ValueError("Pipeline must be a non-empty list of steps (or {\"steps\": [...]}).")
+    for i, step in enumerate(data):
+        if not isinstance(step, dict) or step.get("action") not in PIPELINE_ACTIONS:
+            raise ValueError(f"Pipeline step {i}: 'action' must be one of {', '.join(PIPELINE_ACTIONS)}")
+    return data
+
+
+def _require(step: dict, i: int, *keys: str) -> None:
+    missing = [k for k in keys if step.get(k) is None]
+    if missing:
+        raise ValueError(f"Pipeline step {i} ({step['action']}): missing {', '.join(missing)}")
+
+
+def action_pipeline(input_video: Path, output_video: Path, steps: List[dict]) -> None:
+    """Apply several actions in one ffmpeg run: every step becomes a node in a single
+    filter graph, so the video is decoded and encoded once instead of once per action.
+    Step keys mirror the CLI flags (x, y, start, duration, text, sound, cursor_png, ...).
+    last_frame replaces the source with a still, so it is only allowed as the first step.
+    """
+    ensure_ffmpeg()
+    workdir = TMP_ROOT / f"vf_pipeline_{output_video.stem}"
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    inputs: List[List[str]] = [["-i", input_video.as_posix()]]
+    chains: List[str] = []
+    v = "0:v"
+    a: Optional[str] = "0:a" if input_has_audio(input_video) else None
+    video_changed = False
+    audio_changed = False
+    pad_audio = False  # audio came only from effects; pad it to the video length
+    out_fps: Optional[int] = None
+
+    for i, step in enumerate(steps):
+        action = step["action"]
+        if action == "last_frame":
+            if i != 0:
+                raise ValueError("Pipeline: last_frame must be the first step (it replaces the source video).")
+            _require(step, i, "seconds")
+            out_fps = int(step.get("fps", 30))
+            n_frames = max(1, int(round(float(step["seconds"]) * out_fps)))
+            # Only the final second is decoded
+            inputs[0] = ["-sseof", "-1", "-i", input_video.as_posix()]
+            chains.append(f"[{v}]{still_tail_filter(n_frames, out_fps)}[v{i}]")
+            v = f"v{i}"
+            a = None
+            video_changed = True
+        elif action == "running_code" and step.get("timeline"):
+            entries = load_text_timeline(Path(step["timeline"]).resolve())
+            defaults = {k: step[k] for k in ("fontsize", "fontcolor", "fontfile") if step.get(k) is not None}
+            vf = ",".join(timeline_drawtext_filters(entries, workdir / f"timeline_{i:02d}", defaults))
+            chains.append(f"[{v}]{vf}[v{i}]")
+            v = f"v{i}"
+            video_changed = True
+        elif action == "running_code":
+            _require(step, i, "text", "x", "y", "start", "duration")
+            vf = drawtext_filter(
+                str(step["text"]), str(step["x"]), str(step["y"]),
+                float(step["start"]), float(step["duration"]),
+                fontsize=int(step.get("fontsize", 36)),
+                fontcolor=step.get("fontcolor", "white"),
+                fontfile=Path(step["fontfile"]).resolve() if step.get("fontfile") else None,
+            )
+            chains.append(f"[{v}]{vf}[v{i}]")
+            v = f"v{i}"
+            video_changed = True
+        elif action == "mouse_move":
+            _require(step, i, "cursor_png", "x", "y", "start", "duration")
+            idx = len(inputs)
+            inputs.append(["-i", Path(step["cursor_png"]).resolve().as_posix()])
+            cur = f"{idx}:v"
+            scale_cursor = float(step.get("scale_cursor", 1.0))
+            if scale_cursor != 1.0:
+                chains.append(f"[{cur}]scale=iw*{scale_cursor}:ih*{scale_cursor}[cur{i}]")
+                cur = f"cur{i}"
+            start = float(step["start"])
+            end = start + float(step["duration"])
+            chains.append(f"[{v}][{cur}]overlay=x={step['x']}:y={step['y']}:enable='between(t,{start},{end})'[v{i}]")
+            v = f"v{i}"
+            video_changed = True
+        elif action in ("animate_text", "animate_text_with_lottie"):
+            _require(step, i, "lottie", "x", "y", "start", "duration")
+            start = float(step["start"])
+            duration = float(step["duration"])
+            track = workdir / f"lottie_{i:02d}.mov"
+            render_lottie_overlay(
+                Path(step["lottie"]).resolve(),
+                track,
+                duration,
+                scale=float(step.get("scale", 1.0)),
+                fps=int(step.get("fps", 30)),
+                overlay_w=int(step.get("overlay_width", 512)),
+                overlay_h=int(step.get("overlay_height", 512)),
+                overlay_js_path=Path(step["overlay_js"]).resolve() if step.get("overlay_js") else None,
+            )
+            idx = len(inputs)
+            inputs.append(["-i", track.as_posix()])
+            chains.append(f"[{idx}:v]setpts=PTS-STARTPTS+{start}/TB[lot{i}]")
+            chains.append(
+                f"[{v}][lot{i}]overlay={int(step['x'])}:{int(step['y'])}:format=auto:eval=frame:"
+                f"eof_action=pass:enable='between(t,{start},{start + duration})'[v{i}]"
+            )
+            v = f"v{i}"
+            video_changed = True
+        elif action == "add_sound":
+            _require(step, i, "sound", "start")
+            idx = len(inputs)
+            inputs.append(["-i", Path(step["sound"]).resolve().as_posix()])
+            fx = sound_fx_filter(
+                float(step["start"]),
+                float(step["sound_duration"]) if step.get("sound_duration") is not None else None,
+                float(step["volume"]) if step.get("volume") is not None else None,
+            )
+            if a:
+                chains.append(f"[{idx}:a]{fx}[fx{i}]")
+                chains.append(f"[{a}][fx{i}]amix=inputs=2:duration=first:dropout_transition=0[a{i}]")
+            else:
+                chains.append(f"[{idx}:a]{fx}[a{i}]")
+                pad_audio = True
+            a = f"a{i}"
+            audio_changed = True
+
+    if pad_audio:
+        chains.append(f"[{a}]apad[apad]")
+        a = "apad"
+
+    cmd: List[str] = ["ffmpeg", "-hide_banner", "-y"]
+    for inp in inputs:
+        cmd += inp
+    if chains:
+        script = workdir / "filter_complex.txt"
+        script.write_text(";\n".join(chains) + "\n")
+        cmd += ["-filter_complex_script", script.as_posix()]
+    cmd += ["-map", f"[{v}]" if video_changed else "0:v:0"]
+    if a:
+        cmd += ["-map", f"[{a}]" if audio_changed else "0:a:0"]
+    if video_changed:
+        cmd += ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        if out_fps:
+            cmd += ["-r", str(out_fps)]
+    else:
+        cmd += ["-c:v", "copy"]
+    if a:
+        cmd += ["-c:a", "aac" if audio_changed else "copy"]
+    if pad_audio:
+        cmd += ["-shortest"]
+    cmd.append(output_video.as_posix())
+    run(cmd)
+
+
 def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Video utility actions: last_frame, add_sound, animate_text (Lottie), running_code (drawtext), mouse_move (cursor PNG overlay)")
-    p.add_argument("--action", required=True, choices=["last_frame", "add_sound", "animate_text", "animate_text_with_lottie", "running_code", "mouse_move"], help="Action to perform")
+    p.add_argument("--action", choices=["last_frame", "add_sound", "animate_text", "animate_text_with_lottie", "running_code", "mouse_move"], help="Action to perform")
     p.add_argument("--input_video", required=True, help="Path of input video file")
     p.add_argument("--output_video", required=True, help="Path of output video file")
+    p.add_argument("--pipeline", help="JSON file or inline JSON list of steps ({\"action\": ..., <action args>}) fused into one ffmpeg encode")
 
     # Common optional params
     p.add_argument("--fps", type=int, default=30, help="FPS for generated content where applicable")
 
     # last_frame
     p.add_argument("--seconds", type=float, help="Duration in seconds for the still video (last_frame)")
+    p.add_argument("--append", action="store_true", help="Append the still to the end of the input instead of writing only the still (last_frame)")
 
     # add_sound
     p.add_argument("--sound", help="Path to the sound file to mix (required for add_sound)")
@@ -310,6 +717,7 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     p.add_argument("--fontsize", type=int, default=36, help="Font size for drawtext (running_code)")
     p.add_argument("--fontcolor", default="white", help="Font color for drawtext (running_code)")
     p.add_argument("--fontfile", help="Path to a TTF/OTF font file (running_code)")
+    p.add_argument("--timeline", help="JSON/CSV of text,x,y,start,duration[,style] entries rendered in one pass (running_code)")
 
     # mouse_move (cursor PNG overlay)
     p.add_argument("--cursor_png", help="Path to cursor PNG image (required for mouse_move)")
@@ -324,11 +732,18 @@ def main(argv: Optional[List[str]] = None) -> int:
     input_video = Path(args.input_video).resolve()
     output_video = Path(args.output_video).resolve()
 
+    if args.pipeline:
+        action_pipeline(input_video, output_video, load_pipeline(args.pipeline))
+        return 0
+    if not args.action:
+        print("--action or --pipeline is required", file=sys.stderr)
+        return 2
+
     if args.action == "last_frame":
         if args.seconds is None:
             print("--seconds is required for last_frame", file=sys.stderr)
             return 2
-        action_last_frame(input_video, output_video, seconds=args.seconds, fps=args.fps)
+        action_last_frame(input_video, output_video, seconds=args.seconds, fps=args.fps, append=args.append)
         return 0
 
     if args.action == "mouse_move":
@@ -394,6 +809,17 @@ def main(argv: Optional[List[str]] = None) -> int:
         )
         return 0
 
+    if args.action == "running_code" and args.timeline:
+        action_running_code_timeline(
+            input_video,
+            output_video,
+            timeline=Path(args.timeline).resolve(),
+            fontsize=int(args.fontsize),
+            fontcolor=args.fontcolor,
+            fontfile=Path(args.fontfile).resolve() if args.fontfile else None,
+        )
+        return 0
+
     if args.action == "running_code":
         if args.text is None:
             print("--text is required for running_code", file=sys.stderr)